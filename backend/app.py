@@ -1,11 +1,14 @@
+import io
 import os
+import hmac
+import time
 import uuid
-from flask import Flask, request, jsonify, send_file, after_this_request
+import threading
+from flask import Flask, Response, request, jsonify, send_file, after_this_request, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import sys
 import json
-import glob
 
 # --- Adjust Path Loading for .env ---
 # Get the directory where app.py is located
@@ -18,7 +21,17 @@ load_dotenv(dotenv_path=dotenv_path)
 
 # Use ONLY absolute imports now
 from backend.services import chat_service, document_service, form_filler_service
+from backend.services.fill_job_service import fill_job_manager, QueueFullError
+from backend.services.form_registry import form_registry
+from backend.services.session_manager import session_manager
+from backend.services.extraction_result_cache import extraction_result_cache
+from backend.services.llm_client import llm_gateway, LLMUnavailableError
 from backend.vector_store import chroma_db
+from backend.utils.extraction_cache import get_extraction_cache
+from backend.utils.text_extractor import EXTRACTOR_VERSION
+from backend.utils import metrics
+from backend.utils.upload_store import upload_store, max_request_bytes, StreamingUploadRequest
+from werkzeug.exceptions import RequestEntityTooLarge
 
 # --- Adjust Paths for Folders ---
 # Use paths relative to the backend directory where app.py lives
@@ -29,6 +42,13 @@ FORM_CONFIGS_DIR_REL = os.getenv("FORM_CONFIGS_DIR", "form_configs")
 FORM_CONFIGS_DIR_ABS = os.path.join(_app_dir, FORM_CONFIGS_DIR_REL)
 # --- End Path Adjustment ---
 
+# 'background' warms up clients and the vector store in a thread after import, 'blocking' before
+# serving (the old behaviour), 'off' leaves everything to be built on first use
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background").lower()
+# /api/admin/* requires this token (X-Admin-Token header); without it the admin endpoints are disabled
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
 print(f"UPLOAD_FOLDER set to: {UPLOAD_FOLDER}")
 print(f"FILLED_FORM_FOLDER set to: {FILLED_FORM_FOLDER}")
 
@@ -37,15 +57,71 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(FILLED_FORM_FOLDER, exist_ok=True)
 
 app = Flask(__name__)
-CORS(app)
-
-# Initialize vector store (same as before)
-try:
-    print("Initializing vector store connection on app start...")
-    # Pass the backend_dir if chroma_db needs it to construct full path from .env relative path
-    chroma_db.initialize_vector_store(base_path=backend_dir)
-except Exception as e:
-    print(f"WARNING: Failed to initialize vector store on startup: {e}")
+# Uploaded files are written to disk and hashed while the request body is parsed
+app.request_class = StreamingUploadRequest
+app.config["MAX_CONTENT_LENGTH"] = max_request_bytes()
+# Admin endpoints are left out of CORS so other sites' pages cannot call them from a user's browser
+CORS(app, resources={r"^/api/(?!admin/).*": {}}, expose_headers=[metrics.REQUEST_ID_HEADER])
+metrics.init_app(app)
+
+
+@app.before_request
+def require_admin_token():
+    """Rejects /api/admin/* requests without the configured ADMIN_API_TOKEN."""
+    if not request.path.startswith("/api/admin/"):
+        return None
+    if not ADMIN_API_TOKEN:
+        return jsonify({"error": "Admin API is disabled. Set ADMIN_API_TOKEN to enable it."}), 403
+    if not hmac.compare_digest(request.headers.get(ADMIN_TOKEN_HEADER, ""), ADMIN_API_TOKEN):
+        return jsonify({"error": "Missing or invalid admin token."}), 403
+    return None
+
+# --- Warmup ---
+# Everything below is also built lazily on first use; warming up just moves the cost off the first requests
+warmup_state = {"status": "pending", "started_at": None, "elapsed_ms": None, "errors": []}
+
+def warmup():
+    """Creates the LLM clients, loads the vector store and builds the chat pipeline."""
+    warmup_state.update(status="running", started_at=time.time(), errors=[])
+    start = time.perf_counter()
+    try:
+        try:
+            print("Initializing vector store connection on app start...")
+            # Pass the backend_dir if chroma_db needs it to construct full path from .env relative path
+            chroma_db.initialize_vector_store(base_path=backend_dir)
+            # Build the chat retriever once so the first /api/chat request doesn't pay for it
+            chat_service.chat_pipeline.get_retriever()
+        except Exception as e:
+            print(f"WARNING: Failed to initialize vector store on startup: {e}")
+            warmup_state["errors"].append(f"vector store: {e}")
+        if chat_service.chat_pipeline.get_llm() is None:
+            warmup_state["errors"].append("chat LLM not initialized")
+        if form_filler_service.get_extraction_llm() is None:
+            warmup_state["errors"].append("extraction LLM not initialized")
+        try:
+            import PyPDFForm # noqa: F401 -- first fill otherwise pays for the import
+        except Exception as e:
+            print(f"WARNING: Failed to import PyPDFForm during warmup: {e}")
+            warmup_state["errors"].append(f"PyPDFForm: {e}")
+    except Exception as e:
+        print(f"WARNING: Warmup failed: {e}")
+        warmup_state["errors"].append(f"warmup: {e}")
+    finally:
+        # /api/health must never be left reporting "running"
+        warmup_state["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        warmup_state["status"] = "done"
+    print(f"Warmup finished in {warmup_state['elapsed_ms']}ms" + (f" with errors: {warmup_state['errors']}" if warmup_state["errors"] else "."))
+
+if WARMUP_MODE == "blocking":
+    warmup()
+elif WARMUP_MODE == "background":
+    threading.Thread(target=warmup, name="warmup", daemon=True).start()
+else:
+    warmup_state["status"] = "off"
+# --- End Warmup ---
+
+# Removes abandoned sessions (idle past SESSION_TTL_SECONDS, or LRU over the disk watermark)
+session_manager.start_janitor()
 
 
 @app.route('/api/chat', methods=['POST'])
@@ -65,8 +141,8 @@ def handle_chat():
          return jsonify({"reply": "Okay, I can help with that. Please use the 'Fill Form I-765' button.", "action_needed": "trigger_fill_form"}) # <--- CHANGED Form number
 
     try:
-        response = chat_service.get_rag_response(user_message)
-        return jsonify({"reply": response})
+        response, metadata = chat_service.get_rag_response_with_metadata(user_message)
+        return jsonify({"reply": response, "metadata": metadata})
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
         if "API key not valid" in str(e) or isinstance(e, ConnectionError):
@@ -74,6 +150,40 @@ def handle_chat():
         return jsonify({"error": "An internal error occurred in the chat service."}), 500
 
 
+def _sse_event(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+def handle_chat_stream():
+    """Streams the chat answer as server-sent events: 'token' events, then a terminal 'done' or 'error'."""
+    data = request.get_json()
+    if not data or 'message' not in data or 'session_id' not in data:
+        return jsonify({"error": "Missing 'message' or 'session_id' in request"}), 400
+
+    user_message = data['message']
+    session_id = data['session_id']
+    print(f"Received streaming chat message for session {session_id}: {user_message}")
+
+    def generate():
+        if "fill form i-765" in user_message.lower():
+            yield _sse_event("token", {"text": "Okay, I can help with that. Please use the 'Fill Form I-765' button."})
+            yield _sse_event("done", {"action_needed": "trigger_fill_form"})
+            return
+        try:
+            for event, payload in chat_service.stream_rag_response(user_message):
+                yield _sse_event(event, payload)
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {e}")
+            yield _sse_event("error", {"error": "An internal error occurred in the chat service."})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'} # Keep proxies from buffering tokens
+    )
+
+
 # /api/upload remains the same
 
 @app.route('/api/upload', methods=['POST'])
@@ -92,9 +202,19 @@ def handle_upload():
 
     try:
         # Assuming document_service is correctly imported
-        filename = document_service.save_uploaded_file(file, session_id)
+        with session_manager.lease(session_id):
+            stored = document_service.save_uploaded_file(file, session_id)
+        session_manager.touch(session_id, refresh_usage=True)
+        filename = stored["filename"]
         print(f"File {filename} uploaded for session {session_id}")
-        return jsonify({"message": "File uploaded successfully", "filename": filename})
+        # Start text extraction now so the fill request doesn't pay for it
+        extraction_status = document_service.queue_extraction(session_id, filename)
+        return jsonify({"message": "File uploaded successfully", "filename": filename, "size": stored["size"],
+                        "sha256": stored["sha256"], "deduplicated": stored["deduplicated"],
+                        "extraction_status": extraction_status})
+    except RequestEntityTooLarge as too_large:
+        print(f"Upload rejected for session {session_id}: {too_large.description}")
+        return jsonify({"error": too_large.description}), 413
     except ValueError as ve:
          print(f"Upload error for session {session_id}: {ve}")
          return jsonify({"error": str(ve)}), 400
@@ -106,9 +226,15 @@ def handle_upload():
         return jsonify({"error": "An unexpected error occurred during upload."}), 500
 
 
+@app.route('/api/upload/status/<session_id>', methods=['GET'])
+def handle_upload_status(session_id):
+    """Reports the background text extraction status of each file uploaded in a session."""
+    session_manager.touch(session_id)
+    return jsonify({"session_id": session_id, "files": document_service.get_extraction_status(session_id)})
+
+
 @app.route('/api/list-forms', methods=['GET'])
 def list_available_forms():
-    available_forms = []
     try:
         # Ensure the configuration directory exists
         if not os.path.isdir(FORM_CONFIGS_DIR_ABS):
@@ -117,38 +243,10 @@ def list_available_forms():
             # depending on how you want the frontend to handle this.
             return jsonify({"error": "Form configurations directory not found.", "path_checked": FORM_CONFIGS_DIR_ABS}), 500
 
-        # Scan for .json files in the form_configs directory
-        # Adjust the pattern if your config files might have different casing, e.g., "*.json" or "*.JSON"
-        config_files_pattern = os.path.join(FORM_CONFIGS_DIR_ABS, "*.json")
-        config_files = glob.glob(config_files_pattern)
-        
-        if not config_files:
-            print(f"No .json configuration files found in {FORM_CONFIGS_DIR_ABS}")
-            # Return empty list if no configs are found, which is not necessarily an error.
-            return jsonify([]), 200
-
-        for config_file_path in config_files:
-            try:
-                with open(config_file_path, 'r', encoding='utf-8') as f: # Added encoding
-                    config_data = json.load(f)
-                
-                form_id = config_data.get('form_id')
-                form_name = config_data.get('form_name') # This is the user-friendly name
-
-                if form_id and form_name:
-                    available_forms.append({"id": form_id, "name": form_name})
-                else:
-                    # Log if a JSON file is missing required fields, but don't break the whole list
-                    file_name = os.path.basename(config_file_path)
-                    print(f"Warning: Config file '{file_name}' is missing 'form_id' or 'form_name'. Skipping.")
-
-            except json.JSONDecodeError:
-                file_name = os.path.basename(config_file_path)
-                print(f"Warning: Could not decode JSON from '{file_name}'. Skipping.")
-            except Exception as e: # Catch more general errors during file processing
-                file_name = os.path.basename(config_file_path)
-                print(f"Warning: Error processing config file '{file_name}': {e}. Skipping.")
-        
+        # Configs are parsed once by the registry and only re-read when their mtime changes
+        available_forms = form_registry.list_forms()
+        if not available_forms:
+            print(f"No valid .json configuration files found in {FORM_CONFIGS_DIR_ABS}")
         return jsonify(available_forms), 200
 
     except Exception as e:
@@ -177,39 +275,33 @@ def handle_fill_form():
         # Call a new generic service function that accepts form_type
         # This function will be responsible for loading the correct form config
         # and using it to process the form.
-        # It should return the path to the filled PDF and ideally the suggested download filename.
-        filled_pdf_details = form_filler_service.fill_dynamic_form(session_id, form_type)
-        # Let's assume fill_dynamic_form returns a dictionary like:
-        # {"path": "/path/to/filled_form.pdf", "download_filename": "filled_i-765_john_doe.pdf"}
-        # Or, for simplicity now, just the path, and we construct a generic download name.
-
-        if not filled_pdf_details or "path" not in filled_pdf_details or not filled_pdf_details["path"] or not os.path.exists(filled_pdf_details["path"]):
-             print(f"Form filling process for '{form_type}' completed but no valid PDF path returned for session '{session_id}'.")
-             document_service.cleanup_session_files(session_id) # Cleanup uploaded docs
+        # It returns the filled PDF in memory and the suggested download filename:
+        # {"pdf_bytes": b"%PDF...", "download_filename": "filled_i-765_<session>.pdf"}
+        with session_manager.lease(session_id): # Janitor cleanup waits until the fill has read the files
+            filled_pdf_details = form_filler_service.fill_dynamic_form(session_id, form_type)
+
+        if not filled_pdf_details or not filled_pdf_details.get("pdf_bytes"):
+             print(f"Form filling process for '{form_type}' completed but no PDF was produced for session '{session_id}'.")
+             session_manager.cleanup(session_id) # Cleanup uploaded docs
              return jsonify({"error": f"Form filling for '{form_type}' failed to produce a file."}), 500
 
-        filled_pdf_path = filled_pdf_details["path"]
         # Use a generic download name or one provided by the service
         download_filename = filled_pdf_details.get("download_filename", f"filled_{form_type.replace(' ', '_')}.pdf")
 
 
-        # Schedule cleanup after the file is sent
+        # Schedule cleanup of the uploaded session files after the PDF is sent
         @after_this_request
         def cleanup(response):
             try:
                 print(f"Scheduling cleanup for session '{session_id}' after request for form '{form_type}'.")
-                if os.path.exists(filled_pdf_path):
-                    os.remove(filled_pdf_path)
-                    print(f"Removed specific filled file: {filled_pdf_path}")
-                # Keep cleaning up uploaded session files
-                document_service.cleanup_session_files(session_id)
+                session_manager.cleanup(session_id)
             except Exception as e:
                 print(f"Error during post-request cleanup for session '{session_id}', form '{form_type}': {e}")
             return response
 
-        # Send the file back to the client
+        # Stream the in-memory PDF back to the client
         return send_file(
-            filled_pdf_path,
+            io.BytesIO(filled_pdf_details["pdf_bytes"]),
             mimetype='application/pdf',
             as_attachment=True,
             download_name=download_filename
@@ -217,23 +309,241 @@ def handle_fill_form():
 
     except FileNotFoundError as fnf_e:
         print(f"Fill form error (FileNotFound) for form '{form_type}', session '{session_id}': {fnf_e}")
-        document_service.cleanup_session_files(session_id)
+        session_manager.cleanup(session_id)
         return jsonify({"error": str(fnf_e)}), 404
     except ValueError as ve: # Specific error for unsupported form type from service
         print(f"Fill form error (ValueError) for form '{form_type}', session '{session_id}': {ve}")
-        document_service.cleanup_session_files(session_id)
+        session_manager.cleanup(session_id)
         return jsonify({"error": str(ve)}), 400 # Bad request if form type is invalid/unsupported
+    except LLMUnavailableError as busy_e:
+        # Uploaded documents are kept so the client can retry the same session
+        print(f"Fill form deferred (model busy) for form '{form_type}', session '{session_id}': {busy_e}")
+        return _model_busy_response(busy_e)
     except (ConnectionError, RuntimeError, IOError) as service_e: # Broader service errors
         print(f"Fill form error (Service Error) for form '{form_type}', session '{session_id}': {service_e}")
-        document_service.cleanup_session_files(session_id)
+        session_manager.cleanup(session_id)
         return jsonify({"error": f"Form filling process for '{form_type}' failed: {service_e}"}), 500
     except Exception as e:
         print(f"Unexpected fill form error for form '{form_type}', session '{session_id}': {e}")
         import traceback
         traceback.print_exc()
-        document_service.cleanup_session_files(session_id)
+        session_manager.cleanup(session_id)
         return jsonify({"error": f"An unexpected error occurred during form '{form_type}' filling."}), 500
 
 
+@app.route('/api/fill-form/batch', methods=['POST'])
+def handle_fill_form_batch():
+    """Fills several forms from the same session documents with one extraction pass and returns them as a zip."""
+    data = request.get_json()
+    if not data or 'form_types' not in data or 'session_id' not in data:
+        return jsonify({"error": "Missing 'form_types' or 'session_id' in request"}), 400
+    form_types = data['form_types']
+    if not isinstance(form_types, list) or not all(isinstance(form_type, str) for form_type in form_types):
+        return jsonify({"error": "'form_types' must be a list of form type strings"}), 400
+
+    session_id = data['session_id']
+    forms_label = ", ".join(form_types)
+    print(f"Received request to batch fill forms [{forms_label}] for session '{session_id}'")
+
+    try:
+        with session_manager.lease(session_id):
+            batch = form_filler_service.fill_dynamic_forms_batch(session_id, form_types)
+
+        @after_this_request
+        def cleanup(response):
+            try:
+                print(f"Scheduling cleanup for session '{session_id}' after batch request for forms [{forms_label}].")
+                session_manager.cleanup(session_id)
+            except Exception as e:
+                print(f"Error during post-request cleanup for session '{session_id}', forms [{forms_label}]: {e}")
+            return response
+
+        return send_file(
+            io.BytesIO(batch["zip_bytes"]),
+            mimetype='application/zip',
+            as_attachment=True,
+            download_name=batch["download_filename"]
+        )
+
+    except FileNotFoundError as fnf_e:
+        print(f"Batch fill error (FileNotFound) for forms [{forms_label}], session '{session_id}': {fnf_e}")
+        session_manager.cleanup(session_id)
+        return jsonify({"error": str(fnf_e)}), 404
+    except ValueError as ve:
+        print(f"Batch fill error (ValueError) for forms [{forms_label}], session '{session_id}': {ve}")
+        session_manager.cleanup(session_id)
+        return jsonify({"error": str(ve)}), 400
+    except LLMUnavailableError as busy_e:
+        print(f"Batch fill deferred (model busy) for forms [{forms_label}], session '{session_id}': {busy_e}")
+        return _model_busy_response(busy_e)
+    except (ConnectionError, RuntimeError, IOError) as service_e:
+        print(f"Batch fill error (Service Error) for forms [{forms_label}], session '{session_id}': {service_e}")
+        session_manager.cleanup(session_id)
+        return jsonify({"error": f"Batch form filling process failed: {service_e}"}), 500
+    except Exception as e:
+        print(f"Unexpected batch fill error for forms [{forms_label}], session '{session_id}': {e}")
+        import traceback
+        traceback.print_exc()
+        session_manager.cleanup(session_id)
+        return jsonify({"error": "An unexpected error occurred during batch form filling."}), 500
+
+
+@app.route('/api/fill-form/jobs', methods=['POST'])
+def handle_submit_fill_job():
+    """Queues a form fill in the background worker pool and returns its job id immediately."""
+    data = request.get_json()
+    if not data or 'form_type' not in data or 'session_id' not in data:
+        return jsonify({"error": "Missing 'form_type' or 'session_id' in request"}), 400
+
+    form_type = data['form_type']
+    session_id = data['session_id']
+    print(f"Received fill job request for form '{form_type}', session '{session_id}'")
+
+    try:
+        job = fill_job_manager.submit(session_id, form_type)
+    except QueueFullError as qfe:
+        print(f"Fill job rejected for session '{session_id}': {qfe}")
+        return jsonify({"error": str(qfe), "queue": fill_job_manager.stats()}), 503
+
+    job_id = job["job_id"]
+    return jsonify({
+        **job,
+        "status_url": f"/api/fill-form/jobs/{job_id}",
+        "result_url": f"/api/fill-form/jobs/{job_id}/result",
+        "queue": fill_job_manager.stats(),
+    }), 202
+
+
+@app.route('/api/fill-form/jobs/<job_id>', methods=['GET'])
+def handle_fill_job_status(job_id):
+    """Reports a fill job's status, current stage and progress."""
+    job = fill_job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Fill job '{job_id}' not found or expired."}), 404
+    return jsonify({**job, "queue": fill_job_manager.stats()})
+
+
+@app.route('/api/fill-form/jobs/<job_id>/result', methods=['GET'])
+def handle_fill_job_result(job_id):
+    """Downloads the filled PDF of a finished job."""
+    job = fill_job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Fill job '{job_id}' not found or expired."}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": f"Form filling process for '{job['form_type']}' failed: {job['error']}"}), job["error_status"] or 500
+    result = fill_job_manager.get_result(job_id)
+    if result is None:
+        return jsonify({"error": "Fill job has not finished yet.", "status": job["status"], "stage": job["stage"]}), 409
+
+    pdf_bytes, download_filename = result
+    return send_file(
+        io.BytesIO(pdf_bytes),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=download_filename
+    )
+
+
+@app.route('/api/fill-form/jobs/stats', methods=['GET'])
+def handle_fill_job_stats():
+    """Reports fill worker pool utilisation and queue depth."""
+    return jsonify(fill_job_manager.stats())
+
+
+@app.route('/api/admin/extraction-cache', methods=['GET', 'DELETE'])
+def handle_extraction_cache():
+    """Reports extraction cache stats (GET) or invalidates it (DELETE, optionally ?file_hash=<sha256>)."""
+    cache = get_extraction_cache(EXTRACTOR_VERSION)
+    if cache is None:
+        return jsonify({"enabled": False}), 200
+
+    if request.method == 'DELETE':
+        file_hash = request.args.get('file_hash')
+        cache.invalidate(file_hash)
+        print(f"Extraction cache invalidated ({'entry ' + file_hash if file_hash else 'all entries'}).")
+
+    return jsonify({"enabled": True, **cache.stats()}), 200
+
+
+@app.route('/api/admin/answer-cache', methods=['GET', 'DELETE'])
+def handle_answer_cache():
+    """Reports chat answer cache stats (GET) or clears it (DELETE)."""
+    if chat_service.answer_cache is None:
+        return jsonify({"enabled": False}), 200
+    if request.method == 'DELETE':
+        chat_service.answer_cache.invalidate()
+    return jsonify({"enabled": True, **chat_service.answer_cache.stats()}), 200
+
+
+@app.route('/api/admin/retrieval', methods=['GET'])
+def handle_retrieval_stats():
+    """Reports the chat retrieval mode, BM25 index state and how often each retrieval path was taken."""
+    return jsonify(chat_service.chat_pipeline.retrieval_stats()), 200
+
+
+@app.route('/api/admin/extraction-result-cache', methods=['GET', 'DELETE'])
+def handle_extraction_result_cache():
+    """Reports form extraction result cache stats (GET) or clears it (DELETE)."""
+    if extraction_result_cache is None:
+        return jsonify({"enabled": False}), 200
+    if request.method == 'DELETE':
+        extraction_result_cache.invalidate()
+    return jsonify({"enabled": True, **extraction_result_cache.stats()}), 200
+
+
+@app.route('/api/admin/llm', methods=['GET'])
+def handle_llm_stats():
+    """Reports the model gateway's in-flight and queued calls, rate limit headroom and retry counters."""
+    return jsonify(llm_gateway.stats()), 200
+
+
+@app.route('/api/admin/singleflight', methods=['GET'])
+def handle_singleflight_stats():
+    """Reports how many identical concurrent chat and fill requests shared another request's result."""
+    return jsonify({"chat": chat_service.chat_flight.stats(), "fill": form_filler_service.fill_flight.stats()}), 200
+
+
+@app.route('/api/admin/sessions', methods=['GET'])
+def handle_session_stats():
+    """Reports indexed sessions, their disk usage, in-flight leases and janitor activity."""
+    return jsonify(session_manager.stats()), 200
+
+
+@app.route('/api/admin/upload-store', methods=['GET'])
+def handle_upload_store_stats():
+    """Reports the content-addressed upload store's size, deduplication counts and quotas."""
+    return jsonify(upload_store.stats()), 200
+
+
+def _model_busy_response(error: LLMUnavailableError):
+    response = jsonify({"error": f"The model is busy, please retry shortly. {error}", "retry_after": error.retry_after})
+    response.headers["Retry-After"] = str(int(round(error.retry_after or 1)))
+    return response, 503
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(error):
+    """Uploads over a quota (possibly rejected while the body was still being read) get a JSON 413."""
+    return jsonify({"error": error.description}), 413
+
+
+@app.route('/api/health', methods=['GET'])
+def handle_health():
+    """Liveness check; also reports whether warmup has finished and what is already loaded."""
+    return jsonify({
+        "status": "ok",
+        "warmup": warmup_state,
+        "vector_store_loaded": chroma_db.vector_store is not None,
+        "chat_llm_loaded": chat_service.chat_pipeline.llm is not None,
+        "extraction_llm_loaded": form_filler_service.extraction_llm is not None,
+    }), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    """Per-stage latency histograms and request counters in the Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
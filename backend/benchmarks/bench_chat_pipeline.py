@@ -0,0 +1,78 @@
+# backend/benchmarks/bench_chat_pipeline.py
+"""
+Micro-benchmark: building the chat pipeline and its retriever for every request vs. the shared
+ChatPipeline, which builds the retriever once and reuses it.
+Runs offline with a fake LLM and an in-memory vector store.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_chat_pipeline --iterations 500
+"""
+
+import io
+import time
+import argparse
+import contextlib
+
+from langchain_community.llms.fake import FakeListLLM
+from langchain_core.documents import Document
+from langchain_core.embeddings.fake import DeterministicFakeEmbedding
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from backend.services.chat_service import ChatPipeline, RAG_PROMPT
+from backend.services.llm_client import ModelGateway
+
+
+def _build_store():
+    store = InMemoryVectorStore(embedding=DeterministicFakeEmbedding(size=256))
+    store.add_documents([
+        Document(page_content=f"Form I-765 fact number {i}: processing and filing details.", metadata={"source": "bench"})
+        for i in range(50)
+    ])
+    return store
+
+
+def _time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    store = _build_store()
+    llm = FakeListLLM(responses=["Form I-765 takes about 90 days."])
+    query = "How long does I-765 take?"
+
+    # Unlimited gateway: the fake LLM needs no rate limiting, only the admission overhead is measured
+    gateway = ModelGateway(requests_per_minute=0, tokens_per_minute=0)
+
+    def build_per_request():
+        fresh = ChatPipeline(llm, prompt=RAG_PROMPT, k=args.k, vector_store_getter=lambda: store, gateway=gateway)
+        fresh.get_retriever()
+        return fresh
+
+    pipeline = ChatPipeline(llm, prompt=RAG_PROMPT, k=args.k, vector_store_getter=lambda: store, gateway=gateway)
+    pipeline.get_retriever() # Built once, as at app startup
+
+    with contextlib.redirect_stdout(io.StringIO()): # Every per-request build logs a line
+        construct_ms = _time_per_call(build_per_request, args.iterations)
+        reuse_ms = _time_per_call(pipeline.get_retriever, args.iterations)
+        per_request_ms = _time_per_call(lambda: build_per_request().invoke(query), args.iterations)
+        shared_ms = _time_per_call(lambda: pipeline.invoke(query), args.iterations)
+
+    print(f"Iterations: {args.iterations}, k={args.k}")
+    print(f"Pipeline + retriever construction per request: {construct_ms:8.3f} ms")
+    print(f"Cached retriever lookup:                       {reuse_ms:8.3f} ms")
+    print(f"Full request, build per request:               {per_request_ms:8.3f} ms")
+    print(f"Full request, cached retriever:                {shared_ms:8.3f} ms")
+    print(f"Overhead removed per request:                  {per_request_ms - shared_ms:8.3f} ms")
+    print(f"Shared pipeline retriever builds: {pipeline.builds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# backend/benchmarks/bench_embeddings.py
+"""
+Benchmark: ingest throughput and query latency per embedding provider.
+Chunks the sample USCIS data (repeated to --chunks), embeds and adds it to a throwaway Chroma
+store, then times similarity_search. 'google' makes real API calls and needs GOOGLE_API_KEY;
+'local' needs sentence-transformers installed. Providers that cannot be created are skipped.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_embeddings --providers hashing,local --chunks 500
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from backend.vector_store.embeddings import get_embeddings, resolve_provider
+
+_SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_uscis_data")
+QUERIES = [
+    "How long does I-765 take?",
+    "What is category (c)(9)?",
+    "How do I replace a green card?",
+    "What is the filing fee for an EAD?",
+    "Can I travel while my adjustment of status is pending?",
+]
+
+
+def _load_chunks(count: int) -> list:
+    texts = []
+    for filename in sorted(os.listdir(_SAMPLE_DIR)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(_SAMPLE_DIR, filename), "r", encoding="utf-8") as f:
+                texts.append(f.read())
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    base = splitter.split_documents([Document(page_content=text, metadata={"source": "bench"}) for text in texts])
+    # Repeat the corpus with a copy number so every chunk is a distinct text
+    return [
+        Document(page_content=f"[copy {i // len(base)}] {base[i % len(base)].page_content}", metadata={"source": "bench"})
+        for i in range(count)
+    ]
+
+
+def _bench_provider(provider: str, chunks: list, queries: int) -> dict:
+    embeddings = get_embeddings(provider)
+    texts = [chunk.page_content for chunk in chunks]
+
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    embed_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        start = time.perf_counter()
+        store = Chroma(persist_directory=store_dir, embedding_function=embeddings, collection_name=f"bench_{provider}")
+        store.add_documents(chunks)
+        ingest_seconds = time.perf_counter() - start
+
+        store.similarity_search(QUERIES[0], k=3) # Warm up
+        latencies = []
+        for i in range(queries):
+            start = time.perf_counter()
+            store.similarity_search(QUERIES[i % len(QUERIES)], k=3)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    latencies.sort()
+    return {
+        "model": resolve_provider(provider)[1],
+        "embed_chunks_per_s": len(chunks) / embed_seconds,
+        "ingest_chunks_per_s": len(chunks) / ingest_seconds,
+        "query_p50_ms": statistics.median(latencies),
+        "query_p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--providers", default="hashing,local", help="Comma-separated: google, local, hashing")
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    chunks = _load_chunks(args.chunks)
+    print(f"Chunks: {len(chunks)}, queries: {args.queries}")
+    print(f"{'provider':<10} {'model':<42} {'embed/s':>10} {'ingest/s':>10} {'q p50 ms':>10} {'q p95 ms':>10}")
+    for provider in [p.strip() for p in args.providers.split(",") if p.strip()]:
+        try:
+            result = _bench_provider(provider, chunks, args.queries)
+        except Exception as e:
+            print(f"{provider:<10} skipped: {e}")
+            continue
+        print(f"{provider:<10} {result['model']:<42} {result['embed_chunks_per_s']:>10.1f} {result['ingest_chunks_per_s']:>10.1f} "
+              f"{result['query_p50_ms']:>10.2f} {result['query_p95_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# backend/benchmarks/bench_form_fill.py
+"""
+Micro-benchmark: filling a PDF form from its template path and round-tripping the result through
+a temporary file (the old fill path) vs. filling the in-memory TemplateCache entry into a buffer.
+Runs offline against a generated multi-page AcroForm template, or a real one passed with --template.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_form_fill --iterations 20
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from PyPDFForm import FormWrapper
+
+from backend.services.form_filler_service import TemplateCache
+
+
+def _build_template(path: str, pages: int, fields_per_page: int):
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(path)
+    for page in range(pages):
+        for i in range(fields_per_page):
+            c.acroForm.textfield(name=f"field_{page}_{i}", x=60, y=780 - i * 24, width=240, height=18)
+        c.showPage()
+    c.save()
+
+
+def _fields_of(path: str) -> list:
+    from pypdf import PdfReader
+
+    return sorted((PdfReader(path).get_fields() or {}).keys())
+
+
+def _fills_per_second(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--template", help="Path to a fillable PDF; a synthetic one is generated when omitted")
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--fields-per-page", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        template_path = args.template
+        if not template_path:
+            template_path = os.path.join(work_dir, "template.pdf")
+            _build_template(template_path, args.pages, args.fields_per_page)
+        field_names = _fields_of(template_path)
+        # Fill every third field, as an extraction typically leaves some fields empty
+        data_for_pdf = {name: f"Value {i}" for i, name in enumerate(field_names) if i % 3 == 0}
+
+        def fill_from_path():
+            output_path = os.path.join(work_dir, "filled.pdf")
+            pdf_wrapper = FormWrapper(template_path)
+            pdf_wrapper.fill(data_for_pdf, adobe_mode=True)
+            with open(output_path, "wb+") as output_file:
+                output_file.write(pdf_wrapper.read())
+            with open(output_path, "rb") as sent_file: # What send_file did
+                sent_file.read()
+            os.remove(output_path) # What the after_this_request hook did
+
+        cache = TemplateCache()
+        cache.get(template_path) # Loaded once, as on the first fill of a form
+
+        def fill_from_cache():
+            io.BytesIO(cache.fill(template_path, data_for_pdf)).read()
+
+        fill_from_path() # Warm up imports and PyPDFForm's own memoization
+        old_rate = _fills_per_second(fill_from_path, args.iterations)
+        new_rate = _fills_per_second(fill_from_cache, args.iterations)
+
+    print(f"Iterations: {args.iterations}, fields: {len(field_names)}, filled: {len(data_for_pdf)}")
+    print(f"Template path + temp file:  {old_rate:8.2f} fills/s  ({1000.0 / old_rate:8.2f} ms/fill)")
+    print(f"Cached template + buffer:   {new_rate:8.2f} fills/s  ({1000.0 / new_rate:8.2f} ms/fill)")
+    print(f"Speedup:                    {new_rate / old_rate:8.2f}x")
+    print(f"Template cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# backend/benchmarks/bench_llm_gateway.py
+"""
+Burst benchmark for the shared model gateway: concurrent fill and chat calls through a real
+Gemini client pointed at the local fake model server, which enforces its own quota and injects errors.
+Reports latency per priority, the gateway's queued/throttled/retried counters and how many 429s
+the server had to send.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_llm_gateway --fills 20 --chats 20 --server-rpm 60 --rpm 50
+"""
+
+import os
+import time
+import argparse
+import statistics
+import threading
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+from backend.benchmarks.fake_model_server import start_server
+from backend.services import llm_client
+from backend.services.llm_client import ModelGateway, LLMUnavailableError, PRIORITY_FILL, PRIORITY_CHAT
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fills", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4, help="Gateway concurrency cap")
+    parser.add_argument("--rpm", type=float, default=50, help="Gateway requests per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=float, default=0, help="Gateway tokens per minute (0 = unlimited)")
+    parser.add_argument("--server-rpm", type=int, default=60, help="Fake server quota before it answers 429")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Fraction of calls the fake server fails")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Fake server response time")
+    parser.add_argument("--retry-base-delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = start_server(latency_ms=args.latency_ms, rpm=args.server_rpm, error_rate=args.error_rate)
+    llm_client.LLM_API_ENDPOINT = server.endpoint
+    model = llm_client.create_chat_model("gemini-2.0-flash-lite", temperature=0.0)
+    gateway = ModelGateway(max_concurrency=args.concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                           retry_base_delay=args.retry_base_delay, retry_max_delay=5.0, queue_timeout=120.0)
+
+    latencies = {"fill": [], "chat": []}
+    outcomes = {"ok": 0, "unavailable": 0, "error": 0}
+    lock = threading.Lock()
+
+    def call(kind: str, priority: int, index: int):
+        start = time.perf_counter()
+        try:
+            gateway.invoke(model, f"{kind} request {index}: " + "document text " * 200, priority=priority)
+            outcome = "ok"
+        except LLMUnavailableError:
+            outcome = "unavailable"
+        except Exception as e:
+            print(f"{kind} call {index} failed: {e}")
+            outcome = "error"
+        with lock:
+            outcomes[outcome] += 1
+            if outcome == "ok":
+                latencies[kind].append(time.perf_counter() - start)
+
+    # Chat arrives first, then a burst of fills; fills should still finish ahead of most queued chats
+    threads = [threading.Thread(target=call, args=("chat", PRIORITY_CHAT, i)) for i in range(args.chats)]
+    threads += [threading.Thread(target=call, args=("fill", PRIORITY_FILL, i)) for i in range(args.fills)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+        time.sleep(0.002)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"{args.chats + args.fills} calls in {elapsed:.2f}s: {outcomes}")
+    for kind, values in latencies.items():
+        if values:
+            print(f"  {kind:<5} p50 {statistics.median(values):6.2f}s  p95 {_percentile(values, 0.95):6.2f}s  (n={len(values)})")
+    stats = gateway.stats()
+    print(f"Gateway: queued={stats['queued']} throttled={stats['throttled']} retried={stats['retried']} "
+          f"failed={stats['failed']} rejected={stats['rejected']}")
+    print(f"Fake server: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# backend/benchmarks/bench_startup.py
+"""
+Startup benchmark: time to import backend.app, to serve a first request and to be fully warm,
+in fresh interpreters for each WARMUP_MODE. Uses a placeholder GOOGLE_API_KEY if none is set
+(clients are created but never called).
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_startup --runs 5
+    python -m backend.benchmarks.bench_startup --modes off --importtime 15
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+_backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_repo_root = os.path.dirname(_backend_dir)
+
+RESULT_MARKER = "STARTUP_RESULT "
+
+# Runs in the child interpreter; app prints are sent to stderr so stdout only carries the result
+_CHILD_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+stdout, sys.stdout = sys.stdout, sys.stderr
+import backend.app as app_module
+imported = time.perf_counter()
+response = app_module.app.test_client().get("/api/health")
+first_request = time.perf_counter()
+# Whatever warmup has not done yet is what the first chat or fill request would pay for
+if app_module.warmup_state["status"] == "off":
+    app_module.warmup()
+while app_module.warmup_state["status"] != "done": # Background warmup still running
+    time.sleep(0.005)
+ready = time.perf_counter()
+sys.stdout = stdout
+print("%s" + json.dumps({
+    "import_s": imported - start,
+    "first_request_s": first_request - start,
+    "ready_s": ready - start,
+    "status": response.status_code,
+}))
+""" % RESULT_MARKER
+
+
+def _child_env(mode: str) -> dict:
+    env = dict(os.environ)
+    env["WARMUP_MODE"] = mode
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+    env["PYTHONPATH"] = _repo_root + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def run_once(mode: str) -> dict:
+    completed = subprocess.run([sys.executable, "-c", _CHILD_SCRIPT], cwd=_repo_root, env=_child_env(mode),
+                               capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"Startup run ({mode}) failed:\n{completed.stderr[-2000:]}")
+
+
+def top_imports(mode: str, count: int) -> list:
+    """Returns the `count` slowest modules by cumulative import time (python -X importtime)."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import backend.app"], cwd=_repo_root,
+                               env=_child_env(mode), capture_output=True, text=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per mode (medians are reported)")
+    parser.add_argument("--modes", default="off,background,blocking", help="Comma-separated WARMUP_MODE values")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="Also list the N slowest imports")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'mode':<12} {'import':>10} {'1st request':>12} {'ready':>10}")
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        runs = [run_once(mode) for _ in range(args.runs)]
+        results[mode] = {key: statistics.median(run[key] for run in runs) for key in ("import_s", "first_request_s", "ready_s")}
+        print(f"{mode:<12} {results[mode]['import_s'] * 1000:>8.0f}ms {results[mode]['first_request_s'] * 1000:>10.0f}ms "
+              f"{results[mode]['ready_s'] * 1000:>8.0f}ms")
+
+    if args.importtime:
+        print("\nSlowest imports (cumulative, WARMUP_MODE=off):")
+        for cumulative_us, name in top_imports("off", args.importtime):
+            print(f"  {cumulative_us / 1000:>8.1f}ms  {name}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
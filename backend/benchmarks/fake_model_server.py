@@ -0,0 +1,124 @@
+# backend/benchmarks/fake_model_server.py
+"""
+Local stand-in for the Gemini REST API (generateContent and streamGenerateContent), for exercising
+the model gateway without network access or quota. It can add latency, enforce its own
+requests-per-minute quota and fail a fraction of calls with 429 or 503.
+
+Point the app at it with LLM_API_ENDPOINT=http://127.0.0.1:<port>:
+    python -m backend.benchmarks.fake_model_server --port 8090 --rpm 20 --error-rate 0.1
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, reply: str = "OK", latency_ms: float = 50.0, rpm: int = 0, error_rate: float = 0.0):
+        super().__init__(address, _Handler)
+        self.reply = reply
+        self.latency_ms = latency_ms
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._recent = deque() # Accepted request times in the last minute
+        self.in_flight = 0
+        self.stats = {"requests": 0, "ok": 0, "quota_429": 0, "injected_errors": 0, "max_in_flight": 0}
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def admit(self):
+        """Returns None to serve the request, or (status, reason) to fail it."""
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            while self._recent and now - self._recent[0] > 60.0:
+                self._recent.popleft()
+            if self.rpm and len(self._recent) >= self.rpm:
+                self.stats["quota_429"] += 1
+                return 429, "RESOURCE_EXHAUSTED"
+            if self.error_rate and random.random() < self.error_rate:
+                self.stats["injected_errors"] += 1
+                return random.choice(((429, "RESOURCE_EXHAUSTED"), (503, "UNAVAILABLE")))
+            self._recent.append(now)
+            self.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+            return None
+
+    def finish(self):
+        with self._lock:
+            self.in_flight -= 1
+            self.stats["ok"] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request_body = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+        rejection = self.server.admit()
+        if rejection is not None:
+            status, reason = rejection
+            self._send_json(status, {"error": {"code": status, "message": f"Fake server: {reason}", "status": reason}})
+            return
+        try:
+            time.sleep(self.server.latency_ms / 1000.0)
+            prompt_tokens = len(request_body) // 4
+            output_tokens = len(self.server.reply) // 4 + 1
+            response = {
+                "candidates": [{"content": {"parts": [{"text": self.server.reply}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                                  "totalTokenCount": prompt_tokens + output_tokens},
+            }
+            # The REST transport reads streamed responses as one JSON array
+            self._send_json(200, [response] if ":streamGenerateContent" in self.path else response)
+        finally:
+            self.server.finish()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **options) -> FakeModelServer:
+    """Starts the server on a background thread; port 0 picks a free port (see server.endpoint)."""
+    server = FakeModelServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-model-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--reply", default="OK", help="Text returned for every prompt")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--rpm", type=int, default=0, help="Server-side requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failed with 429 or 503")
+    args = parser.parse_args()
+
+    server = FakeModelServer((args.host, args.port), reply=args.reply, latency_ms=args.latency_ms, rpm=args.rpm, error_rate=args.error_rate)
+    print(f"Fake model server listening on {server.endpoint} (set LLM_API_ENDPOINT to this).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Fake model server stats: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# backend/benchmarks/fakes.py
+"""
+Deterministic offline stand-ins for the external services, plus generators for fixture files.
+Used by run_benchmarks.py so the hot paths can be timed without network access or credentials.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+
+from langchain_community.llms.fake import FakeListLLM
+from langchain_core.embeddings.fake import DeterministicFakeEmbedding
+
+from backend.utils.ocr import OCRBackend
+
+FAKE_OCR_TEXT = "FAKE OCR TEXT\nName: Jane Doe\nA-Number: A123456789\nDate of Birth: 01/02/1990\n"
+
+
+def silence_output():
+    """Process pool initializer: discards a worker's prints, which redirect_stdout in the parent cannot reach."""
+    sys.stdout = open(os.devnull, "w")
+
+
+class FakeVisionBackend(OCRBackend):
+    """OCR backend that returns fixed text for every image, optionally sleeping to mimic API latency."""
+
+    def __init__(self, latency_seconds: float = 0.0, text: str = FAKE_OCR_TEXT):
+        self.latency_seconds = latency_seconds
+        self.text = text
+        self.calls = 0
+        self.images = 0
+
+    def annotate_batch(self, contents: list) -> list:
+        self.calls += 1
+        self.images += len(contents)
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return [(self.text, None) for _ in contents]
+
+
+def fake_llm(responses: list) -> FakeListLLM:
+    """LLM that answers with the given responses in turn, cycling when they run out."""
+    return FakeListLLM(responses=responses)
+
+
+def fake_extraction_llm(field_ids: list) -> FakeListLLM:
+    """LLM whose extraction response fills every given field id with a fixed value."""
+    return FakeListLLM(responses=["```json\n" + json.dumps({field_id: f"value-{field_id}" for field_id in field_ids}) + "\n```"])
+
+
+def fake_embeddings(size: int = 256) -> DeterministicFakeEmbedding:
+    """Embeddings seeded by the text's hash: the same text always gets the same vector, no network."""
+    return DeterministicFakeEmbedding(size=size)
+
+
+# --- Fixture files ---
+def write_text_pdf(path: str, pages: int = 5, lines_per_page: int = 40):
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(path)
+    for page in range(pages):
+        for line in range(lines_per_page):
+            c.drawString(50, 800 - line * 18, f"Page {page + 1} line {line + 1}: applicant details and supporting evidence text.")
+        c.showPage()
+    c.save()
+
+
+def write_form_template(path: str, pages: int = 4, fields_per_page: int = 30) -> list:
+    """Writes a fillable AcroForm PDF and returns its field names."""
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(path)
+    names = []
+    for page in range(pages):
+        for i in range(fields_per_page):
+            name = f"field_{page}_{i}"
+            c.acroForm.textfield(name=name, x=60, y=780 - i * 24, width=240, height=18)
+            names.append(name)
+        c.showPage()
+    c.save()
+    return names
+
+
+def write_text_file(path: str, lines: int = 400):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in range(lines):
+            f.write(f"Line {line + 1}: Family name Doe, given name Jane, A-Number A123456789, address 1 Main St.\n")
+
+
+def write_png(path: str, width: int = 800, height: int = 600):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color=(255, 255, 255)).save(buffer, format="PNG")
+    with open(path, "wb") as f:
+        f.write(buffer.getvalue())
+# --- End Fixture files ---
@@ -0,0 +1,263 @@
+# backend/benchmarks/run_benchmarks.py
+"""
+Component micro-benchmark suite for the backend's hot paths, run fully offline: Gemini, the
+embeddings API and Cloud Vision are replaced by the deterministic stand-ins in fakes.py.
+
+Benchmarks: extract_text on PDF, TXT and image inputs, get_session_documents_content,
+_map_llm_data_to_pdf_fields, the PyPDFForm template fill, Chroma similarity search and
+get_rag_response. Text and answer caches are disabled so every iteration does the real work.
+
+Run from the repository root:
+    python -m backend.benchmarks.run_benchmarks --output bench.json
+    python -m backend.benchmarks.run_benchmarks --baseline bench.json --threshold 0.25
+With --baseline, exits with status 1 if any benchmark's p50 is more than --threshold slower.
+"""
+
+import os
+
+# Configure before any backend module reads its settings at import time
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("EXTRACTION_CACHE_ENABLED", "false")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("EXTRACTION_RESULT_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+# Fake models answer instantly; the gateway's per-minute quotas would only measure the limiter
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from backend.benchmarks import fakes
+from backend.utils import ocr
+from backend.utils.text_extractor import extract_text
+from backend.services import document_service, chat_service
+from backend.services.form_filler_service import _map_llm_data_to_pdf_fields, _fill_form_template
+from backend.vector_store import chroma_db
+
+RESULTS_VERSION = 1
+QUERIES = [
+    "How long does I-765 take?",
+    "What is category (c)(9)?",
+    "How do I replace a green card?",
+    "What is the filing fee for an EAD?",
+]
+BENCHMARKS = {} # name -> setup(workdir) returning the zero-argument callable to time
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+# --- Benchmarks ---
+@benchmark("extract_text_pdf")
+def _setup_extract_pdf(workdir: str):
+    path = os.path.join(workdir, "document.pdf")
+    fakes.write_text_pdf(path, pages=10)
+    return lambda: extract_text(path, use_cache=False)
+
+@benchmark("extract_text_txt")
+def _setup_extract_txt(workdir: str):
+    path = os.path.join(workdir, "document.txt")
+    fakes.write_text_file(path)
+    return lambda: extract_text(path, use_cache=False)
+
+@benchmark("extract_text_image")
+def _setup_extract_image(workdir: str):
+    path = os.path.join(workdir, "scan.png")
+    fakes.write_png(path)
+    return lambda: extract_text(path, use_cache=False)
+
+@benchmark("session_documents")
+def _setup_session_documents(workdir: str):
+    session_id = f"bench-{uuid.uuid4().hex}"
+    session_dir = os.path.join(workdir, "uploads", session_id)
+    os.makedirs(session_dir)
+    for i in range(3):
+        fakes.write_text_pdf(os.path.join(session_dir, f"evidence_{i}.pdf"), pages=4)
+        fakes.write_text_file(os.path.join(session_dir, f"notes_{i}.txt"))
+    fakes.write_png(os.path.join(session_dir, "passport.png"))
+    document_service.UPLOAD_FOLDER_ABS = os.path.join(workdir, "uploads")
+    return lambda: document_service.get_session_documents_content(session_id)
+
+@benchmark("map_fields")
+def _setup_map_fields(workdir: str):
+    data_types = ["text", "date", "checkbox", "text"]
+    fields = [
+        {"id": f"field_{i}", "pdf_field_name": f"form1[0].Page1[0].Field_{i}[0]", "data_type": data_types[i % len(data_types)]}
+        for i in range(200)
+    ]
+    mapping = [(field["id"], field["pdf_field_name"], field["data_type"], field) for field in fields]
+    values = {"text": "Jane Doe", "date": "1990-01-02", "checkbox": "true"}
+    extracted = {field["id"]: values[field["data_type"]] if i % 5 else "NOT_FOUND" for i, field in enumerate(fields)}
+    return lambda: _map_llm_data_to_pdf_fields(extracted, pdf_field_mapping=mapping)
+
+@benchmark("form_fill")
+def _setup_form_fill(workdir: str):
+    template_path = os.path.join(workdir, "template.pdf")
+    names = fakes.write_form_template(template_path)
+    form_config = {"template_path": template_path}
+    data_for_pdf = {name: f"Value {i}" for i, name in enumerate(names)}
+    return lambda: _fill_form_template("bench", form_config, data_for_pdf)
+
+def _build_store(workdir: str) -> Chroma:
+    texts = [
+        f"Chunk {i}: Form I-765 processing, category (c)({i % 20}), fees of ${410 + i}, biometrics and travel while pending."
+        for i in range(500)
+    ]
+    store = Chroma(persist_directory=os.path.join(workdir, "chroma"), embedding_function=fakes.fake_embeddings(),
+                   collection_name=f"bench_{uuid.uuid4().hex[:8]}")
+    store.add_documents([Document(page_content=text, metadata={"source": f"doc_{i % 10}.txt"}) for i, text in enumerate(texts)])
+    return store
+
+@benchmark("chroma_search")
+def _setup_chroma_search(workdir: str):
+    store = _build_store(workdir)
+    counter = iter(range(10 ** 9))
+    return lambda: store.similarity_search(QUERIES[next(counter) % len(QUERIES)], k=3)
+
+@benchmark("rag_response")
+def _setup_rag_response(workdir: str):
+    chroma_db.vector_store = _build_store(workdir)
+    chroma_db.embeddings = chroma_db.vector_store.embeddings
+    chroma_db.lexical_index = None
+    chat_service.answer_cache = None
+    chat_service.chat_pipeline.configure(llm=fakes.fake_llm(["Form I-765 usually takes 3 to 5 months to process."]))
+    counter = iter(range(10 ** 9))
+    return lambda: chat_service.get_rag_response(QUERIES[next(counter) % len(QUERIES)])
+# --- End Benchmarks ---
+
+
+def _time(fn, iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+        "ops_per_s": round(1000.0 / statistics.fmean(samples), 2) if samples[0] > 0 else None,
+    }
+
+
+def _use_quiet_pdf_workers():
+    """Replaces document_service's PDF process pool with one whose workers do not print."""
+    document_service._reset_cpu_executor()
+    with document_service._executor_lock:
+        document_service._cpu_executor = ProcessPoolExecutor(
+            max_workers=document_service.EXTRACTION_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=fakes.silence_output,
+        )
+
+
+def run(names: list, iterations: int, warmup: int, verbose: bool = False) -> dict:
+    previous_backend = ocr.set_ocr_backend(fakes.FakeVisionBackend(latency_seconds=0.0))
+    if not verbose:
+        _use_quiet_pdf_workers()
+    workdir = tempfile.mkdtemp(prefix="aiff_bench_")
+    results = {}
+    try:
+        for name in names:
+            bench_dir = os.path.join(workdir, name)
+            os.makedirs(bench_dir)
+            # The components log every call; keep their output out of the report unless asked for
+            with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+                fn = BENCHMARKS[name](bench_dir)
+                results[name] = _time(fn, iterations, warmup)
+            print(f"  {name:<20} p50 {results[name]['p50_ms']:>9.3f} ms  p95 {results[name]['p95_ms']:>9.3f} ms  "
+                  f"{results[name]['ops_per_s'] or 0:>9.1f} ops/s", flush=True)
+    finally:
+        ocr.set_ocr_backend(previous_backend)
+        if not verbose:
+            document_service._reset_cpu_executor() # The next caller gets the normal pool
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "warmup": warmup,
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Returns (name, baseline_p50, current_p50, ratio) for every benchmark whose p50 regressed beyond threshold."""
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous or not previous.get("p50_ms"):
+            continue
+        ratio = current["p50_ms"] / previous["p50_ms"]
+        marker = "REGRESSION" if ratio > 1.0 + threshold else "ok"
+        print(f"  {name:<20} {previous['p50_ms']:>9.3f} -> {current['p50_ms']:>9.3f} ms  ({ratio:.2f}x)  {marker}")
+        if ratio > 1.0 + threshold:
+            regressions.append((name, previous["p50_ms"], current["p50_ms"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--verbose", action="store_true", help="Show the components' own log output")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p50 slowdown vs. the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.only.split(",") if name.strip()] or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    print(f"Running {len(names)} benchmark(s), {args.iterations} iterations each...")
+    results = run(names, args.iterations, args.warmup, args.verbose)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Wrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Comparing p50 against {args.baseline} (threshold {args.threshold:.0%}):")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed: {', '.join(name for name, *_ in regressions)}")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
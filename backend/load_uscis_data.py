@@ -1,11 +1,24 @@
 import os
+import sys
+import json
+import hashlib
+import argparse
 import chromadb
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.vectorstores import Chroma
 from langchain.docstore.document import Document
 from dotenv import load_dotenv
 
+# Allow `python backend/load_uscis_data.py` to use the same absolute backend.* imports as the app
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+from backend.vector_store.chroma_db import write_ingest_marker
+from backend.vector_store.lexical_index import write_lexical_index, LEXICAL_INDEX_FILENAME
+from backend.vector_store.embeddings import (
+    get_embeddings, embedding_signature, check_embedding_signature, write_embedding_signature, resolve_provider
+)
+
 load_dotenv()
 
 # Configuration from .env
@@ -13,14 +26,20 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "vector_store_data/chroma_db")
 SAMPLE_DATA_DIR = os.getenv("SAMPLE_DATA_DIR", "sample_uscis_data")
 
-# Ensure API key is available
-if not GOOGLE_API_KEY:
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Records file and chunk content hashes so re-runs only embed what changed
+MANIFEST_FILENAME = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+
+# Ensure API key is available when embedding through the Gemini API
+if resolve_provider()[0] == "google" and not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY not found in .env file.")
 
-# Initialize Embeddings model
+# Initialize Embeddings model (EMBEDDING_PROVIDER); the app must be configured with the same provider
 try:
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GOOGLE_API_KEY)
-    print("Gemini Embeddings model initialized successfully.")
+    embeddings = get_embeddings()
+    print("Embeddings model initialized successfully.")
 except Exception as e:
     print(f"Error initializing Gemini Embeddings model: {e}")
     # Provide guidance if the API key is likely the issue
@@ -46,22 +65,54 @@ def load_documents_from_directory(directory_path):
                 print(f"Error loading file {filename}: {e}")
     return documents
 
-# Function to setup ChromaDB
-def setup_vector_store(documents):
-    if not documents:
-        print("No documents loaded, skipping vector store setup.")
-        return None
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-    print("Splitting documents...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    texts = text_splitter.split_documents(documents)
+def _chunk_ids(source: str, chunks) -> list:
+    """
+    Stable chunk IDs derived from the source name and chunk content, so an unchanged chunk keeps
+    its ID (and embedding) when other parts of the file change. Repeated identical chunks within
+    a file are told apart by their occurrence number.
+    """
+    seen = {}
+    ids = []
+    source_hash = _sha256(source)[:12]
+    for chunk in chunks:
+        content_hash = _sha256(chunk.page_content)[:32]
+        occurrence = seen.get(content_hash, 0)
+        seen[content_hash] = occurrence + 1
+        ids.append(f"{source_hash}-{content_hash}-{occurrence}")
+    return ids
 
-    if not texts:
-        print("No text chunks generated after splitting, skipping vector store setup.")
+def load_manifest(persist_directory: str) -> dict:
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            print(f"Ingest manifest version {manifest.get('version')} is not supported, ignoring it.")
+            return None
+        return manifest
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Could not read ingest manifest {manifest_path}: {e}")
         return None
 
-    print(f"Generated {len(texts)} text chunks.")
-    print(f"Creating Chroma vector store at: {VECTOR_DB_PATH}")
+def save_manifest(persist_directory: str, manifest: dict):
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+# Function to setup ChromaDB
+def setup_vector_store(documents, full_rebuild: bool = False):
+    """
+    Creates or incrementally updates the Chroma store. Only new or changed chunks are embedded,
+    chunks of deleted or changed files are removed, and a summary of the changes is printed.
+    """
+    print(f"Opening Chroma vector store at: {VECTOR_DB_PATH}")
     os.makedirs(VECTOR_DB_PATH, exist_ok=True)
 
     try:
@@ -69,26 +120,107 @@ def setup_vector_store(documents):
         if not os.path.isdir(VECTOR_DB_PATH) or not os.access(VECTOR_DB_PATH, os.W_OK):
              raise OSError(f"Vector DB path '{VECTOR_DB_PATH}' is not a writable directory.")
 
-        # Use Chroma.from_documents to create and persist the store
-        vector_store = Chroma.from_documents(
-            documents=texts,
-            embedding=embeddings,
-            persist_directory=VECTOR_DB_PATH
-        )
-        print("Vector store created and persisted successfully.")
+        signature = embedding_signature()
+        if not full_rebuild:
+            # Adding chunks from another embedding space would silently corrupt search results
+            check_embedding_signature(VECTOR_DB_PATH, signature)
+
+        vector_store = Chroma(persist_directory=VECTOR_DB_PATH, embedding_function=embeddings)
+        splitter_config = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+        manifest = None if full_rebuild else load_manifest(VECTOR_DB_PATH)
+
+        if manifest is not None and manifest.get("splitter") != splitter_config:
+            print("Chunking settings changed since the last ingest, rebuilding the store.")
+            manifest = None
+        if manifest is None:
+            existing_count = vector_store._collection.count()
+            if existing_count:
+                # No usable manifest: chunk IDs in the store are unknown, so start clean to avoid duplicates
+                print(f"Resetting existing collection ({existing_count} chunks) for a full rebuild.")
+                vector_store.delete_collection()
+                vector_store = Chroma(persist_directory=VECTOR_DB_PATH, embedding_function=embeddings)
+            manifest = {"version": MANIFEST_VERSION, "splitter": splitter_config, "files": {}}
+
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        previous_files = manifest["files"]
+        current_files = {}
+        summary = {"added_files": [], "changed_files": [], "unchanged_files": [], "removed_files": [],
+                   "chunks_embedded": 0, "chunks_deleted": 0, "chunks_kept": 0}
+        docs_to_add, ids_to_add, ids_to_delete = [], [], []
+
+        for document in documents:
+            source = document.metadata["source"]
+            file_hash = _sha256(document.page_content)
+            previous = previous_files.get(source)
+            if previous is not None and previous["file_hash"] == file_hash:
+                current_files[source] = previous
+                summary["unchanged_files"].append(source)
+                summary["chunks_kept"] += len(previous["chunk_ids"])
+                continue
+
+            chunks = text_splitter.split_documents([document])
+            chunk_ids = _chunk_ids(source, chunks)
+            old_ids = set(previous["chunk_ids"]) if previous else set()
+            for chunk, chunk_id in zip(chunks, chunk_ids):
+                if chunk_id in old_ids:
+                    summary["chunks_kept"] += 1
+                else:
+                    docs_to_add.append(chunk)
+                    ids_to_add.append(chunk_id)
+            ids_to_delete.extend(old_ids - set(chunk_ids))
+            current_files[source] = {"file_hash": file_hash, "chunk_ids": chunk_ids}
+            summary["changed_files" if previous else "added_files"].append(source)
+
+        for source, previous in previous_files.items():
+            if source not in current_files:
+                ids_to_delete.extend(previous["chunk_ids"])
+                summary["removed_files"].append(source)
+
+        if ids_to_delete:
+            print(f"Deleting {len(ids_to_delete)} stale chunks...")
+            vector_store.delete(ids=ids_to_delete)
+        if docs_to_add:
+            print(f"Embedding and upserting {len(docs_to_add)} new or changed chunks...")
+            vector_store.add_documents(documents=docs_to_add, ids=ids_to_add)
+        summary["chunks_embedded"] = len(docs_to_add)
+        summary["chunks_deleted"] = len(ids_to_delete)
+
+        manifest["files"] = current_files
+        save_manifest(VECTOR_DB_PATH, manifest)
+        write_embedding_signature(VECTOR_DB_PATH, signature)
+
+        print("--- Ingest Summary ---")
+        for key in ("added_files", "changed_files", "removed_files", "unchanged_files"):
+            print(f"{key.replace('_', ' ').capitalize()}: {len(summary[key])} {sorted(summary[key]) if summary[key] else ''}")
+        print(f"Chunks embedded: {summary['chunks_embedded']}, deleted: {summary['chunks_deleted']}, kept: {summary['chunks_kept']}")
+
+        lexical_index_missing = not os.path.exists(os.path.join(VECTOR_DB_PATH, LEXICAL_INDEX_FILENAME))
+        if docs_to_add or ids_to_delete or lexical_index_missing:
+            # The BM25 index is rebuilt from the collection itself, so it always matches the stored chunks
+            stored = vector_store.get(include=["documents", "metadatas"])
+            write_lexical_index(VECTOR_DB_PATH, stored["ids"], stored["documents"], stored["metadatas"])
+        if docs_to_add or ids_to_delete:
+            # Tells running servers to drop answers cached against the previous content
+            write_ingest_marker(VECTOR_DB_PATH)
+        else:
+            print("Vector store already up to date.")
+        print("Vector store updated and persisted successfully.")
         return vector_store
     except Exception as e:
-        print(f"Error creating/persisting Chroma vector store: {e}")
-        # Attempt to clean up potentially partially created store
-        # Be cautious with rimraf type operations in real scenarios
-        # shutil.rmtree(VECTOR_DB_PATH, ignore_errors=True)
+        print(f"Error creating/updating Chroma vector store: {e}")
         return None
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load USCIS reference data into the Chroma vector store.")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the ingest manifest and re-embed every file from scratch (required after changing EMBEDDING_PROVIDER).")
+    args = parser.parse_args()
+
     print("--- Starting USCIS Data Loading Script ---")
     loaded_docs = load_documents_from_directory(SAMPLE_DATA_DIR)
-    if loaded_docs:
-        vector_store_instance = setup_vector_store(loaded_docs)
+    # With a manifest, an empty directory still needs its previously ingested chunks removed
+    if loaded_docs or load_manifest(VECTOR_DB_PATH) is not None:
+        vector_store_instance = setup_vector_store(loaded_docs, full_rebuild=args.full)
         if vector_store_instance:
             print("--- Data Loading and Vector Store Setup Complete ---")
             # Optional: Test query
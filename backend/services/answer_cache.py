@@ -0,0 +1,160 @@
+# backend/services/answer_cache.py
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# --- Configuration ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+# Cosine similarity a cached question must reach to be reused for a differently-worded one
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+# --- End Configuration ---
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s\-()]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Normalizes a question for exact matching: lowercase, no trailing punctuation, single spaces."""
+    query = _PUNCTUATION_RE.sub(" ", query.lower())
+    return _WHITESPACE_RE.sub(" ", query).strip()
+
+
+class AnswerCache:
+    """
+    Cache of chat answers in front of the RAG pipeline.
+    Lookups try an exact match on the normalized question first, then the most similar cached
+    question by embedding. Entries expire after a TTL, the oldest are evicted past max_entries,
+    and everything is dropped when the vector store's ingest generation changes.
+    """
+
+    def __init__(self, embed_fn=None, generation_fn=None, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD):
+        self.embed_fn = embed_fn # query -> list[float]; semantic lookup is skipped when None
+        self.generation_fn = generation_fn # () -> ingest generation id
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # normalized query -> {"answer", "vector", "created_at"}
+        self._matrix = None # Stacked unit vectors of entries with embeddings, rebuilt lazily
+        self._matrix_keys = []
+        self._generation = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_generation_locked(self):
+        if self.generation_fn is None:
+            return
+        generation = self.generation_fn()
+        if generation != self._generation:
+            if self._entries:
+                print(f"Vector store re-ingested (generation {generation}), clearing {len(self._entries)} cached answers.")
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+            self._generation = generation
+
+    def _expire_locked(self, now: float):
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _embed(self, query: str):
+        if self.embed_fn is None:
+            return None
+        try:
+            vector = np.asarray(self.embed_fn(query), dtype=np.float32)
+        except Exception as e:
+            print(f"Answer cache could not embed query, skipping semantic lookup: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def lookup(self, query: str, semantic: bool = True) -> dict:
+        """
+        Returns {"hit": bool, "match": "exact" | "semantic" | None, "similarity": float | None,
+        "answer": str | None}. On a miss the computed query embedding is kept under "vector"
+        so store() and retrieval don't embed the question again. semantic=False only tries the exact match.
+        """
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._check_generation_locked()
+            self._expire_locked(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return {"hit": True, "match": "exact", "similarity": 1.0, "answer": entry["answer"]}
+
+        # Embed outside the lock, this is a network call for remote embedding models
+        vector = self._embed(key) if semantic else None
+        if vector is not None:
+            with self._lock:
+                if self._matrix is None:
+                    self._matrix_keys = [k for k, e in self._entries.items() if e["vector"] is not None]
+                    self._matrix = (np.stack([self._entries[k]["vector"] for k in self._matrix_keys])
+                                    if self._matrix_keys else np.empty((0, vector.shape[0]), dtype=np.float32))
+                if self._matrix.shape[0] and self._matrix.shape[1] == vector.shape[0]:
+                    similarities = self._matrix @ vector
+                    best = int(np.argmax(similarities))
+                    similarity = float(similarities[best])
+                    best_key = self._matrix_keys[best]
+                    if similarity >= self.similarity_threshold and best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                        self.semantic_hits += 1
+                        return {"hit": True, "match": "semantic", "similarity": similarity,
+                                "answer": self._entries[best_key]["answer"]}
+
+        with self._lock:
+            self.misses += 1
+        return {"hit": False, "match": None, "similarity": None, "answer": None, "vector": vector}
+
+    def store(self, query: str, answer: str, vector=None, semantic: bool = True):
+        """
+        Caches an answer. Pass the "vector" from a missed lookup to avoid re-embedding; with
+        semantic=False the answer is cached for exact matches only and the question is not embedded.
+        """
+        key = normalize_query(query)
+        if vector is None and semantic:
+            vector = self._embed(key)
+        with self._lock:
+            self._check_generation_locked()
+            self._entries[key] = {"answer": answer, "vector": vector, "created_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+        print("Answer cache invalidated.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": ((self.exact_hits + self.semantic_hits) / lookups) if lookups else 0.0,
+            }
@@ -1,25 +1,34 @@
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
+import time
+import threading
+from langchain_core.prompts import PromptTemplate
+from langchain_core.vectorstores import VectorStoreRetriever
 from backend.vector_store.chroma_db import get_vector_store
+from backend.vector_store.hybrid_retriever import HybridRetriever
+from backend.vector_store import chroma_db
+from backend.services.answer_cache import AnswerCache, ANSWER_CACHE_ENABLED, normalize_query
+from backend.services import llm_client
+from backend.services.llm_client import llm_gateway, LLMUnavailableError
+from backend.utils import metrics
+from backend.utils.singleflight import SingleFlight
 from dotenv import load_dotenv
 
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-# Initialize LLM
-try:
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-lite", google_api_key=GOOGLE_API_KEY,
-                                 temperature=0.2, convert_system_message_to_human=True)
-    print("Gemini LLM (gemini-2.0-flash-lite) initialized successfully.")
-except Exception as e:
-    print(f"Error initializing Gemini LLM: {e}")
-    # Provide guidance if the API key is likely the issue
-    if "API key not valid" in str(e):
-        print("Please ensure your GOOGLE_API_KEY in the .env file is correct and has access to the Gemini API.")
-    llm = None # Set llm to None if initialization fails
+# Initialize LLM (on first use or app warmup; langchain_google_genai is slow to import)
+def _create_llm():
+    try:
+        llm = llm_client.create_chat_model("gemini-2.0-flash-lite", temperature=0.2, convert_system_message_to_human=True)
+        print("Gemini LLM (gemini-2.0-flash-lite) initialized successfully.")
+        return llm
+    except Exception as e:
+        print(f"Error initializing Gemini LLM: {e}")
+        # Provide guidance if the API key is likely the issue
+        if "API key not valid" in str(e):
+            print("Please ensure your GOOGLE_API_KEY in the .env file is correct and has access to the Gemini API.")
+        return None # LLM stays unset if initialization fails
 
 # Define a prompt template for RAG
 RAG_PROMPT_TEMPLATE = """
@@ -38,40 +47,293 @@ RAG_PROMPT = PromptTemplate(
     template=RAG_PROMPT_TEMPLATE, input_variables=["context", "question"]
 )
 
+# Number of chunks retrieved per question
+RAG_RETRIEVER_K = int(os.getenv("RAG_RETRIEVER_K", "3"))
+# 'hybrid' fuses BM25 and vector rankings (vector-only while no BM25 index exists); 'vector' skips BM25
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()
+RAG_HYBRID_FETCH_K = int(os.getenv("RAG_HYBRID_FETCH_K", "10"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# Answer from BM25 alone, without embedding the query, when its top hit is decisive
+RAG_LEXICAL_FAST_PATH = os.getenv("RAG_LEXICAL_FAST_PATH", "true").lower() in ("1", "true", "yes")
+RAG_LEXICAL_MIN_COVERAGE = float(os.getenv("RAG_LEXICAL_MIN_COVERAGE", "0.8"))
+RAG_LEXICAL_MIN_MARGIN = float(os.getenv("RAG_LEXICAL_MIN_MARGIN", "1.5"))
+
+
+def build_retriever(vector_store, k: int):
+    """Returns the retriever for RAG_RETRIEVAL_MODE over the given vector store."""
+    if RAG_RETRIEVAL_MODE != "hybrid":
+        return vector_store.as_retriever(search_kwargs={"k": k})
+    return HybridRetriever(
+        vector_store=vector_store,
+        lexical_index=chroma_db.get_lexical_index(),
+        k=k,
+        fetch_k=max(RAG_HYBRID_FETCH_K, k),
+        rrf_k=RAG_RRF_K,
+        fast_path=RAG_LEXICAL_FAST_PATH,
+        min_coverage=RAG_LEXICAL_MIN_COVERAGE,
+        min_margin=RAG_LEXICAL_MIN_MARGIN,
+    )
+
+
+class ChatPipeline:
+    """
+    RAG pipeline shared by all chat requests: retrieves context, fills the prompt and calls the LLM
+    through the shared model gateway. The retriever is built once and rebuilt only when k or the
+    vector store changes. Without an llm, llm_factory creates it on first use (a failed attempt is not retried).
+    """
+
+    def __init__(self, llm, prompt: PromptTemplate = RAG_PROMPT, k: int = RAG_RETRIEVER_K, vector_store_getter=get_vector_store,
+                 retriever_factory=build_retriever, llm_factory=None, gateway=llm_gateway):
+        self.llm = llm
+        self._gateway = gateway
+        self._llm_factory = llm_factory
+        self._llm_attempted = llm is not None or llm_factory is None
+        self.prompt = prompt
+        self.k = k
+        self._vector_store_getter = vector_store_getter
+        self._retriever_factory = retriever_factory
+        self._lock = threading.Lock()
+        self._retriever = None
+        self._built_for = None # (vector_store, k) the current retriever was built from
+        self.builds = 0
+
+    def configure(self, prompt: PromptTemplate = None, k: int = None, llm=None):
+        """Updates pipeline configuration; a changed k rebuilds the retriever on the next request."""
+        with self._lock:
+            if prompt is not None:
+                self.prompt = prompt
+            if k is not None:
+                self.k = k
+            if llm is not None:
+                self.llm = llm
+                self._llm_attempted = True
+
+    def get_llm(self):
+        """Returns the LLM, creating it on first call; None if it could not be created."""
+        with self._lock:
+            if not self._llm_attempted:
+                self._llm_attempted = True
+                self.llm = self._llm_factory()
+            return self.llm
+
+    def get_retriever(self):
+        """Returns the current retriever, building it if k or the vector store changed."""
+        vector_store = self._vector_store_getter()
+        with self._lock:
+            if self._retriever is None or self._built_for[0] is not vector_store or self._built_for[1] != self.k:
+                print(f"Building chat retriever (k={self.k})...")
+                self._retriever = self._retriever_factory(vector_store, self.k)
+                self._built_for = (vector_store, self.k)
+                self.builds += 1
+            return self._retriever
+
+    def takes_lexical_fast_path(self, query: str) -> bool:
+        """True when the query would be answered from BM25 alone, so nothing needs to embed it."""
+        retriever = self.get_retriever()
+        return isinstance(retriever, HybridRetriever) and retriever.takes_fast_path(query)
+
+    def _retrieve(self, retriever, query: str, query_vector=None) -> list:
+        if query_vector is None:
+            return retriever.invoke(query)
+        if isinstance(retriever, HybridRetriever):
+            return retriever.invoke(query, query_vector=query_vector)
+        if isinstance(retriever, VectorStoreRetriever) and retriever.search_type == "similarity":
+            return retriever.vectorstore.similarity_search_by_vector(query_vector, **retriever.search_kwargs)
+        return retriever.invoke(query)
+
+    def _prepare(self, query: str, query_vector=None) -> tuple:
+        """Retrieves context and returns (llm, prompt text). query_vector, if given, is the already computed query embedding."""
+        retriever = self.get_retriever()
+        llm = self.get_llm()
+        with self._lock:
+            prompt = self.prompt
+        documents = self._retrieve(retriever, query, query_vector)
+        # Same context layout as LangChain's "stuff" documents chain
+        context = "\n\n".join(document.page_content for document in documents)
+        return llm, prompt.format(context=context, question=query)
+
+    def invoke(self, query: str, query_vector=None) -> str:
+        # The LLM is called through the shared gateway, so chat is rate limited together with fills
+        llm, prompt_text = self._prepare(query, query_vector)
+        response = self._gateway.invoke(llm, prompt_text, priority=llm_client.PRIORITY_CHAT)
+        return getattr(response, "content", response) or "Sorry, I couldn't process that."
+
+    def stream(self, query: str, query_vector=None):
+        """Retrieves context up front, then yields answer text chunks as the LLM generates them."""
+        llm, prompt_text = self._prepare(query, query_vector)
+        for chunk in self._gateway.stream(llm, prompt_text, priority=llm_client.PRIORITY_CHAT):
+            text = getattr(chunk, "content", chunk) # Chat models yield message chunks, plain LLMs yield strings
+            if text:
+                yield text
+
+    def retrieval_stats(self) -> dict:
+        """Counts of how questions were retrieved (hybrid retriever only)."""
+        with self._lock:
+            retriever = self._retriever
+        stats = {"mode": RAG_RETRIEVAL_MODE, "k": self.k, "retriever_builds": self.builds}
+        if isinstance(retriever, HybridRetriever):
+            stats["paths"] = dict(retriever.stats)
+            stats["lexical_index"] = retriever.lexical_index.stats() if retriever.lexical_index is not None else None
+        return stats
+
+
+chat_pipeline = ChatPipeline(None, llm_factory=_create_llm)
+
+
+def _embed_query(query: str):
+    try:
+        get_vector_store() # Loads the store and its embeddings on first use
+    except RuntimeError:
+        pass
+    if chroma_db.embeddings is None:
+        raise RuntimeError("Embeddings not initialized.")
+    return chroma_db.embeddings.embed_query(query)
+
+# Answers are reused for repeated and near-duplicate questions until the store is re-ingested
+answer_cache = AnswerCache(embed_fn=_embed_query, generation_fn=chroma_db.get_ingest_generation) if ANSWER_CACHE_ENABLED else None
+# The same question asked again while it is being answered waits for that answer instead of running the pipeline twice
+chat_flight = SingleFlight("chat")
+
+
+def _lookup_answer(query: str) -> dict:
+    """
+    Answer cache lookup. Questions the lexical fast path answers only try the exact match, so they
+    are never embedded; otherwise the embedding made here is reused for retrieval and store().
+    """
+    try:
+        semantic = not chat_pipeline.takes_lexical_fast_path(query)
+    except RuntimeError: # Vector store unavailable; reported by the caller
+        semantic = True
+    lookup = answer_cache.lookup(query, semantic=semantic)
+    lookup["semantic"] = semantic
+    return lookup
+
+
+def _query_vector(lookup):
+    vector = lookup.get("vector") if lookup else None
+    return vector.tolist() if vector is not None else None
+
+
+def _store_answer(query: str, response: str, lookup):
+    answer_cache.store(query, response, vector=lookup.get("vector") if lookup else None,
+                       semantic=lookup.get("semantic", True) if lookup else True)
+
+
 # Function to get RAG response
 def get_rag_response(query: str) -> str:
-    """Gets a response from the RAG chain."""
-    if llm is None:
-         return "Error: LLM not initialized. Please check API key and configuration."
+    """Gets a response from the shared RAG pipeline."""
+    reply, _ = get_rag_response_with_metadata(query)
+    return reply
+
+def get_rag_response_with_metadata(query: str) -> tuple:
+    """
+    Gets a response from the answer cache or the shared RAG pipeline.
+    Returns (reply, metadata) where metadata reports cache usage, latency and whether the answer
+    was shared with an identical question already in flight ("coalesced").
+    """
+    start_time = time.perf_counter()
+    (reply, metadata), shared = chat_flight.do(normalize_query(query), lambda: _answer_query(query))
+    metadata = {**metadata, "coalesced": shared, "latency_ms": round((time.perf_counter() - start_time) * 1000, 2)}
+    return reply, metadata
+
+def _answer_query(query: str) -> tuple:
+    start_time = time.perf_counter()
+    metadata = {"cache": {"hit": False, "match": None, "similarity": None}}
+
+    def finish(reply):
+        metadata["latency_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+        return reply, metadata
+
+    if chat_pipeline.get_llm() is None:
+         return finish("Error: LLM not initialized. Please check API key and configuration.")
+
+    lookup = None
+    if answer_cache is not None:
+        with metrics.span("chat.answer_cache_lookup"):
+            lookup = _lookup_answer(query)
+        if lookup["hit"]:
+            print(f"Answer cache {lookup['match']} hit for query: '{query}'")
+            metadata["cache"] = {"hit": True, "match": lookup["match"], "similarity": lookup["similarity"]}
+            return finish(lookup["answer"])
 
     try:
-        vector_store = get_vector_store()
-        if not vector_store:
-            return "Error: Vector store not available. Please run the data loading script."
-
-        # Create the RetrievalQA chain
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff", # Simple chain type suitable for smaller contexts
-            retriever=vector_store.as_retriever(search_kwargs={"k": 3}), # Retrieve top 3 chunks
-            chain_type_kwargs={"prompt": RAG_PROMPT},
-            return_source_documents=False # Don't return source docs in the response for MVP
-        )
+        try:
+            get_vector_store()
+        except RuntimeError:
+            return finish("Error: Vector store not available. Please run the data loading script.")
 
         print(f"Invoking RAG chain for query: '{query}'")
-        # Langchain key for input is 'query' for RetrievalQA
-        result = qa_chain({"query": query})
-
+        with metrics.span("chat.rag_chain"):
+            response = chat_pipeline.invoke(query, query_vector=_query_vector(lookup))
         print(f"RAG chain response received.")
-        # Langchain key for output is 'result'
-        return result.get('result', "Sorry, I couldn't process that.")
+        if answer_cache is not None:
+            with metrics.span("chat.answer_cache_store"):
+                _store_answer(query, response, lookup)
+        return finish(response)
 
     except Exception as e:
         print(f"Error during RAG chain execution: {e}")
+        # Model quota or capacity exhausted even after retries
+        if isinstance(e, LLMUnavailableError):
+            return finish("Error: The assistant is busy right now. Please try again in a moment.")
         # Check for common API key errors
         if "API key not valid" in str(e):
-            return "Error: The provided Google API Key is invalid or missing permissions for the Gemini API."
+            return finish("Error: The provided Google API Key is invalid or missing permissions for the Gemini API.")
         # Check for vector store connection errors
         if isinstance(e, ConnectionError):
-             return f"Error: Could not connect to the vector store. {e}"
-        return f"An error occurred: {e}"
\ No newline at end of file
+             return finish(f"Error: Could not connect to the vector store. {e}")
+        return finish(f"An error occurred: {e}")
+
+
+def stream_rag_response(query: str):
+    """
+    Streams an answer as (event, payload) tuples for server-sent events: any number of
+    'token' events followed by exactly one terminal 'done' or 'error' event.
+    """
+    start_time = time.perf_counter()
+    cache_metadata = {"hit": False, "match": None, "similarity": None}
+
+    def done():
+        return "done", {"metadata": {"cache": cache_metadata, "latency_ms": round((time.perf_counter() - start_time) * 1000, 2)}}
+
+    if chat_pipeline.get_llm() is None:
+        yield "error", {"error": "LLM not initialized. Please check API key and configuration."}
+        return
+
+    lookup = None
+    if answer_cache is not None:
+        lookup = _lookup_answer(query)
+        if lookup["hit"]:
+            print(f"Answer cache {lookup['match']} hit for streamed query: '{query}'")
+            cache_metadata = {"hit": True, "match": lookup["match"], "similarity": lookup["similarity"]}
+            yield "token", {"text": lookup["answer"]}
+            yield done()
+            return
+
+    try:
+        get_vector_store()
+    except RuntimeError:
+        yield "error", {"error": "Vector store not available. Please run the data loading script."}
+        return
+
+    chunks = []
+    try:
+        print(f"Streaming RAG response for query: '{query}'")
+        for text in chat_pipeline.stream(query, query_vector=_query_vector(lookup)):
+            chunks.append(text)
+            yield "token", {"text": text}
+    except Exception as e:
+        print(f"Error during streamed RAG execution: {e}")
+        if isinstance(e, LLMUnavailableError):
+            yield "error", {"error": "The assistant is busy right now. Please try again in a moment.", "retry_after": e.retry_after}
+        elif "API key not valid" in str(e):
+            yield "error", {"error": "The provided Google API Key is invalid or missing permissions for the Gemini API."}
+        else:
+            yield "error", {"error": f"An error occurred: {e}"}
+        return
+
+    response = "".join(chunks)
+    print(f"Streamed RAG response complete ({len(response)} characters).")
+    if answer_cache is not None and response:
+        _store_answer(query, response, lookup)
+    yield done()
@@ -2,9 +2,19 @@
 
 import os
 import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from werkzeug.utils import secure_filename
 # Use absolute import for text_extractor
-from backend.utils.text_extractor import extract_text
+from backend.utils.text_extractor import (
+    extract_text, extract_text_uncached, get_cached_text, store_cached_text, IMAGE_EXTENSIONS
+)
+from backend.utils.ocr import plan_batches, ocr_files_batch
+from backend.utils.extraction_cache import hash_file
+from backend.utils.upload_store import upload_store, HashingSpoolFile
+from backend.utils import metrics
 # No load_dotenv here - app.py handles it
 
 # --- Path Setup ---
@@ -25,32 +35,265 @@ os.makedirs(UPLOAD_FOLDER_ABS, exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp', 'gif', 'webp'} # Added more image types
 
+# --- Background Extraction Setup ---
+# Text is extracted right after upload so fill requests only wait on files still in flight
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+# Files queued beyond this are left for extraction at fill time instead of growing the backlog
+EXTRACTION_MAX_PENDING = int(os.getenv("EXTRACTION_MAX_PENDING", "32"))
+
+_extraction_executor = ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix="extract")
+_extraction_lock = threading.Lock()
+_extraction_jobs = {} # session_id -> {filename: job dict}
+# --- End Background Extraction Setup ---
+
+# --- Parallel Aggregation Setup ---
+# 'parallel' extracts a session's files concurrently at fill time; 'serial' keeps the one-at-a-time loop
+DOCUMENT_AGGREGATION_MODE = os.getenv("DOCUMENT_AGGREGATION_MODE", "parallel").lower()
+# I/O-bound work (OCR round-trips, text files) runs on threads
+EXTRACTION_THREAD_WORKERS = int(os.getenv("EXTRACTION_THREAD_WORKERS", "8"))
+# CPU-bound pypdf parsing runs on processes to sidestep the GIL
+EXTRACTION_PROCESS_WORKERS = int(os.getenv("EXTRACTION_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_io_executor = None
+_cpu_executor = None
+_executor_lock = threading.Lock()
+
+def _get_io_executor():
+    global _io_executor
+    with _executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=EXTRACTION_THREAD_WORKERS, thread_name_prefix="extract-io")
+        return _io_executor
+
+def _get_cpu_executor():
+    global _cpu_executor
+    with _executor_lock:
+        if _cpu_executor is None:
+            # 'spawn' avoids forking a process that already runs extraction and Flask threads
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=EXTRACTION_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _cpu_executor
+
+def _reset_cpu_executor():
+    global _cpu_executor
+    with _executor_lock:
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=False, cancel_futures=True)
+        _cpu_executor = None
+# --- End Parallel Aggregation Setup ---
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_uploaded_file(file, session_id: str):
-    """Saves an uploaded file to a session-specific directory using absolute paths."""
+def save_uploaded_file(file, session_id: str) -> dict:
+    """
+    Saves an uploaded file to a session-specific directory using absolute paths.
+    The content is stored once in the upload store and hard-linked into the session.
+    Returns {"filename", "sha256", "size", "deduplicated"}. Raises UploadTooLarge when a quota is exceeded.
+    """
     if not session_id:
         raise ValueError("session_id is required to save file.")
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
         # Use the absolute path for the base uploads folder
         session_upload_path = os.path.join(UPLOAD_FOLDER_ABS, session_id)
-        os.makedirs(session_upload_path, exist_ok=True) # Create session dir if not exists
-        filepath = os.path.join(session_upload_path, filename)
+        # Files parsed by StreamingUploadRequest are already on disk and hashed; anything else is streamed over now
+        spool = file.stream if isinstance(file.stream, HashingSpoolFile) else upload_store.spool_stream(file.stream)
         try:
-            file.save(filepath)
-            print(f"File saved successfully: {filepath}")
-            return filename
-        except Exception as e:
+            with metrics.span("upload.save"):
+                stored = upload_store.commit(spool, session_upload_path, filename)
+            print(f"File saved successfully: {os.path.join(session_upload_path, filename)} "
+                  f"({stored['size']} bytes{', deduplicated' if stored['deduplicated'] else ''})")
+            return {"filename": filename, **stored}
+        except OSError as e:
             print(f"Error saving file {filename} for session {session_id}: {e}")
             raise IOError(f"Could not save file {filename}.") from e
+        finally:
+            spool.close()
     elif file:
         raise ValueError(f"File type not allowed: {file.filename}")
     else:
         raise ValueError("No file provided.")
 
+def _file_signature(filepath: str):
+    """Identifies a specific version of a file so results for overwritten uploads are not reused."""
+    stat = os.stat(filepath)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _run_extraction_job(job: dict):
+    """Returns the extracted text, or None when extraction failed so the fill extracts the file again."""
+    job["status"] = "running"
+    try:
+        text, file_hash = get_cached_text(job["filepath"])
+        if text is None:
+            text, cacheable = extract_text_uncached(job["filepath"])
+            if not cacheable: # Error marker, e.g. an OCR outage; don't hand it to the fill
+                print(f"Background extraction failed for {job['filepath']}: {text.strip()}")
+                job["status"] = "failed"
+                job["error"] = text.strip()
+                return None
+            store_cached_text(file_hash, text, cacheable)
+        job["status"] = "done"
+        return text
+    except Exception as e:
+        print(f"Background extraction failed for {job['filepath']}: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+        raise
+
+def queue_extraction(session_id: str, filename: str) -> str:
+    """
+    Queues background text extraction for an uploaded file.
+    Returns the initial extraction status ('queued', or 'deferred' if the pool is saturated).
+    """
+    filepath = os.path.join(UPLOAD_FOLDER_ABS, session_id, filename)
+    with _extraction_lock:
+        pending = sum(
+            1 for jobs in _extraction_jobs.values() for job in jobs.values()
+            if job["status"] in ("queued", "running")
+        )
+        session_jobs = _extraction_jobs.setdefault(session_id, {})
+        previous = session_jobs.get(filename)
+        if previous is not None:
+            previous["future"].cancel() # Superseded by the re-upload
+
+        if pending >= EXTRACTION_MAX_PENDING:
+            print(f"Extraction queue full ({pending} pending), deferring {filename} to fill time.")
+            session_jobs.pop(filename, None)
+            return "deferred"
+
+        job = {"filepath": filepath, "signature": _file_signature(filepath), "status": "queued", "error": None}
+        job["future"] = _extraction_executor.submit(_run_extraction_job, job)
+        session_jobs[filename] = job
+    print(f"Queued background extraction for {filename} (session {session_id}).")
+    return "queued"
+
+def get_extraction_status(session_id: str) -> dict:
+    """Returns the per-file extraction status for a session's uploads."""
+    session_upload_path = os.path.join(UPLOAD_FOLDER_ABS, session_id)
+    statuses = {}
+    if os.path.isdir(session_upload_path):
+        for filename in _list_session_files(session_upload_path):
+            statuses[filename] = {"status": "deferred", "error": None}
+    with _extraction_lock:
+        for filename, job in _extraction_jobs.get(session_id, {}).items():
+            if filename in statuses:
+                statuses[filename] = {"status": job["status"], "error": job["error"]}
+    return statuses
+
+def _get_background_result(session_id: str, filename: str, filepath: str):
+    """Returns background-extracted text for a file, waiting if still in flight, or None if unavailable."""
+    with _extraction_lock:
+        job = _extraction_jobs.get(session_id, {}).get(filename)
+    if job is None or job["future"].cancelled():
+        return None
+    try:
+        if job["signature"] != _file_signature(filepath):
+            return None # File was replaced after the job was queued
+        if not job["future"].done():
+            print(f"Waiting on in-flight extraction for {filename}...")
+        return job["future"].result()
+    except Exception as e:
+        print(f"Background extraction result unavailable for {filename}, extracting inline: {e}")
+        return None
+
+def _list_session_files(session_upload_path: str) -> list:
+    """Returns the session's uploaded filenames in a deterministic (sorted) order."""
+    return sorted(
+        filename for filename in os.listdir(session_upload_path)
+        if os.path.isfile(os.path.join(session_upload_path, filename))
+    )
+
+def _extract_files_parallel(session_id: str, session_upload_path: str, filenames: list) -> dict:
+    """
+    Extracts all files concurrently: PDFs on the process pool, images as batched OCR requests
+    and everything else on the thread pool.
+    Cache lookups and stores stay in this process so the cache index remains accurate.
+    Returns {filename: text}.
+    """
+    results = {}
+    pending = {} # filename -> (future, file_hash, filepath)
+    images = {} # filepath -> (filename, file_hash)
+    for filename in filenames:
+        filepath = os.path.join(session_upload_path, filename)
+        background_text = _get_background_result(session_id, filename, filepath)
+        if background_text is not None:
+            results[filename] = background_text
+            continue
+        cached_text, file_hash = get_cached_text(filepath)
+        if cached_text is not None:
+            results[filename] = cached_text
+            continue
+
+        extension = os.path.splitext(filename.lower())[1]
+        future = None
+        if extension == ".pdf":
+            try:
+                future = _get_cpu_executor().submit(extract_text_uncached, filepath)
+            except (BrokenProcessPool, RuntimeError, OSError) as e:
+                print(f"Process pool unavailable ({e}), parsing {filename} on a thread instead.")
+                _reset_cpu_executor()
+        elif extension in IMAGE_EXTENSIONS:
+            images[filepath] = (filename, file_hash)
+            continue
+        if future is None:
+            future = _get_io_executor().submit(metrics.bind_context(extract_text_uncached), filepath)
+        pending[filename] = (future, file_hash, filepath)
+
+    # One OCR round-trip per batch instead of per image
+    ocr_futures = [
+        (batch, _get_io_executor().submit(metrics.bind_context(ocr_files_batch), batch))
+        for batch in plan_batches(list(images.keys()))
+    ]
+    if ocr_futures:
+        print(f"Submitted {len(images)} image(s) for OCR in {len(ocr_futures)} batch request(s).")
+
+    for filename, (future, file_hash, filepath) in pending.items():
+        try:
+            text, cacheable = future.result()
+        except BrokenProcessPool as e:
+            print(f"Process pool failed while extracting {filename} ({e}), retrying inline.")
+            _reset_cpu_executor()
+            text, cacheable = extract_text_uncached(filepath)
+        except Exception as e:
+            print(f"Error extracting {filename} in parallel: {e}")
+            text, cacheable = f"[Error processing file {filename}]", False
+        store_cached_text(file_hash, text, cacheable)
+        results[filename] = text
+
+    for batch, future in ocr_futures:
+        try:
+            batch_results = future.result()
+        except Exception as e:
+            print(f"Error during batched OCR: {e}")
+            batch_results = {
+                filepath: (f"[Cloud OCR Error: {e} - {os.path.basename(filepath)}]", False) for filepath in batch
+            }
+        for filepath, (text, cacheable) in batch_results.items():
+            filename, file_hash = images[filepath]
+            store_cached_text(file_hash, text, cacheable)
+            results[filename] = text
+    return results
+
+def get_session_document_hashes(session_id: str) -> list:
+    """Returns the sorted SHA-256 hashes of a session's uploaded files; empty if the session has none."""
+    if not session_id:
+        return []
+    session_upload_path = os.path.join(UPLOAD_FOLDER_ABS, session_id)
+    if not os.path.isdir(session_upload_path):
+        return []
+    hashes = []
+    for filename in _list_session_files(session_upload_path):
+        try:
+            hashes.append(hash_file(os.path.join(session_upload_path, filename)))
+        except OSError as e:
+            print(f"Could not hash {filename} in session {session_id}: {e}")
+            return []
+    return sorted(hashes)
+
 def get_session_documents_content(session_id: str) -> str:
     """Aggregates text content from all supported files in a session's upload directory using absolute paths."""
     if not session_id:
@@ -59,21 +302,32 @@ def get_session_documents_content(session_id: str) -> str:
 
     # Use the absolute path for the base uploads folder
     session_upload_path = os.path.join(UPLOAD_FOLDER_ABS, session_id)
-    aggregated_content = ""
 
     if not os.path.isdir(session_upload_path):
         print(f"No upload directory found for session: {session_id} at {session_upload_path}")
         return ""
 
-    print(f"Aggregating content for session: {session_id} from {session_upload_path}")
-    for filename in os.listdir(session_upload_path):
-        filepath = os.path.join(session_upload_path, filename)
-        if os.path.isfile(filepath):
+    print(f"Aggregating content for session: {session_id} from {session_upload_path} (mode: {DOCUMENT_AGGREGATION_MODE})")
+    filenames = _list_session_files(session_upload_path)
+
+    if DOCUMENT_AGGREGATION_MODE == "parallel" and len(filenames) > 1:
+        contents = _extract_files_parallel(session_id, session_upload_path, filenames)
+    else:
+        contents = {}
+        for filename in filenames:
+            filepath = os.path.join(session_upload_path, filename)
             print(f"Processing file: {filename}")
-            aggregated_content += f"\n--- Content from {filename} ---\n"
-            # text_extractor expects an absolute path already
-            file_content = extract_text(filepath)
-            aggregated_content += file_content + "\n"
+            file_content = _get_background_result(session_id, filename, filepath)
+            if file_content is None:
+                # text_extractor expects an absolute path already
+                file_content = extract_text(filepath)
+            contents[filename] = file_content
+
+    parts = []
+    for filename in filenames:
+        parts.append(f"\n--- Content from {filename} ---\n")
+        parts.append(contents[filename] + "\n")
+    aggregated_content = "".join(parts)
 
     print(f"Total aggregated content length for session {session_id}: {len(aggregated_content)}")
     return aggregated_content
@@ -85,12 +339,20 @@ def cleanup_session_files(session_id: str):
     session_filled_form_path = os.path.join(FILLED_FORM_FOLDER_ABS, session_id)
 
     print(f"Cleaning up files for session: {session_id}")
+    with _extraction_lock:
+        for job in _extraction_jobs.pop(session_id, {}).values():
+            job["future"].cancel()
+
     if os.path.isdir(session_upload_path):
         try:
             shutil.rmtree(session_upload_path)
             print(f"Removed upload directory: {session_upload_path}")
         except Exception as e:
             print(f"Error removing upload directory {session_upload_path}: {e}")
+    # Drop stored contents that were only linked from this session
+    removed = upload_store.release_session(session_upload_path)
+    if removed:
+        print(f"Removed {removed} stored upload(s) no other session uses.")
 
     if os.path.isdir(session_filled_form_path):
          try:
@@ -0,0 +1,345 @@
+# backend/services/extraction_engine.py
+
+import os
+import json
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Use absolute imports
+from backend.utils.bm25 import BM25Index
+from backend.utils import metrics
+
+# --- Configuration ---
+# Rough prompt size limit per LLM call, in tokens (estimated at EXTRACTION_CHARS_PER_TOKEN characters each)
+EXTRACTION_SHARD_TOKEN_BUDGET = int(os.getenv("EXTRACTION_SHARD_TOKEN_BUDGET", "30000"))
+EXTRACTION_MAX_FIELDS_PER_SHARD = int(os.getenv("EXTRACTION_MAX_FIELDS_PER_SHARD", "40"))
+EXTRACTION_SHARD_WORKERS = int(os.getenv("EXTRACTION_SHARD_WORKERS", "4"))
+# How values found in several document chunks are reconciled: 'first', 'majority' or 'longest'
+EXTRACTION_MERGE_POLICY = os.getenv("EXTRACTION_MERGE_POLICY", "first").lower()
+EXTRACTION_CHARS_PER_TOKEN = 4
+# 'full' sends the whole session text; 'retrieval' sends only the passages a BM25 index ranks highest for each field
+EXTRACTION_CONTEXT_MODE = os.getenv("EXTRACTION_CONTEXT_MODE", "full").lower()
+EXTRACTION_RETRIEVAL_TOP_K = int(os.getenv("EXTRACTION_RETRIEVAL_TOP_K", "3")) # Passages kept per field
+EXTRACTION_RETRIEVAL_FIELDS_PER_SHARD = int(os.getenv("EXTRACTION_RETRIEVAL_FIELDS_PER_SHARD", "8"))
+EXTRACTION_PASSAGE_CHARS = int(os.getenv("EXTRACTION_PASSAGE_CHARS", "600"))
+# Sessions with less text than this are sent whole even in retrieval mode
+EXTRACTION_RETRIEVAL_MIN_CHARS = int(os.getenv("EXTRACTION_RETRIEVAL_MIN_CHARS", "4000"))
+# --- End Configuration ---
+
+MERGE_POLICIES = ("first", "majority", "longest")
+CONTEXT_MODES = ("full", "retrieval")
+DOCUMENT_HEADER_PREFIX = "\n--- Content from "
+# The document part of a shard is never squeezed below this, however long the field list is
+_MIN_DOCUMENT_TOKENS = 1000
+
+_shard_executor = None
+_shard_executor_lock = threading.Lock()
+
+def _get_shard_executor():
+    global _shard_executor
+    with _shard_executor_lock:
+        if _shard_executor is None:
+            _shard_executor = ThreadPoolExecutor(max_workers=EXTRACTION_SHARD_WORKERS, thread_name_prefix="extract-shard")
+        return _shard_executor
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // EXTRACTION_CHARS_PER_TOKEN + 1
+
+
+def parse_llm_json(llm_output_text: str, field_ids: list) -> dict:
+    """
+    Parses an extraction response into {field_id: value}, dropping unknown keys and NOT_FOUND values.
+    Returns {"error": ...} when the response is not usable JSON.
+    """
+    try:
+        # Clean potential markdown code block fences
+        json_response_cleaned = llm_output_text.strip().lstrip('```json').lstrip('```').rstrip('```')
+        if not json_response_cleaned: # Handle empty string case
+            print("LLM returned an empty string after cleaning.")
+            return {"error": "LLM returned empty parsable output."}
+
+        extracted_data_raw = json.loads(json_response_cleaned)
+        if not isinstance(extracted_data_raw, dict):
+            return {"error": "LLM output is not a JSON object"}
+        print(f"Parsed extracted data (raw): {extracted_data_raw}")
+
+        # LLM is expected to return keys matching field['id']
+        return {
+            k: v for k, v in extracted_data_raw.items()
+            if k in field_ids and (v is not None and str(v).upper() != "NOT_FOUND")
+        }
+    except json.JSONDecodeError as json_e:
+        print(f"Error decoding LLM JSON response: {json_e}")
+        print(f"LLM Raw Output was: {llm_output_text}")
+        return {"error": "Failed to parse extraction result from LLM"}
+    except Exception as parse_e:
+        print(f"Unexpected error parsing LLM response: {parse_e}")
+        return {"error": f"Unexpected error parsing LLM result: {parse_e}"}
+
+
+def _split_sections(document_content: str) -> list:
+    """Splits aggregated session text at each "--- Content from <file> ---" header into (header, body) pairs."""
+    sections = []
+    start = 0
+    while True:
+        next_header = document_content.find(DOCUMENT_HEADER_PREFIX, start + 1)
+        section = document_content[start:] if next_header == -1 else document_content[start:next_header]
+        header = ""
+        if section.startswith(DOCUMENT_HEADER_PREFIX):
+            header_end = section.find("\n", len(DOCUMENT_HEADER_PREFIX))
+            header = section[:header_end + 1] if header_end != -1 else ""
+        sections.append((header, section[len(header):]))
+        if next_header == -1:
+            return sections
+        start = next_header
+
+
+def split_document(document_content: str, max_chars: int) -> list:
+    """
+    Splits aggregated session text into chunks of at most max_chars, preferring to cut between
+    documents, then between paragraphs. A document split across chunks keeps its header in each.
+    """
+    if len(document_content) <= max_chars:
+        return [document_content]
+
+    pieces = []
+    for header, body in _split_sections(document_content):
+        if len(header) + len(body) <= max_chars:
+            pieces.append(header + body)
+            continue
+        room = max(max_chars - len(header), 1)
+        while body:
+            if len(body) <= room:
+                cut = len(body)
+            else:
+                cut = body.rfind("\n\n", 0, room)
+                if cut <= 0:
+                    cut = body.rfind("\n", 0, room)
+                if cut <= 0:
+                    cut = room
+            pieces.append(header + body[:cut])
+            body = body[cut:]
+
+    # Pack consecutive pieces back together while they fit
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(piece) <= max_chars:
+            chunks[-1] += piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+class SessionPassageIndex:
+    """
+    Ephemeral BM25 index over short passages of one session's documents, used to narrow an
+    extraction prompt to the lines that mention what each field asks for.
+    """
+
+    def __init__(self, document_content: str, passage_chars: int = EXTRACTION_PASSAGE_CHARS):
+        self.passages = [] # (section index, header, text), in document order
+        for section_index, (header, body) in enumerate(_split_sections(document_content)):
+            current = ""
+            for line in body.splitlines(keepends=True):
+                if current and len(current) + len(line) > passage_chars:
+                    self.passages.append((section_index, header, current))
+                    current = ""
+                current += line
+            if current.strip():
+                self.passages.append((section_index, header, current))
+        self.index = BM25Index.from_texts([text for _, _, text in self.passages])
+
+    def context_for(self, fields: list, top_k: int = EXTRACTION_RETRIEVAL_TOP_K) -> str:
+        """Returns the best passages for each field's id and description, merged in document order. '' if none match."""
+        selected = set()
+        for field in fields:
+            query = f"{field['id'].replace('_', ' ')} {field['description_for_llm']}"
+            selected.update(doc_index for doc_index, _ in self.index.search(query, top_k))
+        parts, previous_section = [], None
+        for passage_index in sorted(selected):
+            section_index, header, text = self.passages[passage_index]
+            if section_index != previous_section:
+                parts.append(header or "\n")
+                previous_section = section_index
+            else:
+                parts.append("[...]\n")
+            parts.append(text if text.endswith("\n") else text + "\n")
+        return "".join(parts)
+
+
+def merge_shard_results(shard_results: list, policy: str = EXTRACTION_MERGE_POLICY) -> tuple:
+    """
+    Merges per-shard extractions into one {field_id: value} dict. shard_results are
+    {"chunk_index", "data"} dicts; chunk order is document order.
+      first    - the value from the earliest chunk that has one
+      majority - the most frequent value (compared case- and whitespace-insensitively), ties go to the earliest
+      longest  - the longest value (e.g. a complete address over a partial one), ties go to the earliest
+    Returns (merged_data, conflicts), where conflicts lists fields that had differing values.
+    """
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unknown extraction merge policy '{policy}'. Use one of: {', '.join(MERGE_POLICIES)}")
+
+    candidates = {} # field_id -> [(chunk_index, value)]
+    for result in sorted(shard_results, key=lambda r: r["chunk_index"]):
+        for field_id, value in result["data"].items():
+            candidates.setdefault(field_id, []).append((result["chunk_index"], value))
+
+    def normalized(value):
+        return " ".join(str(value).lower().split())
+
+    merged, conflicts = {}, []
+    for field_id, values in candidates.items():
+        if policy == "majority":
+            counts = Counter(normalized(value) for _, value in values)
+            best = max(counts.values())
+            chosen = next(value for _, value in values if counts[normalized(value)] == best)
+        elif policy == "longest":
+            chosen = max((value for _, value in values), key=lambda value: len(str(value)))
+        else:
+            chosen = values[0][1]
+        merged[field_id] = chosen
+
+        distinct = list(dict.fromkeys(normalized(value) for _, value in values))
+        if len(distinct) > 1:
+            conflicts.append({"field_id": field_id, "values": [value for _, value in values], "chosen": chosen})
+    return merged, conflicts
+
+
+class ExtractionEngine:
+    """
+    Runs form data extraction as one or more LLM calls ("shards"). The field list is split into
+    groups and the document text into chunks so every prompt stays within the token budget; each
+    (field group, chunk) pair is one shard. Shards run concurrently on a bounded pool and their JSON
+    results are merged with the configured policy. Inputs that fit the budget make a single call.
+    In 'retrieval' context mode each field group is sent only the session passages that a BM25
+    index ranks highest for its fields, instead of the whole text.
+
+    invoke_fn(prompt_text) -> response text is injectable, so a fake LLM can stand in for the real one.
+    """
+
+    def __init__(self, invoke_fn, prompt, token_budget: int = EXTRACTION_SHARD_TOKEN_BUDGET,
+                 max_fields_per_shard: int = EXTRACTION_MAX_FIELDS_PER_SHARD, merge_policy: str = EXTRACTION_MERGE_POLICY,
+                 context_mode: str = EXTRACTION_CONTEXT_MODE):
+        if merge_policy not in MERGE_POLICIES:
+            raise ValueError(f"Unknown extraction merge policy '{merge_policy}'. Use one of: {', '.join(MERGE_POLICIES)}")
+        if context_mode not in CONTEXT_MODES:
+            raise ValueError(f"Unknown extraction context mode '{context_mode}'. Use one of: {', '.join(CONTEXT_MODES)}")
+        self.invoke_fn = invoke_fn
+        self.prompt = prompt # PromptTemplate with system_prompt, document_content, field_ids and field_descriptions
+        self.token_budget = token_budget
+        self.max_fields_per_shard = max(1, max_fields_per_shard)
+        self.merge_policy = merge_policy
+        self.context_mode = context_mode
+
+    def _format(self, system_prompt: str, fields: list, document_content: str) -> str:
+        return self.prompt.format(
+            system_prompt=system_prompt,
+            document_content=document_content,
+            field_ids=str([field["id"] for field in fields]), # Pass as string representation of list
+            field_descriptions="\n".join(f"- {field['id']}: {field['description_for_llm']}" for field in fields),
+        )
+
+    def plan(self, document_content: str, form_entry: dict) -> list:
+        """Splits the extraction into shards: [{"index", "fields", "chunk_index", "document", "context"}]."""
+        fields = form_entry["config"].get("fields", [])
+        system_prompt = form_entry["system_prompt"]
+        use_retrieval = self.context_mode == "retrieval" and len(document_content) >= EXTRACTION_RETRIEVAL_MIN_CHARS
+        # Narrowed prompts work best with a few related fields each, so retrieval uses smaller groups
+        max_fields = min(self.max_fields_per_shard, EXTRACTION_RETRIEVAL_FIELDS_PER_SHARD) if use_retrieval else self.max_fields_per_shard
+        # Field groups get at most half the budget so there is always room left for document text
+        field_budget = self.token_budget // 2
+        field_groups, current = [], []
+        for field in fields:
+            candidate = current + [field]
+            if current and (len(candidate) > max(1, max_fields)
+                            or estimate_tokens(self._format(system_prompt, candidate, "")) > field_budget):
+                field_groups.append(current)
+                candidate = [field]
+            current = candidate
+        if current:
+            field_groups.append(current)
+
+        largest_overhead = max(estimate_tokens(self._format(system_prompt, group, "")) for group in field_groups)
+        document_chars = max(self.token_budget - largest_overhead, _MIN_DOCUMENT_TOKENS) * EXTRACTION_CHARS_PER_TOKEN
+        full_chunks = None
+        passage_index = SessionPassageIndex(document_content) if use_retrieval else None
+
+        shards = []
+        for group in field_groups:
+            context = "full"
+            if passage_index is not None:
+                narrowed = passage_index.context_for(group)
+                if narrowed:
+                    chunks, context = split_document(narrowed, document_chars), "retrieval"
+            if context == "full":
+                # Also the fallback when no passage matched a group's fields
+                if full_chunks is None:
+                    full_chunks = split_document(document_content, document_chars)
+                chunks = full_chunks
+            for chunk_index, chunk in enumerate(chunks):
+                shards.append({"index": len(shards), "fields": group, "chunk_index": chunk_index,
+                               "document": chunk, "context": context})
+        return shards
+
+    def _run_shard(self, shard: dict, system_prompt: str) -> dict:
+        field_ids = [field["id"] for field in shard["fields"]]
+        started = time.perf_counter()
+        prompt_text = self._format(system_prompt, shard["fields"], shard["document"])
+        llm_output_text = self.invoke_fn(prompt_text)
+        with metrics.span("fill.parse_json"):
+            data = parse_llm_json(llm_output_text, field_ids)
+        error = data["error"] if set(data) == {"error"} and "error" not in field_ids else None
+        return {
+            "index": shard["index"],
+            "chunk_index": shard["chunk_index"],
+            "fields": len(field_ids),
+            "context": shard["context"],
+            "document_chars": len(shard["document"]),
+            "prompt_tokens": estimate_tokens(prompt_text),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1),
+            "error": error,
+            "data": {} if error else data,
+        }
+
+    def run(self, document_content: str, form_entry: dict) -> dict:
+        """
+        Extracts the form's fields from document_content. Returns {"data", "error", "conflicts", "shards",
+        "merge_policy", "context_mode", "prompt_tokens", "elapsed_ms"}; "shards" reports each call's size and timing. Exceptions raised by
+        invoke_fn propagate after the remaining shards are cancelled.
+        """
+        started = time.perf_counter()
+        with metrics.span("fill.plan_shards"):
+            shards = self.plan(document_content, form_entry)
+        system_prompt = form_entry["system_prompt"]
+
+        if len(shards) == 1:
+            results = [self._run_shard(shards[0], system_prompt)]
+        else:
+            print(f"Extraction split into {len(shards)} shards for form '{form_entry['config'].get('form_id', 'Unknown')}'.")
+            executor = _get_shard_executor()
+            futures = [executor.submit(metrics.bind_context(self._run_shard), shard, system_prompt) for shard in shards]
+            try:
+                results = [future.result() for future in futures]
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        errors = [f"shard {result['index']}: {result['error']}" for result in results if result["error"]]
+        data, conflicts = merge_shard_results(results, self.merge_policy) if not errors else ({}, [])
+        for conflict in conflicts:
+            print(f"Extraction conflict for '{conflict['field_id']}': {conflict['values']} -> kept {conflict['chosen']!r} ({self.merge_policy}).")
+        return {
+            "data": data,
+            # A shard that failed leaves its fields unreliable, so the extraction as a whole is failed
+            "error": "; ".join(errors) if errors else None,
+            "conflicts": conflicts,
+            "shards": [{key: value for key, value in result.items() if key != "data"} for result in results],
+            "merge_policy": self.merge_policy,
+            "context_mode": self.context_mode,
+            "prompt_tokens": sum(result["prompt_tokens"] for result in results),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1),
+        }
@@ -0,0 +1,101 @@
+# backend/services/extraction_result_cache.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- Configuration ---
+EXTRACTION_RESULT_CACHE_ENABLED = os.getenv("EXTRACTION_RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Results hold applicants' personal data, so they only live in memory and not for long
+EXTRACTION_RESULT_CACHE_TTL_SECONDS = float(os.getenv("EXTRACTION_RESULT_CACHE_TTL_SECONDS", "1800"))
+EXTRACTION_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_RESULT_CACHE_MAX_ENTRIES", "256"))
+# --- End Configuration ---
+
+
+def make_result_key(document_hashes: list, form_entry: dict, model_name: str, settings: dict = None) -> str:
+    """
+    Builds the cache key for an extraction: the sorted SHA-256s of the session's files, a hash of the
+    form's field definitions and system prompt, the model name, and any engine settings that change
+    what the model is asked (prompt template, context mode, merge policy...).
+    """
+    config = form_entry["config"]
+    schema = json.dumps(
+        {"fields": config.get("fields", []), "system_prompt": form_entry["system_prompt"]},
+        sort_keys=True, ensure_ascii=False
+    )
+    key_material = json.dumps({
+        "documents": sorted(document_hashes),
+        "schema": hashlib.sha256(schema.encode("utf-8")).hexdigest(),
+        "model": model_name,
+        "settings": settings or {},
+    }, sort_keys=True)
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class ExtractionResultCache:
+    """
+    In-memory cache of LLM extraction results, so a repeated fill of the same documents and form
+    goes straight to PDF filling. Entries expire after a TTL and the least recently used are
+    evicted past max_entries.
+    """
+
+    def __init__(self, ttl_seconds: float = EXTRACTION_RESULT_CACHE_TTL_SECONDS,
+                 max_entries: int = EXTRACTION_RESULT_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> {"data", "report", "created_at"}
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Returns {"data", "report"} for a live entry, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["created_at"] > self.ttl_seconds:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {"data": dict(entry["data"]), "report": entry["report"]}
+
+    def put(self, key: str, data: dict, report: dict = None):
+        with self._lock:
+            self._entries[key] = {"data": dict(data), "report": report or {}, "created_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        print(f"Extraction result cache invalidated ({removed} entries removed).")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+extraction_result_cache = ExtractionResultCache() if EXTRACTION_RESULT_CACHE_ENABLED else None
@@ -0,0 +1,205 @@
+# backend/services/fill_job_service.py
+
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Use absolute imports
+from backend.services import form_filler_service
+from backend.services.session_manager import session_manager
+from backend.services.llm_client import LLMUnavailableError
+from backend.utils import metrics
+
+# --- Configuration ---
+FILL_JOB_WORKERS = int(os.getenv("FILL_JOB_WORKERS", "2"))
+# Jobs waiting for a worker beyond this are rejected instead of queued
+FILL_JOB_MAX_QUEUE = int(os.getenv("FILL_JOB_MAX_QUEUE", "20"))
+# Finished jobs (and their in-memory PDFs) are forgotten this long after completion
+FILL_JOB_RESULT_TTL_SECONDS = float(os.getenv("FILL_JOB_RESULT_TTL_SECONDS", "600"))
+# --- End Configuration ---
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a fill job is submitted while the queue is at capacity."""
+
+
+def _error_status_code(error: Exception) -> int:
+    # Same mapping as the synchronous /api/fill-form endpoint
+    if isinstance(error, LLMUnavailableError):
+        return 503
+    if isinstance(error, FileNotFoundError):
+        return 404
+    if isinstance(error, ValueError):
+        return 400
+    return 500
+
+
+class FillJobManager:
+    """
+    Runs form fills as background jobs on a bounded worker pool.
+    Jobs move through queued -> running -> succeeded | failed, report the current fill stage,
+    and are expired together with their in-memory result after a TTL.
+    """
+
+    def __init__(self, workers: int = FILL_JOB_WORKERS, max_queue: int = FILL_JOB_MAX_QUEUE,
+                 result_ttl_seconds: float = FILL_JOB_RESULT_TTL_SECONDS, fill_fn=None, cleanup_fn=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl_seconds = result_ttl_seconds
+        # Resolved at call time so the module-level functions can be swapped out
+        self._fill_fn = fill_fn or (lambda *args, **kwargs: form_filler_service.fill_dynamic_form(*args, **kwargs))
+        self._cleanup_fn = cleanup_fn or (lambda session_id: session_manager.cleanup(session_id))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fill-job")
+        self._lock = threading.Lock()
+        self._jobs = {} # job_id -> job dict
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def _snapshot(self, job: dict) -> dict:
+        return {key: value for key, value in job.items() if not key.startswith("_")}
+
+    def _counts_locked(self) -> dict:
+        counts = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+        for job in self._jobs.values():
+            counts[job["status"]] += 1
+        return counts
+
+    def submit(self, session_id: str, form_type: str) -> dict:
+        """Queues a fill job. Raises QueueFullError when max_queue jobs are already waiting."""
+        self.expire_finished()
+        with self._lock:
+            queued = self._counts_locked()["queued"]
+            if queued >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"Fill queue is full ({queued} jobs waiting). Please retry shortly.")
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "session_id": session_id,
+                "form_type": form_type,
+                "status": "queued",
+                "stage": "queued",
+                "progress": 0.0,
+                "error": None,
+                "error_status": None,
+                "download_filename": None,
+                "result_size": None,
+                "extraction": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "_result_bytes": None,
+            }
+            self._jobs[job_id] = job
+            # Keeps the session's files from being expired while the job waits and runs
+            session_manager.acquire(session_id)
+            self._executor.submit(self._run, job)
+            print(f"Queued fill job {job_id} for form '{form_type}', session '{session_id}' ({queued + 1} waiting).")
+            return self._snapshot(job)
+
+    def _run(self, job: dict):
+        # Background fills are traced like requests, under the job id, for stage metrics and slow-job logging
+        with metrics.trace(f"fill job {job['form_type']}", request_id=job["job_id"]):
+            self._run_job(job)
+
+    def _run_job(self, job: dict):
+        session_id, form_type = job["session_id"], job["form_type"]
+        with self._lock:
+            job["status"] = "running"
+            job["started_at"] = time.time()
+
+        def on_progress(stage: str, progress: float):
+            with self._lock:
+                job["stage"] = stage
+                job["progress"] = progress
+
+        keep_documents = False
+        try:
+            result = self._fill_fn(session_id, form_type, progress_callback=on_progress)
+            if not result or not result.get("pdf_bytes"):
+                raise RuntimeError(f"Form filling for '{form_type}' failed to produce a file.")
+            with self._lock:
+                job["_result_bytes"] = result["pdf_bytes"]
+                job["result_size"] = len(result["pdf_bytes"])
+                job["extraction"] = result.get("extraction")
+                job["download_filename"] = result.get("download_filename", f"filled_{form_type.replace(' ', '_')}.pdf")
+                job["status"] = "succeeded"
+                job["stage"] = "done"
+                job["progress"] = 1.0
+                self.completed += 1
+            print(f"Fill job {job['job_id']} succeeded.")
+        except Exception as e:
+            print(f"Fill job {job['job_id']} failed for form '{form_type}', session '{session_id}': {e}")
+            # The model was busy; keep the uploads so the job can be resubmitted for the same session
+            keep_documents = isinstance(e, LLMUnavailableError)
+            with self._lock:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                job["error_status"] = _error_status_code(e)
+                self.failed += 1
+        finally:
+            with self._lock:
+                job["finished_at"] = time.time()
+            session_manager.release(session_id)
+            # Same as the synchronous endpoint: uploaded documents are removed once the fill is over
+            if not keep_documents:
+                try:
+                    self._cleanup_fn(session_id)
+                except Exception as e:
+                    print(f"Error during cleanup for fill job {job['job_id']}: {e}")
+
+    def get(self, job_id: str):
+        """Returns a status snapshot of a job, or None if it is unknown or expired."""
+        self.expire_finished()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def get_result(self, job_id: str):
+        """Returns (pdf_bytes, download_filename) for a succeeded job, or None if there is no result."""
+        self.expire_finished()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != "succeeded":
+                return None
+            return job["_result_bytes"], job["download_filename"]
+
+    def expire_finished(self):
+        """Forgets finished jobs older than the result TTL, releasing their PDFs."""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job["finished_at"] is not None and now - job["finished_at"] > self.result_ttl_seconds
+            ]
+            for job in expired:
+                del self._jobs[job["job_id"]]
+                self.expired += 1
+        if expired:
+            print(f"Expired {len(expired)} finished fill job(s).")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = self._counts_locked()
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queue_depth": counts["queued"],
+                "running": counts["running"],
+                "finished_retained": counts["succeeded"] + counts["failed"],
+                "retained_result_bytes": sum(len(job["_result_bytes"] or b"") for job in self._jobs.values()),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "result_ttl_seconds": self.result_ttl_seconds,
+            }
+
+
+fill_job_manager = FillJobManager()
+# Finished jobs hold their PDFs in memory; expire them even when nobody calls the jobs API
+session_manager.add_janitor_task(fill_job_manager.expire_finished)
@@ -1,14 +1,21 @@
 # backend/services/form_filler_service.py
 
+import io
 import os
-import json
-from PyPDFForm import FormWrapper # Correct Import
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+import zipfile
+import threading
+from langchain_core.prompts import PromptTemplate
 
 # Use absolute imports
-from backend.services.document_service import get_session_documents_content # Removed cleanup_session_files, app.py handles it
+from backend.services.document_service import get_session_documents_content, get_session_document_hashes # Removed cleanup_session_files, app.py handles it
+from backend.services.form_registry import form_registry, build_form_entry
+from backend.services import extraction_engine
+from backend.services.extraction_engine import ExtractionEngine
+from backend.services.extraction_result_cache import extraction_result_cache, make_result_key
+from backend.services import llm_client
+from backend.services.llm_client import llm_gateway, LLMUnavailableError
+from backend.utils import metrics
+from backend.utils.singleflight import SingleFlight
 
 # --- Path Setup ---
 _service_dir = os.path.dirname(os.path.abspath(__file__))
@@ -25,16 +32,98 @@ os.makedirs(FILLED_FORM_FOLDER_ABS, exist_ok=True)
 os.makedirs(FORM_CONFIGS_DIR_ABS, exist_ok=True) # Ensure form configs dir exists
 # --- End Path Setup ---
 
+# Upper bound on the number of forms one batch fill request may ask for
+FILL_BATCH_MAX_FORMS = int(os.getenv("FILL_BATCH_MAX_FORMS", "10"))
+
+
+# --- PDF Template Cache ---
+class TemplateCache:
+    """
+    Keeps PDF templates in memory so a fill never re-reads the template from disk.
+    Entries are keyed by absolute path and reloaded when the file's mtime or size changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {} # template path -> {"signature", "data", "lock"}
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, template_path: str) -> dict:
+        """Returns the cache entry for a template, loading it on first use. Raises FileNotFoundError if missing."""
+        try:
+            stat = os.stat(template_path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(template_path, None)
+            raise FileNotFoundError(f"PDF template not found at {template_path}")
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(template_path)
+            if entry is not None and entry["signature"] == signature:
+                self.hits += 1
+                return entry
+        with open(template_path, "rb") as template_file:
+            data = template_file.read()
+        # PyPDFForm memoizes the BytesIO it wraps around identical template bytes, so fills of the
+        # same template share a stream position and must not run concurrently
+        entry = {"signature": signature, "data": data, "lock": threading.Lock()}
+        with self._lock:
+            self._entries[template_path] = entry
+            self.loads += 1
+        print(f"Loaded PDF template into memory: {template_path} ({len(data)} bytes)")
+        return entry
+
+    def fill(self, template_path: str, data_for_pdf: dict) -> bytes:
+        """Fills the cached template and returns the filled PDF as bytes."""
+        entry = self.get(template_path)
+        with entry["lock"]:
+            from PyPDFForm import FormWrapper # Imported on first fill; PyPDFForm is slow to import
+            pdf_wrapper = FormWrapper(entry["data"])
+            pdf_wrapper.fill(
+                data_for_pdf,
+                adobe_mode=True
+            )
+            return pdf_wrapper.read()
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "templates": len(self._entries),
+                "bytes": sum(len(entry["data"]) for entry in self._entries.values()),
+                "hits": self.hits,
+                "loads": self.loads,
+            }
+
+
+template_cache = TemplateCache()
+# --- End PDF Template Cache ---
+
 
 # --- LLM Initialization ---
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-try:
-    # Consider making model name configurable or part of form_config if different forms need different models
-    extraction_llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-lite", google_api_key=GOOGLE_API_KEY, temperature=0.0)
-    print("Gemini LLM for extraction (gemini-2.0-flash-lite) initialized.")
-except Exception as e:
-    print(f"Error initializing extraction LLM: {e}")
-    extraction_llm = None
+EXTRACTION_MODEL_NAME = "gemini-2.0-flash-lite"
+extraction_llm = None # Created by get_extraction_llm() on first fill or app warmup
+_extraction_llm_attempted = False
+_extraction_llm_lock = threading.Lock()
+
+def get_extraction_llm():
+    """Returns the extraction LLM, creating it on first call; None if it could not be created."""
+    global extraction_llm, _extraction_llm_attempted
+    with _extraction_llm_lock:
+        if extraction_llm is None and not _extraction_llm_attempted:
+            _extraction_llm_attempted = True
+            try:
+                # Consider making model name configurable or part of form_config if different forms need different models
+                extraction_llm = llm_client.create_chat_model(EXTRACTION_MODEL_NAME, temperature=0.0)
+                print(f"Gemini LLM for extraction ({EXTRACTION_MODEL_NAME}) initialized.")
+            except Exception as e:
+                print(f"Error initializing extraction LLM: {e}")
+        return extraction_llm
 # --- End LLM Initialization ---
 
 
@@ -67,31 +156,25 @@ EXTRACTION_PROMPT = PromptTemplate(
 # --- End Prompt Template Definition ---
 
 def load_form_config(form_type: str) -> dict:
-    """Loads the JSON configuration for a given form_type."""
-    config_filename = f"{form_type}.json"
-    config_path = os.path.join(FORM_CONFIGS_DIR_ABS, config_filename)
-    print(f"Attempting to load form configuration from: {config_path}")
-
-    if not os.path.exists(config_path):
-        print(f"Error: Form configuration file not found at {config_path}")
-        raise FileNotFoundError(f"Configuration for form type '{form_type}' not found.")
-    
-    try:
-        with open(config_path, 'r') as f:
-            config_data = json.load(f)
-        print(f"Successfully loaded configuration for form '{form_type}'.")
-        return config_data
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from {config_path}: {e}")
-        raise ValueError(f"Invalid JSON in configuration for form type '{form_type}'.")
-    except Exception as e:
-        print(f"Unexpected error loading form configuration {config_path}: {e}")
-        raise RuntimeError(f"Could not load configuration for '{form_type}'.")
-
-
-def _extract_data_with_llm_dynamic(document_content: str, form_config: dict) -> dict:
-    """Uses LLM to extract data based on the dynamically loaded form configuration."""
-    if not extraction_llm:
+    """Returns the JSON configuration for a given form_type from the in-memory form registry."""
+    return form_registry.get_entry(form_type)["config"]
+
+
+def _invoke_extraction_llm(prompt_text: str) -> str:
+    # Resolved at call time so extraction_llm can be swapped out; fills are admitted ahead of chat
+    with metrics.span("fill.llm"):
+        response = llm_gateway.invoke(get_extraction_llm(), prompt_text, priority=llm_client.PRIORITY_FILL)
+    return response.content if hasattr(response, "content") else str(response)
+
+
+def _extract_data_with_llm_dynamic(document_content: str, form_config: dict, form_entry: dict = None, extraction_report: dict = None) -> dict:
+    """
+    Uses LLM to extract data based on the dynamically loaded form configuration.
+    form_entry carries the registry's precomputed prompt pieces; they are derived from form_config if omitted.
+    Large inputs are split into concurrent shards by the extraction engine. If extraction_report is given,
+    it is updated with the engine's per-shard timings and merge conflicts.
+    """
+    if not get_extraction_llm():
         raise ConnectionError("Extraction LLM not initialized.")
     if not document_content:
         print("No document content provided for extraction.")
@@ -102,66 +185,45 @@ def _extract_data_with_llm_dynamic(document_content: str, form_config: dict) ->
         print(f"No field definitions found in configuration for form '{form_config.get('form_id', 'Unknown')}'.")
         return {}
 
-    field_ids = [field['id'] for field in field_definitions]
-    field_descriptions = "\n".join([f"- {field['id']}: {field['description_for_llm']}" for field in field_definitions])
-    
-    system_prompt = form_config.get('description_for_llm_system_prompt', 
-                                    "You are an expert at extracting specific information from user-provided text to fill out forms accurately.")
-
-    extraction_chain = LLMChain(llm=extraction_llm, prompt=EXTRACTION_PROMPT)
+    if form_entry is None:
+        form_entry = build_form_entry(form_config)
 
+    engine = ExtractionEngine(_invoke_extraction_llm, EXTRACTION_PROMPT)
     print(f"Invoking LLM for data extraction for form '{form_config.get('form_id', 'Unknown')}'...")
     try:
-        response = extraction_chain.invoke({
-            "system_prompt": system_prompt,
-            "document_content": document_content,
-            "field_ids": str(field_ids), # Pass as string representation of list
-            "field_descriptions": field_descriptions
-        })
-        llm_output_text = response.get('text', '')
-        print(f"LLM extraction response received for form '{form_config.get('form_id', 'Unknown')}'.")
-
-        try:
-            # Clean potential markdown code block fences
-            json_response_cleaned = llm_output_text.strip().lstrip('```json').lstrip('```').rstrip('```')
-            if not json_response_cleaned: # Handle empty string case
-                 print("LLM returned an empty string after cleaning.")
-                 return {"error": "LLM returned empty parsable output."}
-            
-            extracted_data_raw = json.loads(json_response_cleaned)
-            print(f"Parsed extracted data (raw): {extracted_data_raw}")
-
-            # Filter out "NOT_FOUND" values and ensure keys are expected field_ids
-            # LLM is expected to return keys matching field['id']
-            final_data = {
-                k: v for k, v in extracted_data_raw.items()
-                if k in field_ids and (v is not None and str(v).upper() != "NOT_FOUND")
-            }
-            return final_data
-
-        except json.JSONDecodeError as json_e:
-            print(f"Error decoding LLM JSON response: {json_e}")
-            print(f"LLM Raw Output was: {llm_output_text}")
-            return {"error": "Failed to parse extraction result from LLM"}
-        except Exception as parse_e:
-            print(f"Unexpected error parsing LLM response: {parse_e}")
-            return {"error": f"Unexpected error parsing LLM result: {parse_e}"}
-
+        result = engine.run(document_content, form_entry)
+    except LLMUnavailableError:
+        raise # Reported as 503 so clients retry later
     except Exception as llm_e:
         print(f"Error during LLM data extraction call: {llm_e}")
         if "API key not valid" in str(llm_e): # Be careful with error string matching
             raise ConnectionError("Extraction failed: Invalid Google API Key.")
         raise RuntimeError(f"LLM extraction failed: {llm_e}")
 
+    shard_timings = ", ".join(f"#{shard['index']} {shard['elapsed_ms']}ms" for shard in result["shards"])
+    print(f"LLM extraction response received for form '{form_config.get('form_id', 'Unknown')}' "
+          f"({len(result['shards'])} shard(s), ~{result['prompt_tokens']} prompt tokens, {result['context_mode']} context, "
+          f"in {result['elapsed_ms']}ms: {shard_timings}).")
+    if extraction_report is not None:
+        extraction_report.update({key: value for key, value in result.items() if key != "data"})
+    if result["error"]:
+        return {"error": result["error"]}
+    return result["data"]
+
 
-def _map_llm_data_to_pdf_fields(llm_extracted_data: dict, form_config_fields: list) -> dict:
-    """Maps data extracted by LLM (keyed by field 'id') to PDF field names."""
+def _map_llm_data_to_pdf_fields(llm_extracted_data: dict, form_config_fields: list = None, pdf_field_mapping: list = None) -> dict:
+    """
+    Maps data extracted by LLM (keyed by field 'id') to PDF field names.
+    Uses the registry's precomputed pdf_field_mapping when given, otherwise the raw field definitions.
+    """
+    if pdf_field_mapping is None:
+        pdf_field_mapping = [
+            (field_def['id'], field_def['pdf_field_name'], field_def.get('data_type', 'text'), field_def)
+            for field_def in form_config_fields or []
+        ]
     data_for_pdf = {}
-    for field_def in form_config_fields:
-        field_id = field_def['id']
-        pdf_field_name = field_def['pdf_field_name']
-        data_type = field_def.get('data_type', 'text')
-        
+    for field_id, pdf_field_name, data_type, field_def in pdf_field_mapping:
+
         llm_value = llm_extracted_data.get(field_id)
 
         if llm_value is None or str(llm_value).upper() == "NOT_FOUND":
@@ -197,40 +259,235 @@ def _map_llm_data_to_pdf_fields(llm_extracted_data: dict, form_config_fields: li
     return data_for_pdf
 
 
-def fill_dynamic_form(session_id: str, form_type: str) -> dict:
+def _extraction_cache_key(document_hashes: list, form_entry: dict) -> str:
+    llm = get_extraction_llm()
+    model_name = getattr(llm, "model", None) or type(llm).__name__
+    settings = {
+        "prompt": EXTRACTION_PROMPT_TEMPLATE_STR,
+        "context_mode": extraction_engine.EXTRACTION_CONTEXT_MODE,
+        "merge_policy": extraction_engine.EXTRACTION_MERGE_POLICY,
+        "token_budget": extraction_engine.EXTRACTION_SHARD_TOKEN_BUDGET,
+        "max_fields_per_shard": extraction_engine.EXTRACTION_MAX_FIELDS_PER_SHARD,
+    }
+    return make_result_key(document_hashes, form_entry, model_name, settings)
+
+
+def _extract_session_data(session_id: str, form_entry: dict, report, extracting_progress: float) -> tuple:
+    """
+    Reads the session's documents and extracts the form entry's fields, or returns the cached result of an
+    identical earlier extraction (same files, fields and model) without reading the documents at all.
+    Returns (extracted data, extraction report).
+    """
+    form_config = form_entry["config"]
+    report("reading_documents", 0.1)
+    cache_key = None
+    if extraction_result_cache is not None:
+        document_hashes = get_session_document_hashes(session_id)
+        if document_hashes:
+            cache_key = _extraction_cache_key(document_hashes, form_entry)
+            with metrics.span("fill.result_cache"):
+                cached = extraction_result_cache.get(cache_key)
+            if cached is not None:
+                print(f"Using cached extraction for form '{form_config.get('form_id', 'Unknown')}', session '{session_id}'.")
+                return cached["data"], {**cached["report"], "cache": "hit"}
+
+    with metrics.span("fill.read_documents"):
+        document_content = get_session_documents_content(session_id)
+    extraction_report = {"cache": "miss" if cache_key else "skipped"}
+    if not document_content:
+        print(f"No document content found for session '{session_id}'. Proceeding with potentially empty data for PDF.")
+        return {}, extraction_report
+
+    report("extracting_data", extracting_progress)
+    try:
+        with metrics.span("fill.extract"):
+            llm_extracted_data = _extract_data_with_llm_dynamic(document_content, form_config, form_entry, extraction_report)
+        if "error" in llm_extracted_data: # Check if LLM extraction itself reported an error
+            raise ValueError(f"Data extraction failed: {llm_extracted_data['error']}")
+    except (ConnectionError, RuntimeError, ValueError) as e:
+         print(f"Form filling aborted due to extraction error: {e}")
+         raise e # Propagate to app.py
+
+    if cache_key is not None:
+        extraction_result_cache.put(cache_key, llm_extracted_data, {key: value for key, value in extraction_report.items() if key != "cache"})
+    return llm_extracted_data, extraction_report
+
+
+# --- Fill Coalescing ---
+# A repeated fill of the same form over the same documents (e.g. a double-clicked "Fill Form") waits for the one in flight
+fill_flight = SingleFlight("fill")
+_progress_listeners = {} # flight key -> progress callbacks of every request sharing that fill
+_progress_listeners_lock = threading.Lock()
+
+def fill_dynamic_form(session_id: str, form_type: str, progress_callback=None) -> dict:
     """
     Orchestrates document retrieval, dynamic data extraction, and PDF filling.
-    Returns a dictionary with 'path' to the filled PDF and 'download_filename'.
+    Returns a dictionary with the filled PDF as 'pdf_bytes', a 'download_filename' and the 'extraction' report
+    (shard timings, merge conflicts); nothing is written to disk.
+    progress_callback, if given, is called as progress_callback(stage, fraction_complete) as stages start.
+    Concurrent calls for the same session, form type and set of documents share one fill; the result
+    then also has 'coalesced': True.
     """
+    key = (session_id, form_type, tuple(get_session_document_hashes(session_id)))
+    with _progress_listeners_lock:
+        listeners = _progress_listeners.setdefault(key, [])
+        if progress_callback is not None:
+            listeners.append(progress_callback)
+
+    def broadcast(stage: str, progress: float):
+        with _progress_listeners_lock:
+            callbacks = list(listeners)
+        for callback in callbacks:
+            callback(stage, progress)
+
+    try:
+        result, shared = fill_flight.do(key, lambda: _fill_dynamic_form(session_id, form_type, broadcast))
+    finally:
+        with _progress_listeners_lock:
+            if progress_callback is not None:
+                listeners.remove(progress_callback)
+            if not listeners and _progress_listeners.get(key) is listeners:
+                del _progress_listeners[key]
+    return {**result, "coalesced": shared}
+# --- End Fill Coalescing ---
+
+
+def _fill_dynamic_form(session_id: str, form_type: str, progress_callback=None) -> dict:
     print(f"Starting dynamic form filling process for form '{form_type}', session: '{session_id}'")
 
+    def report(stage: str, progress: float):
+        if progress_callback is not None:
+            progress_callback(stage, progress)
+
+    report("loading_config", 0.0)
     try:
-        form_config = load_form_config(form_type)
+        form_entry = form_registry.get_entry(form_type)
+        form_config = form_entry["config"]
     except (FileNotFoundError, ValueError, RuntimeError) as e:
         # These errors are specific and should be propagated to app.py to return appropriate HTTP status
         print(f"Configuration error for form '{form_type}': {e}")
         raise e 
 
-    # 1. Get aggregated text content
-    document_content = get_session_documents_content(session_id)
-    llm_extracted_data = {}
-    if not document_content:
-        print(f"No document content found for session '{session_id}'. Proceeding with potentially empty data for PDF.")
-    else:
-        # 2. Extract data using LLM
-        try:
-            llm_extracted_data = _extract_data_with_llm_dynamic(document_content, form_config)
-            if "error" in llm_extracted_data: # Check if LLM extraction itself reported an error
-                raise ValueError(f"Data extraction failed: {llm_extracted_data['error']}")
-        except (ConnectionError, RuntimeError, ValueError) as e:
-             print(f"Form filling aborted due to extraction error: {e}")
-             raise e # Propagate to app.py
+    # 1./2. Get aggregated text content and extract data using LLM (or reuse a cached extraction)
+    llm_extracted_data, extraction_report = _extract_session_data(session_id, form_entry, report, extracting_progress=0.4)
 
     # 3. Map LLM extracted data to PDF field names and values
-    data_for_pdf = _map_llm_data_to_pdf_fields(llm_extracted_data, form_config.get('fields', []))
+    with metrics.span("fill.map_fields"):
+        data_for_pdf = _map_llm_data_to_pdf_fields(llm_extracted_data, pdf_field_mapping=form_entry["pdf_field_mapping"])
     print(f"Data prepared for PDF filling: {data_for_pdf}")
 
     # 4. Fill the PDF form
+    report("filling_pdf", 0.8)
+    filled_pdf_bytes = _fill_form_template(form_type, form_config, data_for_pdf)
+
+    download_filename = f"filled_{_safe_filename_part(form_type)}_{session_id}.pdf" # More unique download name
+    report("done", 1.0)
+    return {"pdf_bytes": filled_pdf_bytes, "download_filename": download_filename, "extraction": extraction_report}
+
+
+def fill_dynamic_forms_batch(session_id: str, form_types: list, progress_callback=None) -> dict:
+    """
+    Fills several forms from one session with a single extraction pass over a merged field schema.
+    Returns {"zip_bytes", "download_filename", "forms": [...], "shared_field_ids": [...], "field_conflicts": [...], "extraction"};
+    each form in the zip is filled from the same extracted values.
+    progress_callback, if given, is called as progress_callback(stage, fraction_complete) as stages start.
+    """
+    form_types = list(dict.fromkeys(form_types)) # Drop repeats, keep request order
+    if not form_types:
+        raise ValueError("No form types given for batch filling.")
+    if len(form_types) > FILL_BATCH_MAX_FORMS:
+        raise ValueError(f"Too many forms in one batch ({len(form_types)}); the limit is {FILL_BATCH_MAX_FORMS}.")
+    print(f"Starting batch form filling for forms {form_types}, session: '{session_id}'")
+
+    def report(stage: str, progress: float):
+        if progress_callback is not None:
+            progress_callback(stage, progress)
+
+    report("loading_config", 0.0)
+    form_entries = []
+    for form_type in form_types:
+        try:
+            form_entries.append((form_type, form_registry.get_entry(form_type)))
+        except (FileNotFoundError, ValueError, RuntimeError) as e:
+            print(f"Configuration error for form '{form_type}': {e}")
+            raise e
+    merged = build_merged_form_entry([entry for _, entry in form_entries])
+    print(f"Merged {sum(len(entry['field_ids']) for _, entry in form_entries)} fields from {len(form_entries)} forms "
+          f"into {len(merged['entry']['field_ids'])} ({len(merged['shared_field_ids'])} shared).")
+
+    # 1./2. Get aggregated text content once and extract every distinct field in one pass
+    llm_extracted_data, extraction_report = _extract_session_data(session_id, merged["entry"], report, extracting_progress=0.3)
+
+    # 3./4. Map and fill each form with its own field mapping, then zip the PDFs in memory
+    forms = []
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for index, (form_type, form_entry) in enumerate(form_entries):
+            report("filling_pdf", 0.6 + 0.4 * index / len(form_entries))
+            with metrics.span("fill.map_fields"):
+                data_for_pdf = _map_llm_data_to_pdf_fields(llm_extracted_data, pdf_field_mapping=form_entry["pdf_field_mapping"])
+            print(f"Data prepared for PDF filling of '{form_type}': {data_for_pdf}")
+            filled_pdf_bytes = _fill_form_template(form_type, form_entry["config"], data_for_pdf)
+            form_filename = f"filled_{_safe_filename_part(form_type)}_{session_id}.pdf"
+            zip_file.writestr(form_filename, filled_pdf_bytes)
+            forms.append({"form_type": form_type, "filename": form_filename, "fields_filled": len(data_for_pdf)})
+
+    report("done", 1.0)
+    return {
+        "zip_bytes": zip_buffer.getvalue(),
+        "download_filename": f"filled_forms_{session_id}.zip",
+        "forms": forms,
+        "shared_field_ids": merged["shared_field_ids"],
+        "field_conflicts": merged["conflicts"],
+        "extraction": extraction_report,
+    }
+
+
+def build_merged_form_entry(form_entries: list) -> dict:
+    """
+    Merges the fields of several registry entries into one extraction schema, deduplicated by field id,
+    so a field used by several forms (name, A-Number, date of birth...) is extracted once.
+    The first form's definition wins when forms describe the same id differently; these are reported as conflicts.
+    Returns {"entry": merged form entry, "shared_field_ids": [...], "conflicts": [...]}.
+    """
+    merged_fields = {} # field id -> field definition, in first-seen order
+    used_by = {} # field id -> form ids using it
+    conflicts = []
+    system_prompts = []
+    for entry in form_entries:
+        config = entry["config"]
+        form_id = config.get("form_id", entry["form_type"])
+        if entry["system_prompt"] not in system_prompts:
+            system_prompts.append(entry["system_prompt"])
+        for field in config.get("fields", []):
+            field_id = field["id"]
+            used_by.setdefault(field_id, []).append(form_id)
+            existing = merged_fields.get(field_id)
+            if existing is None:
+                merged_fields[field_id] = field
+            elif existing["description_for_llm"] != field["description_for_llm"]:
+                print(f"Warning: Field '{field_id}' is described differently by '{form_id}'; using the first description.")
+                conflicts.append({"field_id": field_id, "form_id": form_id})
+
+    merged_config = {
+        "form_id": "+".join(entry["config"].get("form_id", entry["form_type"]) for entry in form_entries),
+        "description_for_llm_system_prompt": "\n".join(system_prompts),
+        "fields": list(merged_fields.values()),
+    }
+    return {
+        "entry": build_form_entry(merged_config),
+        "shared_field_ids": [field_id for field_id, form_ids in used_by.items() if len(form_ids) > 1],
+        "conflicts": conflicts,
+    }
+
+
+def _safe_filename_part(form_type: str) -> str:
+    # Sanitize form_type for use in filename if it contains spaces or special chars
+    return "".join(c if c.isalnum() else "_" for c in form_type)
+
+
+def _fill_form_template(form_type: str, form_config: dict, data_for_pdf: dict) -> bytes:
+    """Fills the form's PDF template from the template cache and returns the filled PDF bytes."""
     template_file_path_rel = form_config.get('template_path')
     if not template_file_path_rel:
         raise ValueError(f"No 'template_path' defined in configuration for form '{form_type}'.")
@@ -238,35 +495,16 @@ def fill_dynamic_form(session_id: str, form_type: str) -> dict:
     template_path_abs = os.path.join(_backend_dir, template_file_path_rel)
     print(f"Using PDF template: {template_path_abs}")
 
-    if not os.path.exists(template_path_abs):
+    try:
+        with metrics.span("fill.pdf_write"):
+            filled_pdf_bytes = template_cache.fill(template_path_abs, data_for_pdf)
+    except FileNotFoundError:
         print(f"Error: PDF template not found at {template_path_abs}")
         raise FileNotFoundError(f"PDF template '{template_file_path_rel}' as specified in config for '{form_type}' not found.")
-
-    try:
-        # Ensure session-specific output directory exists under the main filled_forms folder
-        session_filled_form_dir_abs = os.path.join(FILLED_FORM_FOLDER_ABS, session_id)
-        os.makedirs(session_filled_form_dir_abs, exist_ok=True)
-
-        # Sanitize form_type for use in filename if it contains spaces or special chars
-        safe_form_type_filename = "".join(c if c.isalnum() else "_" for c in form_type)
-        output_pdf_filename = f"{session_id}-filled-{safe_form_type_filename}.pdf"
-        output_pdf_path_abs = os.path.join(session_filled_form_dir_abs, output_pdf_filename)
-
-        pdf_wrapper = FormWrapper(template_path_abs)
-        pdf_wrapper.fill(
-            data_for_pdf,
-            adobe_mode=True
-        )
-
-        with open(output_pdf_path_abs, "wb+") as output_file:
-            output_file.write(pdf_wrapper.read())
-
-        print(f"Filled PDF for form '{form_type}' saved to: {output_pdf_path_abs}")
-        
-        download_filename = f"filled_{safe_form_type_filename}_{session_id}.pdf" # More unique download name
-        return {"path": output_pdf_path_abs, "download_filename": download_filename}
-
     except Exception as pdf_e:
         print(f"Error during PDF processing for {template_path_abs}: {pdf_e}")
         # Consider logging more details about data_for_pdf here for debugging
-        raise IOError(f"Failed to fill or save the PDF form '{form_type}': {pdf_e}")
\ No newline at end of file
+        raise IOError(f"Failed to fill the PDF form '{form_type}': {pdf_e}")
+
+    print(f"Filled PDF for form '{form_type}' in memory ({len(filled_pdf_bytes)} bytes).")
+    return filled_pdf_bytes
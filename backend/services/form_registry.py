@@ -0,0 +1,179 @@
+# backend/services/form_registry.py
+
+import os
+import json
+import time
+import glob
+import threading
+
+# --- Path Setup ---
+_service_dir = os.path.dirname(os.path.abspath(__file__))
+_backend_dir = os.path.dirname(_service_dir)
+
+FORM_CONFIGS_DIR_REL = os.getenv("FORM_CONFIGS_DIR", "form_configs")
+FORM_CONFIGS_DIR_ABS = os.path.join(_backend_dir, FORM_CONFIGS_DIR_REL)
+# --- End Path Setup ---
+
+# How often the config directory is re-scanned for new, changed or deleted files
+FORM_REGISTRY_CHECK_INTERVAL_SECONDS = float(os.getenv("FORM_REGISTRY_CHECK_INTERVAL_SECONDS", "5"))
+# Lookups of unknown form types re-scan early, but at most this often (unknown names must not force a scan per request)
+FORM_REGISTRY_FORCED_RESCAN_SECONDS = 1.0
+
+DEFAULT_SYSTEM_PROMPT = "You are an expert at extracting specific information from user-provided text to fill out forms accurately."
+_REQUIRED_FIELD_KEYS = ("id", "description_for_llm", "pdf_field_name")
+
+
+def _validate_config(config: dict, file_name: str) -> list:
+    """Returns a list of problems that make a form config unusable for filling; empty when valid."""
+    problems = []
+    if not isinstance(config, dict):
+        return [f"'{file_name}' does not contain a JSON object"]
+    fields = config.get("fields", [])
+    if not isinstance(fields, list):
+        problems.append("'fields' is not a list")
+        fields = []
+    for index, field in enumerate(fields):
+        missing = [key for key in _REQUIRED_FIELD_KEYS if not isinstance(field, dict) or key not in field]
+        if missing:
+            problems.append(f"field #{index} missing {', '.join(missing)}")
+    return problems
+
+
+def build_form_entry(config: dict, path: str = None, mtime_ns: int = None) -> dict:
+    """
+    Validates a form config and precomputes the pieces every fill needs: the field_ids list,
+    the field_descriptions prompt text and the field-to-PDF mapping table.
+    """
+    file_name = os.path.basename(path) if path else config.get("form_id", "config")
+    problems = _validate_config(config, file_name)
+    fields = [] if problems else config.get("fields", [])
+    return {
+        "path": path,
+        "mtime_ns": mtime_ns,
+        "form_type": os.path.splitext(file_name)[0],
+        "config": config,
+        "problems": problems,
+        "field_ids": [field["id"] for field in fields],
+        "field_descriptions": "\n".join(f"- {field['id']}: {field['description_for_llm']}" for field in fields),
+        "system_prompt": config.get("description_for_llm_system_prompt", DEFAULT_SYSTEM_PROMPT) if not problems else DEFAULT_SYSTEM_PROMPT,
+        # (field_id, pdf_field_name, data_type, field definition), in config order
+        "pdf_field_mapping": [
+            (field["id"], field["pdf_field_name"], field.get("data_type", "text"), field) for field in fields
+        ],
+    }
+
+
+class FormRegistry:
+    """
+    In-memory index of form configs, loaded and validated once and keyed by file name and form_id.
+    The directory is re-scanned at most every check_interval seconds, and only files whose
+    mtime changed are re-parsed.
+    """
+
+    def __init__(self, configs_dir: str = FORM_CONFIGS_DIR_ABS, check_interval: float = FORM_REGISTRY_CHECK_INTERVAL_SECONDS):
+        self.configs_dir = configs_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries = {} # config path -> entry
+        self._by_form_type = {} # file stem and form_id -> entry
+        self._last_scan = None
+        self.reloads = 0
+
+    def _load_entry(self, path: str, mtime_ns: int):
+        file_name = os.path.basename(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError) as e:
+            problem = f"invalid JSON: {e}" if isinstance(e, json.JSONDecodeError) else f"unreadable file: {e}"
+            print(f"Warning: Could not load '{file_name}', skipping it: {problem}")
+            return {"path": path, "mtime_ns": mtime_ns, "form_type": os.path.splitext(file_name)[0],
+                    "config": None, "problems": [problem]}
+        entry = build_form_entry(config, path, mtime_ns)
+        if entry["problems"]:
+            print(f"Warning: Config file '{file_name}' is invalid: {'; '.join(entry['problems'])}")
+        if not isinstance(config, dict) or not config.get('form_id') or not config.get('form_name'):
+            print(f"Warning: Config file '{file_name}' is missing 'form_id' or 'form_name'. It will not be listed.")
+        self.reloads += 1
+        print(f"Loaded form configuration '{file_name}'.")
+        return entry
+
+    def refresh(self, force: bool = False):
+        """
+        Re-scans the config directory if the check interval has elapsed. force shortens the interval
+        to FORM_REGISTRY_FORCED_RESCAN_SECONDS.
+        """
+        now = time.monotonic()
+        interval = min(self.check_interval, FORM_REGISTRY_FORCED_RESCAN_SECONDS) if force else self.check_interval
+        with self._lock:
+            if self._last_scan is not None and now - self._last_scan < interval:
+                return
+            self._last_scan = now
+            if not os.path.isdir(self.configs_dir):
+                self._entries.clear()
+                self._by_form_type.clear()
+                return
+
+            seen = set()
+            changed = False
+            for path in glob.glob(os.path.join(self.configs_dir, "*.json")):
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(path)
+                entry = self._entries.get(path)
+                if entry is None or entry["mtime_ns"] != mtime_ns:
+                    self._entries[path] = self._load_entry(path, mtime_ns)
+                    changed = True
+            for path in list(self._entries):
+                if path not in seen:
+                    print(f"Form configuration '{os.path.basename(path)}' was removed.")
+                    del self._entries[path]
+                    changed = True
+
+            if changed:
+                index = {}
+                for entry in sorted(self._entries.values(), key=lambda e: e["path"]):
+                    index[entry["form_type"]] = entry
+                    if isinstance(entry["config"], dict) and entry["config"].get("form_id"):
+                        index.setdefault(entry["config"]["form_id"], entry)
+                self._by_form_type = index
+
+    def list_forms(self) -> list:
+        """Returns [{"id", "name"}] for every valid config, as /api/list-forms serves it."""
+        self.refresh()
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: e["path"])
+        forms = []
+        for entry in entries:
+            config = entry["config"]
+            if not isinstance(config, dict):
+                continue
+            if config.get("form_id") and config.get("form_name"):
+                forms.append({"id": config["form_id"], "name": config["form_name"]})
+        return forms
+
+    def get_entry(self, form_type: str) -> dict:
+        """
+        Returns the precomputed entry for a form type (config file name or form_id).
+        Raises FileNotFoundError if unknown and ValueError if the config is invalid.
+        """
+        self.refresh()
+        with self._lock:
+            entry = self._by_form_type.get(form_type)
+        if entry is None:
+            # A config added since the last scan shouldn't have to wait for the interval
+            self.refresh(force=True)
+            with self._lock:
+                entry = self._by_form_type.get(form_type)
+        if entry is None:
+            raise FileNotFoundError(f"Configuration for form type '{form_type}' not found.")
+        if entry["config"] is None:
+            raise ValueError(f"Configuration for form type '{form_type}' could not be loaded: {'; '.join(entry['problems'])}")
+        if entry["problems"]:
+            raise ValueError(f"Invalid configuration for form type '{form_type}': {'; '.join(entry['problems'])}")
+        return entry
+
+
+form_registry = FormRegistry()
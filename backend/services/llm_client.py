@@ -0,0 +1,342 @@
+# backend/services/llm_client.py
+
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+
+from backend.utils import metrics
+
+# --- Configuration ---
+# Model calls in flight at once, across chat and form filling
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Client-side quota, kept a little under the project's Gemini limits (0 = unlimited)
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+# Output tokens reserved per call on top of the prompt estimate; settled against reported usage afterwards
+LLM_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", "512"))
+LLM_CHARS_PER_TOKEN = 4
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "1"))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "20"))
+# Calls not admitted within this long fail with LLMUnavailableError instead of waiting indefinitely
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "60"))
+# Point the Gemini clients at another endpoint, e.g. a local fake model server (http://127.0.0.1:8090)
+LLM_API_ENDPOINT = os.getenv("LLM_API_ENDPOINT", "")
+# --- End Configuration ---
+
+# Lower value = served first when calls are queued
+PRIORITY_FILL = 0
+PRIORITY_CHAT = 1
+PRIORITY_NAMES = {PRIORITY_FILL: "fill", PRIORITY_CHAT: "chat"}
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+_RETRYABLE_MESSAGES = ("resource_exhausted", "resource has been exhausted", "quota", "rate limit", "unavailable",
+                       "deadline exceeded", "temporarily", "429", "503")
+
+llm_calls = metrics.registry.counter("llm_calls_total", "Model calls by priority and outcome.", ("priority", "outcome"))
+llm_queued = metrics.registry.counter("llm_queued_total", "Model calls that waited for a concurrency slot.", ("priority",))
+llm_throttled = metrics.registry.counter("llm_throttled_total", "Model calls delayed by the requests or tokens per minute limit.", ("priority",))
+llm_retries = metrics.registry.counter("llm_retries_total", "Model call retries after retryable errors.", ("priority",))
+llm_queue_wait = metrics.registry.histogram("llm_queue_wait_seconds", "Time model calls waited to be admitted.", ("priority",))
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when a model call is not admitted within the queue timeout or keeps failing with retryable errors."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def create_chat_model(model: str, temperature: float, **kwargs):
+    """Creates a Gemini chat model for use through the gateway, which does the retrying."""
+    from langchain_google_genai import ChatGoogleGenerativeAI # Slow to import; only needed once a client is built
+    options = {"max_retries": 1} # One attempt per call; retries are paced by ModelGateway instead
+    if LLM_API_ENDPOINT:
+        options.update(transport="rest", client_options={"api_endpoint": LLM_API_ENDPOINT})
+    options.update(kwargs)
+    return ChatGoogleGenerativeAI(model=model, google_api_key=os.getenv("GOOGLE_API_KEY"), temperature=temperature, **options)
+
+
+def _error_chain(error: Exception):
+    """The error and the exceptions it wraps (langchain re-raises Google API errors in its own types)."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+def _status_code(error: Exception):
+    for attribute in ("code", "status_code"):
+        code = getattr(error, attribute, None)
+        if isinstance(code, int):
+            return code
+    return None
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limiting, overload and transient network errors."""
+    for cause in _error_chain(error):
+        if _status_code(cause) in RETRYABLE_STATUS_CODES:
+            return True
+        if isinstance(cause, (TimeoutError, ConnectionResetError, ConnectionAbortedError)):
+            return True
+        message = str(cause).lower()
+        if "api key not valid" not in message and any(fragment in message for fragment in _RETRYABLE_MESSAGES):
+            return True
+    return False
+
+def is_rate_limited(error: Exception) -> bool:
+    """True when the provider rejected the call for quota reasons (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    for cause in _error_chain(error):
+        message = str(cause).lower()
+        if _status_code(cause) == 429 or "resource_exhausted" in message or "resource has been exhausted" in message:
+            return True
+    return False
+
+
+def estimate_tokens(prompt) -> int:
+    return len(str(prompt)) // LLM_CHARS_PER_TOKEN + 1 + LLM_OUTPUT_TOKEN_ESTIMATE
+
+
+def _reported_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict) and usage.get("total_tokens"):
+        return usage["total_tokens"]
+    return None
+
+
+class TokenBucket:
+    """
+    Continuously refilling allowance of `per_minute` units. Not thread-safe on its own; ModelGateway
+    guards it with its lock. A per_minute of 0 disables the limit.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._rate = per_minute / 60.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full one)."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return needed / self._rate if needed > 0 else 0.0
+
+    def take(self, amount: float, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level -= amount
+
+    def settle(self, amount: float, now: float):
+        """Returns unused units (positive) or charges an overrun (negative) once actual usage is known."""
+        if self.capacity:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+    def drain(self, now: float):
+        """Empties the bucket, e.g. after the provider reported a quota error."""
+        if self.capacity:
+            self._refill(now)
+            self.level = min(self.level, 0.0)
+
+
+class ModelGateway:
+    """
+    Single entry point for model calls. Calls are admitted in priority order (fills before chat,
+    FIFO within a priority) once a concurrency slot and enough requests/tokens per minute are available,
+    and retried with jittered exponential backoff on rate limiting and transient errors.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE, max_retries: int = LLM_MAX_RETRIES,
+                 retry_base_delay: float = LLM_RETRY_BASE_DELAY_SECONDS, retry_max_delay: float = LLM_RETRY_MAX_DELAY_SECONDS,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS, sleep=time.sleep):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.queue_timeout = queue_timeout
+        self._sleep = sleep
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._waiting = [] # heap of (priority, sequence) tickets
+        self._sequence = itertools.count()
+        self.in_flight = 0
+        self.calls = 0
+        self.queued = 0
+        self.throttled = 0
+        self.retried = 0
+        self.failed = 0
+        self.rejected = 0
+
+    # --- Admission ---
+    def _acquire(self, priority: int, tokens: int):
+        ticket = (priority, next(self._sequence))
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        was_queued = was_throttled = False
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now = time.monotonic()
+                wait = None
+                if self._waiting[0] == ticket and self.in_flight < self.max_concurrency:
+                    wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+                    if wait <= 0:
+                        heapq.heappop(self._waiting)
+                        self._requests.take(1, now)
+                        self._tokens.take(tokens, now)
+                        self.in_flight += 1
+                        self._cond.notify_all() # The next ticket may be admissible too
+                        break
+                    was_throttled = True
+                else:
+                    was_queued = True
+                if now >= deadline:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self.rejected += 1
+                    self._cond.notify_all()
+                    llm_calls.inc(label, "rejected")
+                    raise LLMUnavailableError(
+                        f"Model is busy: call not admitted within {self.queue_timeout:g}s "
+                        f"({self.in_flight} in flight, {len(self._waiting)} waiting).",
+                        retry_after=max(1.0, wait or self.retry_base_delay),
+                    )
+                self._cond.wait(min(wait, deadline - now) if wait else deadline - now)
+            self.queued += was_queued
+            self.throttled += was_throttled
+        if was_queued:
+            llm_queued.inc(label)
+        if was_throttled:
+            llm_throttled.inc(label)
+        llm_queue_wait.observe(time.monotonic() - start, label)
+
+    def _release(self, reserved_tokens: int, used_tokens=None, rate_limited: bool = False):
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self._tokens.settle(reserved_tokens - used_tokens, now)
+            if rate_limited: # Everyone backs off, not just the caller that saw the 429
+                self._requests.drain(now)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": a random delay up to the exponential cap, so retries from a burst spread out
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    def _handle_failure(self, error: Exception, attempt: int, label: str) -> float:
+        """Returns the delay before the next attempt, or raises when the call should not be retried."""
+        if not is_retryable(error):
+            self.failed += 1
+            llm_calls.inc(label, "error")
+            raise error
+        if attempt >= self.max_retries:
+            self.failed += 1
+            llm_calls.inc(label, "exhausted")
+            raise LLMUnavailableError(f"Model call failed after {attempt + 1} attempt(s): {error}",
+                                      retry_after=self.retry_max_delay) from error
+        delay = self._backoff(attempt)
+        self.retried += 1
+        llm_retries.inc(label)
+        print(f"Retryable model error ({label}): {error}. Retry {attempt + 1}/{self.max_retries} in {delay:.2f}s.")
+        return delay
+    # --- End Admission ---
+
+    def invoke(self, model, prompt, priority: int = PRIORITY_CHAT):
+        """Calls model.invoke(prompt) under the gateway's limits and retry policy. Returns the model's response."""
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            with metrics.span("llm.admission"):
+                self._acquire(priority, tokens)
+            try:
+                response = model.invoke(prompt)
+            except Exception as e:
+                self._release(tokens, rate_limited=is_rate_limited(e))
+                delay = self._handle_failure(e, attempt, label)
+                self._sleep(delay)
+                attempt += 1
+                continue
+            self._release(tokens, _reported_tokens(response))
+            with self._cond:
+                self.calls += 1
+            llm_calls.inc(label, "ok")
+            return response
+
+    def stream(self, model, prompt, priority: int = PRIORITY_CHAT):
+        """
+        Yields chunks of model.stream(prompt), holding one slot for the whole stream. Only failures
+        before the first chunk are retried; a stream that breaks midway raises to the caller.
+        """
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            with metrics.span("llm.admission"):
+                self._acquire(priority, tokens)
+            started = False
+            try:
+                for chunk in model.stream(prompt):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self._release(tokens, rate_limited=is_rate_limited(e))
+                if started:
+                    self.failed += 1
+                    llm_calls.inc(label, "error")
+                    raise
+                delay = self._handle_failure(e, attempt, label)
+                self._sleep(delay)
+                attempt += 1
+                continue
+            except BaseException: # Consumer closed the generator early
+                self._release(tokens)
+                raise
+            self._release(tokens)
+            with self._cond:
+                self.calls += 1
+            llm_calls.inc(label, "ok")
+            return
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self._requests._refill(now)
+            self._tokens._refill(now)
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiting),
+                "waiting_by_priority": {
+                    PRIORITY_NAMES.get(priority, str(priority)): sum(1 for ticket in self._waiting if ticket[0] == priority)
+                    for priority in sorted({ticket[0] for ticket in self._waiting})
+                },
+                "requests_per_minute": self._requests.capacity,
+                "requests_available": round(self._requests.level, 2) if self._requests.capacity else None,
+                "tokens_per_minute": self._tokens.capacity,
+                "tokens_available": round(self._tokens.level) if self._tokens.capacity else None,
+                "calls": self.calls,
+                "queued": self.queued,
+                "throttled": self.throttled,
+                "retried": self.retried,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+
+llm_gateway = ModelGateway()
@@ -0,0 +1,293 @@
+# backend/services/session_manager.py
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# Use absolute imports
+from backend.services import document_service
+from backend.utils.upload_store import upload_store
+
+# --- Configuration ---
+# Sessions untouched for this long are removed by the janitor (0 = never expire)
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(2 * 60 * 60)))
+SESSION_JANITOR_INTERVAL_SECONDS = float(os.getenv("SESSION_JANITOR_INTERVAL_SECONDS", "60"))
+# When all sessions together use more than the high watermark, least recently used sessions are
+# removed until usage is back under the low watermark (0 = no disk limit). Content shared by
+# several sessions through the upload store is counted once.
+SESSION_DISK_HIGH_WATERMARK_BYTES = int(os.getenv("SESSION_DISK_HIGH_WATERMARK_BYTES", str(2 * 1024 * 1024 * 1024)))
+SESSION_DISK_LOW_WATERMARK_BYTES = int(os.getenv("SESSION_DISK_LOW_WATERMARK_BYTES", str(int(SESSION_DISK_HIGH_WATERMARK_BYTES * 0.8))))
+# --- End Configuration ---
+
+
+def _file_stats(path: str) -> list:
+    stats = []
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            try:
+                stats.append(os.stat(os.path.join(path, name)))
+            except OSError:
+                continue
+    return stats
+
+
+def _reclaimable_bytes(path: str) -> int:
+    """Bytes freed by removing the session: files no other session links to (the session's link plus the store object)."""
+    return sum(stat.st_size for stat in _file_stats(path) if stat.st_nlink <= 2)
+
+
+class SessionManager:
+    """
+    In-process index of upload sessions: last access time, bytes on disk and in-flight leases.
+    A background janitor removes sessions idle for longer than the TTL and, when total usage crosses
+    the high watermark, evicts least recently used sessions down to the low watermark.
+    A session with an active lease (a fill reading its files) is never removed; cleanup requested
+    while it is leased is deferred until the last lease is released. Files are removed outside the
+    index lock; a lease on a session that is being removed waits until the removal has finished.
+    """
+
+    def __init__(self, ttl_seconds: float = SESSION_TTL_SECONDS, high_watermark_bytes: int = SESSION_DISK_HIGH_WATERMARK_BYTES,
+                 low_watermark_bytes: int = SESSION_DISK_LOW_WATERMARK_BYTES, cleanup_fn=None, upload_root: str = None,
+                 sweep_fn=None):
+        self.ttl_seconds = ttl_seconds
+        self.high_watermark_bytes = high_watermark_bytes
+        self.low_watermark_bytes = min(low_watermark_bytes, high_watermark_bytes) if high_watermark_bytes else low_watermark_bytes
+        # Resolved at call time so the module-level function can be swapped out
+        self._cleanup_fn = cleanup_fn or (lambda session_id: document_service.cleanup_session_files(session_id))
+        self._sweep_fn = sweep_fn or upload_store.sweep # Full scan of the upload store, once per janitor run
+        self._janitor_tasks = [] # Other periodic housekeeping, see add_janitor_task()
+        self._upload_root = upload_root
+        self._lock = threading.Lock()
+        self._sessions = {} # session_id -> {"last_access", "bytes", "leases", "cleanup_pending"}
+        self._deleting = set() # Sessions whose files are being removed right now
+        self._deleted = threading.Condition(self._lock)
+        self._janitor = None
+        self._stop = threading.Event()
+        self.expired = 0
+        self.evicted = 0
+        self.cleaned = 0
+        self.deferred = 0
+        self.janitor_runs = 0
+        self.disk_bytes = 0 # Session storage measured by the last janitor run
+
+    @property
+    def upload_root(self) -> str:
+        return self._upload_root or document_service.UPLOAD_FOLDER_ABS
+
+    def _entry_locked(self, session_id: str) -> dict:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[session_id] = {"last_access": time.time(), "bytes": 0, "leases": 0, "cleanup_pending": False}
+        return entry
+
+    def load_existing(self):
+        """Indexes session directories already on disk (e.g. from before a restart), using their mtime as last access."""
+        root = self.upload_root
+        if not os.path.isdir(root):
+            return
+        found = 0
+        for session_id in os.listdir(root):
+            session_dir = os.path.join(root, session_id)
+            if not os.path.isdir(session_dir):
+                continue
+            try:
+                last_access = max([os.path.getmtime(session_dir)] + [
+                    os.path.getmtime(os.path.join(session_dir, name)) for name in os.listdir(session_dir)
+                ])
+            except OSError:
+                continue
+            size = _reclaimable_bytes(session_dir)
+            with self._lock:
+                if session_id not in self._sessions:
+                    self._sessions[session_id] = {"last_access": last_access, "bytes": size, "leases": 0, "cleanup_pending": False}
+                    found += 1
+        print(f"Session manager indexed {found} existing session(s) under {root}.")
+
+    def touch(self, session_id: str, refresh_usage: bool = False):
+        """Records an access to a session; refresh_usage re-reads its size on disk (after an upload)."""
+        if not session_id:
+            return
+        size = _reclaimable_bytes(os.path.join(self.upload_root, session_id)) if refresh_usage else None
+        with self._lock:
+            if session_id in self._deleting:
+                return
+            entry = self._entry_locked(session_id)
+            entry["last_access"] = time.time()
+            if size is not None:
+                entry["bytes"] = size
+
+    def acquire(self, session_id: str):
+        """Marks the session's files as in use. Pair every call with release()."""
+        with self._lock:
+            while session_id in self._deleting:
+                self._deleted.wait()
+            entry = self._entry_locked(session_id)
+            entry["leases"] += 1
+            entry["last_access"] = time.time()
+
+    def release(self, session_id: str):
+        """Ends a lease; runs a cleanup that was requested while the session was in use."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            entry["leases"] = max(0, entry["leases"] - 1)
+            entry["last_access"] = time.time()
+            run_cleanup = entry["leases"] == 0 and entry["cleanup_pending"]
+        if run_cleanup:
+            self.cleanup(session_id)
+
+    @contextmanager
+    def lease(self, session_id: str):
+        self.acquire(session_id)
+        try:
+            yield
+        finally:
+            self.release(session_id)
+
+    def cleanup(self, session_id: str, reason: str = "requested", unless_accessed_after: float = None) -> bool:
+        """
+        Removes a session's files and forgets it. If the session is leased, the cleanup is deferred
+        to the last release() and False is returned. With unless_accessed_after, a session used since
+        that time is left alone (the janitor's idle check may be stale by the time it cleans up).
+        """
+        with self._lock:
+            if session_id in self._deleting:
+                return True # Another caller is already removing it
+            entry = self._sessions.get(session_id)
+            if entry is not None and unless_accessed_after is not None and entry["last_access"] > unless_accessed_after:
+                return False
+            if entry is not None and entry["leases"] > 0:
+                if not entry["cleanup_pending"]:
+                    entry["cleanup_pending"] = True
+                    self.deferred += 1
+                    print(f"Cleanup of session '{session_id}' ({reason}) deferred until its in-flight fills finish.")
+                return False
+            self._sessions.pop(session_id, None)
+            if reason == "expired":
+                self.expired += 1
+            elif reason == "evicted":
+                self.evicted += 1
+            else:
+                self.cleaned += 1
+            self._deleting.add(session_id)
+        # Outside the lock, so other sessions are not blocked by the removal; new leases on this one wait
+        try:
+            self._cleanup_fn(session_id)
+        finally:
+            with self._lock:
+                self._deleting.discard(session_id)
+                self._deleted.notify_all()
+        return True
+
+    def disk_usage(self) -> int:
+        """Bytes used by all session directories, counting each hard-linked file once."""
+        root = self.upload_root
+        seen, total = set(), 0
+        if os.path.isdir(root):
+            for session_id in os.listdir(root):
+                for stat in _file_stats(os.path.join(root, session_id)):
+                    if (stat.st_dev, stat.st_ino) not in seen:
+                        seen.add((stat.st_dev, stat.st_ino))
+                        total += stat.st_size
+        return total
+
+    def run_janitor_once(self, now: float = None) -> dict:
+        """
+        Expires idle sessions, evicts LRU sessions while over the watermark, then sweeps the upload
+        store for unreferenced objects. Returns what was removed.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self.janitor_runs += 1
+            idle = [
+                session_id for session_id, entry in self._sessions.items()
+                if self.ttl_seconds and entry["leases"] == 0 and now - entry["last_access"] > self.ttl_seconds
+            ]
+        for session_id in idle:
+            print(f"Session '{session_id}' idle for over {self.ttl_seconds:.0f}s, removing.")
+            self.cleanup(session_id, reason="expired", unless_accessed_after=now - self.ttl_seconds)
+
+        evicted = []
+        if self.high_watermark_bytes:
+            total = self.disk_usage()
+            with self._lock:
+                candidates = sorted(
+                    (entry["last_access"], session_id)
+                    for session_id, entry in self._sessions.items() if entry["leases"] == 0
+                ) if total > self.high_watermark_bytes else []
+            for last_access, session_id in candidates:
+                if total <= self.low_watermark_bytes:
+                    break
+                # Measured just before removal: evicting earlier sessions may have left this one the last link to shared files
+                size = _reclaimable_bytes(os.path.join(self.upload_root, session_id))
+                if self.cleanup(session_id, reason="evicted", unless_accessed_after=last_access):
+                    total -= size
+                    evicted.append(session_id)
+            self.disk_bytes = total
+            if evicted:
+                print(f"Session storage over {self.high_watermark_bytes} bytes; evicted {len(evicted)} least recently used session(s).")
+
+        try:
+            swept = self._sweep_fn()
+        except OSError as e:
+            print(f"Upload store sweep failed: {e}")
+            swept = 0
+        for task in list(self._janitor_tasks):
+            try:
+                task()
+            except Exception as e:
+                print(f"Janitor task {getattr(task, '__qualname__', task)} failed: {e}")
+        return {"expired": idle, "evicted": evicted, "swept": swept}
+
+    def add_janitor_task(self, fn):
+        """Runs fn (no arguments) at the end of every janitor run, e.g. to expire other in-memory state."""
+        with self._lock:
+            self._janitor_tasks.append(fn)
+
+    def _janitor_loop(self, interval_seconds: float):
+        while not self._stop.wait(interval_seconds):
+            try:
+                self.run_janitor_once()
+            except Exception as e:
+                print(f"Session janitor error: {e}")
+
+    def start_janitor(self, interval_seconds: float = SESSION_JANITOR_INTERVAL_SECONDS):
+        """Indexes existing sessions and starts the background janitor thread (once)."""
+        with self._lock:
+            if self._janitor is not None:
+                return
+            self._janitor = threading.Thread(target=self._janitor_loop, args=(interval_seconds,), name="session-janitor", daemon=True)
+        self.load_existing()
+        self._janitor.start()
+        print(f"Session janitor started (TTL {self.ttl_seconds:.0f}s, every {interval_seconds:.0f}s).")
+
+    def stop_janitor(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            entries = list(self._sessions.values())
+            return {
+                "sessions": len(entries),
+                "leased": sum(1 for entry in entries if entry["leases"] > 0),
+                "cleanup_pending": sum(1 for entry in entries if entry["cleanup_pending"]),
+                "deleting": len(self._deleting),
+                "bytes": sum(entry["bytes"] for entry in entries), # Reclaimable, i.e. not shared with another session
+                "disk_bytes": self.disk_bytes,
+                "oldest_idle_seconds": round(max((now - entry["last_access"] for entry in entries), default=0.0), 1),
+                "ttl_seconds": self.ttl_seconds,
+                "high_watermark_bytes": self.high_watermark_bytes,
+                "low_watermark_bytes": self.low_watermark_bytes,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "cleaned": self.cleaned,
+                "deferred": self.deferred,
+                "janitor_runs": self.janitor_runs,
+                "janitor_running": self._janitor is not None and self._janitor.is_alive(),
+            }
+
+
+session_manager = SessionManager()
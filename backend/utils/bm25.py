@@ -0,0 +1,98 @@
+# backend/utils/bm25.py
+
+import re
+import math
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Only words that carry no signal in form field descriptions or USCIS questions
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how i if in is it its of on or s that the this to was what
+when where which who will with you your do does can my me
+""".split())
+
+
+def tokenize(text: str) -> list:
+    """Lowercases text and splits it into alphanumeric tokens without stopwords ('Form I-765' -> ['form', '765'])."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 index over a list of texts, with an inverted index so a search
+    only touches documents that share a term with the query.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {} # term -> [(doc index, term frequency)]
+        self._doc_lengths = []
+        self._idf = {}
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    @classmethod
+    def from_texts(cls, texts: list, **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        index.add_texts(texts)
+        return index
+
+    def add_texts(self, texts: list):
+        for text in texts:
+            doc_index = len(self._doc_lengths)
+            counts = Counter(tokenize(text))
+            for term, frequency in counts.items():
+                self._postings.setdefault(term, []).append((doc_index, frequency))
+            self._doc_lengths.append(sum(counts.values()))
+        self._compute_idf()
+
+    def _compute_idf(self):
+        total = len(self._doc_lengths)
+        self._idf = {
+            term: math.log(1.0 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def to_dict(self) -> dict:
+        return {"k1": self.k1, "b": self.b, "doc_lengths": self._doc_lengths, "postings": self._postings}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BM25Index":
+        """Rebuilds an index saved with to_dict() (e.g. after a JSON round trip)."""
+        index = cls(k1=data["k1"], b=data["b"])
+        index._doc_lengths = list(data["doc_lengths"])
+        index._postings = {term: [tuple(posting) for posting in postings] for term, postings in data["postings"].items()}
+        index._compute_idf()
+        return index
+
+    def coverage(self, query: str, score: float) -> float:
+        """
+        Relates a score to the query's total IDF: about 1.0 when a document of average length contains
+        every query term once. Terms missing from the corpus count at the highest possible IDF, so queries
+        the index knows little about get low coverage.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self._doc_lengths:
+            return 0.0
+        unseen_idf = math.log(1.0 + (len(self._doc_lengths) + 0.5) / 0.5)
+        total_idf = sum(self._idf.get(term, unseen_idf) for term in terms)
+        return score / total_idf if total_idf else 0.0
+
+    def search(self, query: str, k: int = 5) -> list:
+        """Returns up to k (doc index, score) pairs with a positive score, best first."""
+        if not self._doc_lengths:
+            return []
+        average_length = (sum(self._doc_lengths) / len(self._doc_lengths)) or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for doc_index, frequency in postings:
+                length_norm = self.k1 * (1.0 - self.b + self.b * self._doc_lengths[doc_index] / average_length)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * frequency * (self.k1 + 1.0) / (frequency + length_norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
@@ -0,0 +1,222 @@
+# backend/utils/extraction_cache.py
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- Path Setup ---
+_utils_dir = os.path.dirname(os.path.abspath(__file__))
+_backend_dir = os.path.dirname(_utils_dir)
+
+EXTRACTION_CACHE_DIR_REL = os.getenv("EXTRACTION_CACHE_DIR", "extraction_cache")
+EXTRACTION_CACHE_DIR_ABS = os.path.join(_backend_dir, EXTRACTION_CACHE_DIR_REL)
+# --- End Path Setup ---
+
+# Total bytes of cached text kept on disk before least-recently-used entries are evicted
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+_ENTRY_SUFFIX = ".txt"
+
+
+# Digests already known for a file version, keyed by (device, inode, size, mtime), e.g. hashed while uploading
+_HASH_MEMO_MAX_ENTRIES = 10000
+_hash_memo = OrderedDict()
+_hash_memo_lock = threading.Lock()
+
+def _file_identity(filepath: str) -> tuple:
+    stat = os.stat(filepath)
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def remember_file_hash(filepath: str, digest: str):
+    """Records a digest computed elsewhere so hash_file() does not read the file again."""
+    try:
+        identity = _file_identity(filepath)
+    except OSError:
+        return
+    with _hash_memo_lock:
+        _hash_memo[identity] = digest
+        _hash_memo.move_to_end(identity)
+        while len(_hash_memo) > _HASH_MEMO_MAX_ENTRIES:
+            _hash_memo.popitem(last=False)
+
+def hash_file(filepath: str) -> str:
+    """Returns the SHA-256 hex digest of a file's bytes, read in chunks (or remembered from upload)."""
+    identity = _file_identity(filepath)
+    with _hash_memo_lock:
+        digest = _hash_memo.get(identity)
+    if digest is not None:
+        return digest
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    On-disk, content-addressed cache of extracted document text.
+    Entries are keyed by the SHA-256 of the file bytes plus the extractor version,
+    so identical documents are only extracted once, across sessions and restarts.
+    Total size is bounded with least-recently-used eviction.
+    """
+
+    def __init__(self, cache_dir: str, version: str, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.version = str(version)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # entry filename -> size in bytes, oldest first
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _entry_name(self, file_hash: str) -> str:
+        return f"{file_hash}.v{self.version}{_ENTRY_SUFFIX}"
+
+    def _load_index(self):
+        """Rebuilds the LRU index from the cache directory, dropping entries from other extractor versions."""
+        found = []
+        current_suffix = f".v{self.version}{_ENTRY_SUFFIX}"
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not name.endswith(_ENTRY_SUFFIX) or not os.path.isfile(path):
+                continue
+            if not name.endswith(current_suffix):
+                # Written by a different extractor version, can never be hit again
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Could not remove stale extraction cache entry {path}: {e}")
+                continue
+            stat = os.stat(path)
+            found.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+        print(f"Extraction cache loaded {len(self._entries)} entries ({self._total_bytes} bytes) from {self.cache_dir}")
+        self._remove_files(self._evict_locked(), "evicted ")
+
+    def get(self, file_hash: str):
+        """Returns cached text for a file hash, or None on a miss."""
+        name = self._entry_name(file_hash)
+        path = os.path.join(self.cache_dir, name)
+        # The lock only guards the index; the file is read outside it so lookups don't queue behind disk I/O
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path, None)  # Persist recency so LRU order survives restarts
+        except OSError:
+            # Removed behind our back (e.g. evicted meanwhile), treat as a miss
+            with self._lock:
+                if name in self._entries:
+                    self._total_bytes -= self._entries.pop(name)
+                self.misses += 1
+            return None
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            self.hits += 1
+        return text
+
+    def put(self, file_hash: str, text: str):
+        """Stores extracted text for a file hash and evicts old entries if over the size bound."""
+        name = self._entry_name(file_hash)
+        path = os.path.join(self.cache_dir, name)
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            print(f"Extracted text for {file_hash} ({len(data)} bytes) exceeds cache size, not caching.")
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)  # Atomic, readers never see a partial entry
+        except OSError as e:
+            print(f"Could not write extraction cache entry {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            if name in self._entries:
+                self._total_bytes -= self._entries.pop(name)
+            self._entries[name] = len(data)
+            self._total_bytes += len(data)
+            evicted = self._evict_locked()
+        self._remove_files(evicted, "evicted ")
+
+    def _evict_locked(self) -> list:
+        """Drops least recently used entries from the index while over the size bound; returns their names for removal."""
+        evicted = []
+        while self._total_bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            evicted.append(name)
+        return evicted
+
+    def _remove_files(self, names: list, kind: str = ""):
+        # Outside the lock; a lookup racing with the removal just sees a miss
+        for name in names:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Could not remove {kind}extraction cache entry {name}: {e}")
+
+    def invalidate(self, file_hash: str = None):
+        """Removes one entry by file hash, or the whole cache when no hash is given."""
+        with self._lock:
+            if file_hash is not None:
+                names = [self._entry_name(file_hash)]
+            else:
+                names = list(self._entries.keys())
+            removed = []
+            for name in names:
+                size = self._entries.pop(name, None)
+                if size is None:
+                    continue
+                self._total_bytes -= size
+                removed.append(name)
+        self._remove_files(removed)
+        print(f"Invalidated {len(removed)} extraction cache entries.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache(version: str):
+    """Returns the process-wide extraction cache, or None if caching is disabled."""
+    global _cache
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.version != str(version):
+            _cache = ExtractionCache(EXTRACTION_CACHE_DIR_ABS, version)
+        return _cache
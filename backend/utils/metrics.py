@@ -0,0 +1,258 @@
+# backend/utils/metrics.py
+import os
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- Configuration ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Requests (and background fill jobs) slower than this are logged with their per-stage breakdown; 0 disables
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "3000"))
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = tuple(
+    float(bound) for bound in os.getenv("METRICS_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60").split(",")
+)
+# --- End Configuration ---
+
+METRIC_PREFIX = "aiff_"
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: dict = None) -> str:
+    pairs = list(zip(label_names, label_values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {} # label values tuple -> count
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0.0)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}" for labels, value in items)
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, in the Prometheus exposition layout."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {} # label values tuple -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, *label_values) -> dict:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": series[2], "sum": series[1]}
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((labels, (list(series[0]), series[1], series[2])) for labels, series in self._series.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, {'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, label_names: tuple = ()) -> Counter:
+        return self._register(Counter(METRIC_PREFIX + name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(METRIC_PREFIX + name, help_text, label_names, buckets))
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_duration = registry.histogram("stage_duration_seconds", "Time spent in each instrumented stage.", ("stage",))
+stage_errors = registry.counter("stage_errors_total", "Instrumented stages that raised an exception.", ("stage",))
+request_duration = registry.histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+requests_total = registry.counter("http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"))
+slow_requests = registry.counter("slow_requests_total", "Requests and jobs slower than SLOW_REQUEST_THRESHOLD_MS.", ("kind",))
+
+
+# --- Request traces ---
+class Trace:
+    """Per-request (or per-job) record of the stages it went through, used for the slow-request breakdown."""
+
+    def __init__(self, name: str, request_id: str = None):
+        self.name = name
+        self.request_id = request_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans = [] # (stage, elapsed_ms)
+        self._lock = threading.Lock() # Spans can be added from worker threads running in the trace's context
+
+    def add_span(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            self.spans.append((stage, elapsed_ms))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000.0
+
+    def breakdown(self) -> dict:
+        """Total milliseconds per stage, in first-seen order. Nested stages overlap their parents."""
+        totals = {}
+        with self._lock:
+            for stage, elapsed_ms in self.spans:
+                totals[stage] = totals.get(stage, 0.0) + elapsed_ms
+        return {stage: round(elapsed_ms, 1) for stage, elapsed_ms in totals.items()}
+
+
+_current_trace = contextvars.ContextVar("aiff_trace", default=None)
+
+def current_trace():
+    return _current_trace.get()
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+def start_trace(name: str, request_id: str = None):
+    """Starts a trace in the current context. Returns (trace, token) for finish_trace()."""
+    trace = Trace(name, request_id)
+    return trace, _current_trace.set(trace)
+
+def finish_trace(trace: Trace, token, kind: str = "request", status=None) -> float:
+    """Ends the trace, logging it with its stage breakdown if it was slow. Returns the elapsed milliseconds."""
+    try:
+        _current_trace.reset(token)
+    except ValueError: # Token from another context (e.g. finished on a different thread); nothing to restore
+        pass
+    elapsed_ms = trace.elapsed_ms()
+    if METRICS_ENABLED and SLOW_REQUEST_THRESHOLD_MS > 0 and elapsed_ms >= SLOW_REQUEST_THRESHOLD_MS:
+        slow_requests.inc(kind)
+        stages = ", ".join(f"{stage}={elapsed:.1f}ms" for stage, elapsed in trace.breakdown().items()) or "no instrumented stages"
+        status_part = f" -> {status}" if status is not None else ""
+        print(f"SLOW {kind} {trace.request_id} {trace.name}{status_part} took {elapsed_ms:.1f}ms: {stages}")
+    return elapsed_ms
+
+@contextmanager
+def trace(name: str, request_id: str = None, kind: str = "job"):
+    """Traces a unit of work outside a Flask request, e.g. a background fill job."""
+    active, token = start_trace(name, request_id)
+    try:
+        yield active
+    finally:
+        finish_trace(active, token, kind=kind)
+
+def bind_context(fn):
+    """Wraps fn to run in a copy of the caller's context, so spans in pool threads join the caller's trace."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+# --- End Request traces ---
+
+
+@contextmanager
+def span(stage: str):
+    """Times the enclosed block as one stage: recorded in the stage histogram and the current trace."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_duration.observe(elapsed, stage)
+        active = _current_trace.get()
+        if active is not None:
+            active.add_span(stage, elapsed * 1000.0)
+
+
+# --- Flask integration ---
+REQUEST_ID_HEADER = "X-Request-ID"
+
+def init_app(app):
+    """Gives every request an ID (echoed in X-Request-ID), records request metrics and logs slow requests."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_trace():
+        incoming = request.headers.get(REQUEST_ID_HEADER, "")
+        request_id = incoming if 0 < len(incoming) <= 128 else None
+        g.metrics_trace, g.metrics_token = start_trace(f"{request.method} {request.path}", request_id)
+
+    @app.after_request
+    def _finish_request_trace(response):
+        active = g.pop("metrics_trace", None)
+        if active is None:
+            return response
+        # Streamed responses are measured up to the first byte; their generators keep running afterwards
+        elapsed_ms = finish_trace(active, g.pop("metrics_token"), kind="request", status=response.status_code)
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        if METRICS_ENABLED:
+            request_duration.observe(elapsed_ms / 1000.0, request.method, route)
+            requests_total.inc(request.method, route, str(response.status_code))
+        response.headers[REQUEST_ID_HEADER] = active.request_id
+        return response
+# --- End Flask integration ---
@@ -0,0 +1,227 @@
+# backend/utils/ocr.py
+
+import os
+import threading
+import importlib.util
+from backend.utils import metrics
+
+# --- Use Google Cloud Vision ---
+# The client library is heavy (gRPC, protobufs), so it is only imported when OCR is first needed
+try:
+    VISION_AVAILABLE = importlib.util.find_spec("google.cloud.vision") is not None
+except (ImportError, ValueError):
+    VISION_AVAILABLE = False
+if not VISION_AVAILABLE:
+    print("Warning: google-cloud-vision library not found. Install with 'pip install google-cloud-vision'")
+    print("Warning: OCR functionality via Google Cloud Vision will be unavailable.")
+
+_vision_module = None
+_vision_import_lock = threading.Lock()
+
+def _vision():
+    """Imports google.cloud.vision on first use. Raises RuntimeError if it is not installed."""
+    global _vision_module
+    if _vision_module is None:
+        if not VISION_AVAILABLE:
+            raise RuntimeError("google-cloud-vision library not installed.")
+        with _vision_import_lock:
+            if _vision_module is None:
+                from google.cloud import vision
+                print("Google Cloud Vision library loaded.")
+                _vision_module = vision
+    return _vision_module
+# --- End Google Cloud Vision ---
+
+# Vision accepts at most 16 images per synchronous batch_annotate_images request
+OCR_BATCH_MAX_IMAGES = min(int(os.getenv("OCR_BATCH_MAX_IMAGES", "16")), 16)
+# Keep inline image payloads of one request under the API's request size limit
+OCR_BATCH_MAX_BYTES = int(os.getenv("OCR_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))
+
+
+# --- Shared Vision Client ---
+_vision_client = None
+_vision_client_pid = None
+_vision_client_lock = threading.Lock()
+
+def get_vision_client():
+    """
+    Returns the process-wide Vision client, creating it on first use.
+    gRPC channels must not cross a fork, so a forked child builds its own client.
+    """
+    global _vision_client, _vision_client_pid
+    vision = _vision()
+    with _vision_client_lock:
+        if _vision_client is None or _vision_client_pid != os.getpid():
+            print("Creating Google Cloud Vision client...")
+            _vision_client = vision.ImageAnnotatorClient() # Assumes ADC is configured
+            _vision_client_pid = os.getpid()
+        return _vision_client
+
+def _reset_vision_client_after_fork():
+    global _vision_client, _vision_client_pid, _vision_client_lock
+    _vision_client = None
+    _vision_client_pid = None
+    _vision_client_lock = threading.Lock() # The parent's lock may have been held at fork time
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_vision_client_after_fork)
+# --- End Shared Vision Client ---
+
+
+class OCRBackend:
+    """
+    Interface for OCR providers. annotate_batch takes a list of image bytes and returns
+    one (text, error) tuple per image, in the same order; text is '' when nothing was detected.
+    """
+    max_batch_images = OCR_BATCH_MAX_IMAGES
+
+    def annotate_batch(self, contents: list) -> list:
+        raise NotImplementedError
+
+
+class VisionOCRBackend(OCRBackend):
+    """OCR through Cloud Vision document_text_detection, batched with batch_annotate_images."""
+
+    def __init__(self, client=None):
+        # A client can be injected (e.g. a local fake); otherwise the shared client is used
+        self._client = client
+
+    def annotate_batch(self, contents: list) -> list:
+        client = self._client or get_vision_client()
+        vision = _vision()
+        feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+        requests = [
+            vision.AnnotateImageRequest(image=vision.Image(content=content), features=[feature])
+            for content in contents
+        ]
+        print(f"Sending batch of {len(requests)} image(s) to Google Cloud Vision API...")
+        batch_response = client.batch_annotate_images(requests=requests)
+        print("Received batch response from Google Cloud Vision API.")
+
+        results = []
+        for response in batch_response.responses:
+            if response.error.message:
+                results.append((None, response.error.message))
+            elif response.full_text_annotation and response.full_text_annotation.text:
+                results.append((response.full_text_annotation.text, None))
+            else:
+                results.append(("", None))
+        return results
+
+
+_ocr_backend = VisionOCRBackend() if VISION_AVAILABLE else None
+
+def get_ocr_backend():
+    return _ocr_backend
+
+def set_ocr_backend(backend):
+    """Replaces the OCR backend (e.g. with a local fake for tests or benchmarks). Returns the previous one."""
+    global _ocr_backend
+    previous = _ocr_backend
+    _ocr_backend = backend
+    return previous
+
+
+def plan_batches(filepaths: list, max_images: int = None, max_bytes: int = OCR_BATCH_MAX_BYTES) -> list:
+    """Groups image files into batches respecting the per-request image count and payload size limits."""
+    if max_images is None:
+        backend = get_ocr_backend()
+        max_images = backend.max_batch_images if backend is not None else OCR_BATCH_MAX_IMAGES
+    batches = []
+    current, current_bytes = [], 0
+    for filepath in filepaths:
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            size = 0
+        if current and (len(current) >= max_images or current_bytes + size > max_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(filepath)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def ocr_bytes(contents: list) -> list:
+    """
+    OCRs in-memory images (e.g. page images pulled out of a scanned PDF), splitting them into
+    as few backend calls as the batch limits allow. Returns one (text, error) tuple per image.
+    """
+    backend = get_ocr_backend()
+    if backend is None:
+        return [(None, "google-cloud-vision library not installed")] * len(contents)
+
+    results = []
+    start = 0
+    while start < len(contents):
+        end, batch_bytes = start, 0
+        while end < len(contents) and end - start < backend.max_batch_images:
+            if end > start and batch_bytes + len(contents[end]) > OCR_BATCH_MAX_BYTES:
+                break
+            batch_bytes += len(contents[end])
+            end += 1
+        try:
+            with metrics.span("ocr.request"):
+                annotations = backend.annotate_batch(contents[start:end])
+            if len(annotations) != end - start:
+                raise RuntimeError(f"OCR backend returned {len(annotations)} results for {end - start} images")
+            results.extend(annotations)
+        except Exception as vision_err:
+            print(f"Error during Google Cloud Vision batch processing: {vision_err}")
+            results.extend([(None, str(vision_err))] * (end - start))
+        start = end
+    return results
+
+
+def ocr_files_batch(filepaths: list) -> dict:
+    """
+    OCRs a batch of image files with a single backend call and maps the results back to files.
+    Returns {filepath: (text, cacheable)}, using the same markers extract_text has always produced.
+    """
+    backend = get_ocr_backend()
+    results = {}
+    if backend is None:
+        print("OCR skipped: google-cloud-vision library not installed.")
+        for filepath in filepaths:
+            results[filepath] = (f"[Cloud OCR Skipped: Library missing - {os.path.basename(filepath)}]", False)
+        return results
+
+    contents, readable = [], []
+    for filepath in filepaths:
+        try:
+            with open(filepath, "rb") as image_file:
+                contents.append(image_file.read())
+            readable.append(filepath)
+        except OSError as e:
+            print(f"Error reading image {filepath}: {e}")
+            results[filepath] = (f"[Error processing file {os.path.basename(filepath)}]", False)
+    if not readable:
+        return results
+
+    try:
+        with metrics.span("ocr.request"):
+            annotations = backend.annotate_batch(contents)
+        if len(annotations) != len(readable):
+            raise RuntimeError(f"OCR backend returned {len(annotations)} results for {len(readable)} images")
+    except Exception as vision_err:
+        # Catch errors during API call or processing
+        print(f"Error during Google Cloud Vision batch processing: {vision_err}")
+        for filepath in readable:
+            results[filepath] = (f"[Cloud OCR Error: {vision_err} - {os.path.basename(filepath)}]", False)
+        return results
+
+    for filepath, (text, error) in zip(readable, annotations):
+        name = os.path.basename(filepath)
+        if error:
+            print(f"!!! Cloud Vision API Error for {filepath}: {error}")
+            results[filepath] = (f"[Cloud OCR Error: Cloud Vision API Error: {error} - {name}]", False)
+        elif text:
+            print(f"Extracted {len(text)} characters via Google Cloud Vision from {name}.")
+            results[filepath] = (text, True)
+        else:
+            print(f"No text detected by Google Cloud Vision in {filepath}.")
+            # Cached by content hash and shared across sessions, so it must not carry this upload's filename
+            results[filepath] = ("[No text detected by Cloud OCR]", True)
+    return results
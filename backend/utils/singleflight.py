@@ -0,0 +1,83 @@
+# backend/utils/singleflight.py
+
+import os
+import threading
+from concurrent.futures import Future
+
+from backend.utils import metrics
+
+# --- Configuration ---
+# Identical concurrent chat questions and fill requests share one computation
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+# --- End Configuration ---
+
+singleflight_requests = metrics.registry.counter(
+    "singleflight_requests_total", "Coalesced calls by group; role is 'leader' (computed) or 'follower' (shared a result).", ("group", "role")
+)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader) runs the function
+    and every caller that arrives while it is running waits for, and shares, its result or exception.
+    Nothing is kept once the call finishes, so a later call with the same key runs again.
+    """
+
+    def __init__(self, name: str, enabled: bool = SINGLEFLIGHT_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls = {} # key -> {"future", "followers"}
+        self.leaders = 0
+        self.followers = 0
+        self.errors = 0
+        self.max_followers = 0 # Largest number of callers that shared one computation, minus the leader
+
+    def do(self, key, fn) -> tuple:
+        """Returns (result, shared): shared is True when the result came from another caller's computation."""
+        if not self.enabled or key is None:
+            return fn(), False
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call["followers"] += 1
+                self.followers += 1
+                self.max_followers = max(self.max_followers, call["followers"])
+                leader = False
+            else:
+                call = self._calls[key] = {"future": Future(), "followers": 0}
+                self.leaders += 1
+                leader = True
+        singleflight_requests.inc(self.name, "leader" if leader else "follower")
+
+        if not leader:
+            return call["future"].result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+                self.errors += 1
+            call["future"].set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        call["future"].set_result(result)
+        if call["followers"]:
+            print(f"Single-flight '{self.name}': {call['followers']} identical concurrent request(s) shared one result.")
+        return result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.leaders + self.followers
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._calls),
+                "waiting": sum(call["followers"] for call in self._calls.values()),
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "coalesced_ratio": round(self.followers / total, 4) if total else 0.0,
+                "max_followers": self.max_followers,
+                "errors": self.errors,
+            }
@@ -1,17 +1,8 @@
 import os
-from pypdf import PdfReader
-# --- Use Google Cloud Vision ---
-try:
-    from google.cloud import vision
-    print("Google Cloud Vision library loaded.")
-    # Initialize client once if possible (consider if text_extractor is called frequently)
-    # For simplicity here, we initialize inside the function, but be mindful of performance.
-    # vision_client = vision.ImageAnnotatorClient()
-except ImportError:
-    print("Warning: google-cloud-vision library not found. Install with 'pip install google-cloud-vision'")
-    print("Warning: OCR functionality via Google Cloud Vision will be unavailable.")
-    vision = None
-# --- End Google Cloud Vision ---
+from backend.utils.extraction_cache import get_extraction_cache, hash_file
+# Cloud Vision OCR lives in backend.utils.ocr (shared client, batched requests)
+from backend.utils.ocr import ocr_files_batch, ocr_bytes
+from backend.utils import metrics
 
 # Keep Pillow for potential future image checks, but not strictly needed for API call
 try:
@@ -22,30 +13,151 @@ except ImportError:
 # Define supported image extensions (can be broader now)
 IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".raw", ".ico", ".pdf", ".tiff", ".gif"} # Vision API supports more
 
-def extract_text(filepath: str) -> str:
+# Bump whenever extraction output changes so cached results from older code are not reused
+EXTRACTOR_VERSION = "3"
+
+# Stop reading long attachments after this many pages (0 = no limit)
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "0"))
+# Pages whose text layer has fewer characters than this are treated as scanned and sent to OCR
+PDF_MIN_TEXT_CHARS = int(os.getenv("PDF_MIN_TEXT_CHARS", "20"))
+# Image-only pages are OCRed in groups of this many so memory stays bounded on long scans
+PDF_OCR_PAGE_BATCH = int(os.getenv("PDF_OCR_PAGE_BATCH", "8"))
+
+def extract_text(filepath: str, use_cache: bool = True) -> str:
     """
     Extracts text content from supported file types (PDF, TXT, Images via Cloud Vision API).
+    Results are cached on disk by file content hash, so identical documents are only extracted once.
     Returns an empty string or error marker if extraction fails.
     """
+    with metrics.span("extract.cache_lookup"):
+        cached_text, file_hash = get_cached_text(filepath) if use_cache else (None, None)
+    if cached_text is not None:
+        return cached_text
+
+    text, cacheable = extract_text_uncached(filepath)
+    store_cached_text(file_hash, text, cacheable)
+    return text
+
+def get_cached_text(filepath: str) -> tuple:
+    """Looks a file up in the extraction cache. Returns (cached text or None, file hash or None)."""
+    cache = get_extraction_cache(EXTRACTOR_VERSION)
+    if cache is None:
+        return None, None
+    try:
+        file_hash = hash_file(filepath)
+    except OSError as e:
+        print(f"Could not hash {filepath} for extraction cache: {e}")
+        return None, None
+    cached_text = cache.get(file_hash)
+    if cached_text is not None:
+        print(f"Extraction cache hit for {filepath} ({file_hash[:12]})")
+    return cached_text, file_hash
+
+def store_cached_text(file_hash, text: str, cacheable: bool):
+    """Stores an extraction result. Error markers are not cached so transient failures (e.g. OCR outages) get retried."""
+    cache = get_extraction_cache(EXTRACTOR_VERSION)
+    if cache is not None and file_hash and cacheable:
+        cache.put(file_hash, text)
+
+def iter_pdf_pages(filepath: str, max_pages: int = PDF_MAX_PAGES):
+    """
+    Lazily yields (page_number, text, images) for each page of a PDF.
+    images is None for pages with a usable text layer; for image-only pages it is the list
+    of embedded image bytes to OCR instead.
+    """
+    from pypdf import PdfReader # Imported on first use to keep startup fast
+
+    reader = PdfReader(filepath)
+    for page_index, page in enumerate(reader.pages):
+        if max_pages and page_index >= max_pages:
+            print(f"Reached PDF_MAX_PAGES ({max_pages}) in {filepath}, skipping remaining {len(reader.pages) - max_pages} page(s).")
+            return
+        page_text = page.extract_text() or ""
+        if len(page_text.strip()) >= PDF_MIN_TEXT_CHARS:
+            yield page_index + 1, page_text, None
+            continue
+
+        images = []
+        try:
+            images = [image.data for image in page.images]
+        except Exception as img_err:
+            print(f"Could not read embedded images on page {page_index + 1} of {filepath}: {img_err}")
+        yield page_index + 1, page_text, images
+
+def _extract_pdf_text(filepath: str) -> tuple:
+    """
+    Extracts a PDF page by page, using the text layer where there is one and OCR only for
+    image-only pages. Returns (text, cacheable).
+    """
+    parts = [] # One entry per page, joined once at the end
+    cacheable = True
+    ocr_queue = [] # (parts index, page number, [image bytes]) awaiting OCR
+
+    def flush_ocr_queue():
+        nonlocal cacheable
+        contents = [content for _, _, images in ocr_queue for content in images]
+        annotations = iter(ocr_bytes(contents))
+        for parts_index, page_num, images in ocr_queue:
+            page_texts = []
+            for _ in images:
+                ocr_text, error = next(annotations)
+                if error:
+                    print(f"OCR failed for page {page_num} of {filepath}: {error}")
+                    page_texts.append(f"[Cloud OCR Error: {error} - page {page_num}]")
+                    cacheable = False
+                elif ocr_text:
+                    page_texts.append(ocr_text)
+            if page_texts:
+                parts[parts_index] = "\n".join(page_texts) + f"\n--- Page {page_num} ---\n"
+        ocr_queue.clear()
+
+    ocr_page_count = 0
+    for page_num, page_text, images in iter_pdf_pages(filepath):
+        if images is None:
+            parts.append(page_text + f"\n--- Page {page_num} ---\n") # Add page separator
+            continue
+        if not images:
+            # Nothing to OCR; keep whatever little text the page had
+            parts.append(page_text + f"\n--- Page {page_num} ---\n" if page_text.strip() else "")
+            continue
+        ocr_page_count += 1
+        parts.append("")
+        ocr_queue.append((len(parts) - 1, page_num, images))
+        if len(ocr_queue) >= PDF_OCR_PAGE_BATCH:
+            flush_ocr_queue()
+    if ocr_queue:
+        flush_ocr_queue()
+
+    text = "".join(parts)
+    print(f"Extracted approx {len(text)} characters from {len(parts)} PDF page(s) ({ocr_page_count} via OCR).")
+    return text, cacheable
+
+def extract_text_uncached(filepath: str) -> tuple:
+    """Runs the actual extraction, bypassing the cache. Returns (text, cacheable), where cacheable is False for error markers."""
+    _, extension = os.path.splitext(filepath.lower())
+    if extension in (".pdf", ".txt"):
+        stage = f"extract{extension}"
+    else:
+        stage = "extract.image" if extension in IMAGE_EXTENSIONS else "extract.unsupported"
+    with metrics.span(stage):
+        return _extract_text_by_type(filepath)
+
+def _extract_text_by_type(filepath: str) -> tuple:
     print(f"Attempting to extract text from: {filepath}")
     _, extension = os.path.splitext(filepath.lower())
     text = ""
+    cacheable = True
 
     try:
         if extension == ".pdf":
-            # Note: Vision API can also process PDFs, but pypdf might be faster/cheaper for text-based PDFs
-            # You could potentially add logic here to use Vision API for image-based PDFs if pypdf fails.
+            # pypdf is faster/cheaper for text-based pages; only image-only pages go to Cloud Vision
             print(f"Processing PDF with pypdf: {filepath}")
             try:
-                reader = PdfReader(filepath)
-                for page_num, page in enumerate(reader.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + f"\n--- Page {page_num + 1} ---\n" # Add page separator
-                print(f"Extracted approx {len(text)} characters from PDF using pypdf.")
+                text, cacheable = _extract_pdf_text(filepath)
             except Exception as pdf_err:
                 print(f"Error reading PDF {filepath} with pypdf: {pdf_err}")
                 text = f"[PDF Extraction Error: {pdf_err} - {os.path.basename(filepath)}]"
+                cacheable = False
 
         elif extension == ".txt":
             print(f"Processing TXT: {filepath}")
@@ -56,46 +168,13 @@ def extract_text(filepath: str) -> str:
             except Exception as txt_err:
                 print(f"Error reading TXT {filepath}: {txt_err}")
                 text = f"[TXT Read Error: {txt_err} - {os.path.basename(filepath)}]"
+                cacheable = False
 
         # --- Google Cloud Vision OCR Logic ---
         elif extension in IMAGE_EXTENSIONS:
             print(f"Processing Image with Google Cloud Vision: {filepath}")
-            if vision is None:
-                print("OCR skipped: google-cloud-vision library not installed.")
-                text = f"[Cloud OCR Skipped: Library missing - {os.path.basename(filepath)}]"
-            else:
-                try:
-                    # Initialize client here (or reuse a global/passed-in client for performance)
-                    client = vision.ImageAnnotatorClient() # Assumes ADC is configured
-
-                    # Read image file content as bytes
-                    with open(filepath, "rb") as image_file:
-                        content = image_file.read()
-
-                    image = vision.Image(content=content)
-
-                    # Use document_text_detection for better results on dense text/documents
-                    print("Sending image to Google Cloud Vision API...")
-                    response = client.document_text_detection(image=image)
-                    print("Received response from Google Cloud Vision API.")
-
-                    # Check for API errors indicated in the response object
-                    if response.error.message:
-                        print(f"!!! Cloud Vision API Error for {filepath}: {response.error.message}")
-                        raise Exception(f"Cloud Vision API Error: {response.error.message}")
-
-                    # Extract text if annotation exists
-                    if response.full_text_annotation:
-                        text = response.full_text_annotation.text
-                        print(f"Extracted {len(text)} characters via Google Cloud Vision.")
-                    else:
-                        print(f"No text detected by Google Cloud Vision in {filepath}.")
-                        text = f"[No text detected by Cloud OCR - {os.path.basename(filepath)}]"
-
-                except Exception as vision_err:
-                     # Catch errors during API call or processing
-                     print(f"Error during Google Cloud Vision processing for {filepath}: {vision_err}")
-                     text = f"[Cloud OCR Error: {vision_err} - {os.path.basename(filepath)}]"
+            # A batch of one; get_session_documents_content batches a session's images together
+            text, cacheable = ocr_files_batch([filepath])[filepath]
         # --- End Google Cloud Vision OCR Logic ---
 
         else:
@@ -106,8 +185,9 @@ def extract_text(filepath: str) -> str:
          # Catch-all for other potential errors (e.g., file access issues)
          print(f"Error processing file {filepath}: {e}")
          text = f"[Error processing file {os.path.basename(filepath)}]"
+         cacheable = False
 
     # Basic cleaning (optional, Vision API text is usually cleaner than Tesseract)
     # text = "\n".join([line for line in text.splitlines() if line.strip()])
 
-    return text
\ No newline at end of file
+    return text, cacheable
\ No newline at end of file
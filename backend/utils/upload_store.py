@@ -0,0 +1,294 @@
+# backend/utils/upload_store.py
+
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from backend.utils.extraction_cache import remember_file_hash
+
+# --- Path Setup ---
+_utils_dir = os.path.dirname(os.path.abspath(__file__))
+_backend_dir = os.path.dirname(_utils_dir)
+
+# Content-addressed copies of uploaded files; keep on the same filesystem as UPLOAD_FOLDER so hard links work
+UPLOAD_STORE_DIR_REL = os.getenv("UPLOAD_STORE_DIR", "upload_store")
+UPLOAD_STORE_DIR_ABS = os.path.join(_backend_dir, UPLOAD_STORE_DIR_REL)
+# --- End Path Setup ---
+
+# --- Configuration ---
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(25 * 1024 * 1024))) # 0 = no limit
+UPLOAD_MAX_SESSION_BYTES = int(os.getenv("UPLOAD_MAX_SESSION_BYTES", str(100 * 1024 * 1024))) # 0 = no limit
+# Store identical files once and hard-link them into sessions
+UPLOAD_DEDUP_ENABLED = os.getenv("UPLOAD_DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# The janitor's full sweep keeps unreferenced objects younger than this, so another worker's upload can still link them
+UPLOAD_STORE_SWEEP_GRACE_SECONDS = float(os.getenv("UPLOAD_STORE_SWEEP_GRACE_SECONDS", "300"))
+# Temporary upload files untouched for this long are treated as abandoned (other workers share the tmp dir)
+UPLOAD_STALE_PART_SECONDS = float(os.getenv("UPLOAD_STALE_PART_SECONDS", "3600"))
+# --- End Configuration ---
+
+_TMP_DIR_NAME = "tmp"
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    """Raised when an upload exceeds the per-file or per-session byte quota (HTTP 413)."""
+
+
+def max_request_bytes():
+    """Request body limit for Flask's MAX_CONTENT_LENGTH: one file plus room for the multipart envelope."""
+    return UPLOAD_MAX_FILE_BYTES + 1024 * 1024 if UPLOAD_MAX_FILE_BYTES else None
+
+
+class HashingSpoolFile:
+    """
+    Destination for an uploaded file part: bytes go straight to a temporary file in the store while
+    their SHA-256 and size are computed, and the upload is aborted as soon as it exceeds max_bytes.
+    Behaves like the file object Werkzeug would otherwise create. Closing it without committing
+    removes the temporary file.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = UPLOAD_MAX_FILE_BYTES):
+        fd, self.path = tempfile.mkstemp(prefix="upload-", suffix=".part", dir=directory)
+        self._file = os.fdopen(fd, "w+b")
+        self._digest = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.committed = False
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.close()
+            raise UploadTooLarge(f"File exceeds the upload limit of {self.max_bytes} bytes.")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def finish(self):
+        """Flushes and closes the temporary file ahead of moving it into place."""
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        # read, seek, tell, readable, ... of the underlying file
+        return getattr(self._file, name)
+
+
+class UploadStore:
+    """
+    Content-addressed store for uploaded files. Each distinct file is kept once, at
+    <root>/<sha[:2]>/<sha>, and hard-linked into every session that uploads it. Per-session byte
+    quotas are checked when a file is committed. When a session is removed, release_session() drops
+    the objects it was the last link to; sweep() is the periodic full scan for anything left over.
+    """
+
+    def __init__(self, root: str = UPLOAD_STORE_DIR_ABS, dedup: bool = UPLOAD_DEDUP_ENABLED,
+                 max_file_bytes: int = UPLOAD_MAX_FILE_BYTES, max_session_bytes: int = UPLOAD_MAX_SESSION_BYTES):
+        self.root = root
+        self.dedup = dedup
+        self.max_file_bytes = max_file_bytes
+        self.max_session_bytes = max_session_bytes
+        self.tmp_dir = os.path.join(root, _TMP_DIR_NAME)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._lock = threading.Lock() # Serializes quota checks and commits
+        self._session_objects = {} # session directory -> sha256s committed into it
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_deduplicated = 0
+        self.rejected = 0
+        self.swept = 0
+        self._clear_stale_parts()
+
+    def _clear_stale_parts(self) -> int:
+        """Removes temporary files left behind by crashed uploads; recent ones may be another worker's in-flight upload."""
+        cutoff = time.time() - UPLOAD_STALE_PART_SECONDS
+        removed = 0
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def open_spool(self) -> HashingSpoolFile:
+        return HashingSpoolFile(self.tmp_dir, self.max_file_bytes)
+
+    def spool_stream(self, stream, chunk_size: int = 1024 * 1024) -> HashingSpoolFile:
+        """Copies a file-like object into a new spool file, enforcing the per-file limit while reading."""
+        spool = self.open_spool()
+        try:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                spool.write(chunk)
+        except Exception:
+            spool.close()
+            raise
+        return spool
+
+    def _session_usage(self, session_dir: str, replacing: str) -> int:
+        total = 0
+        if os.path.isdir(session_dir):
+            for name in os.listdir(session_dir):
+                path = os.path.join(session_dir, name)
+                if name != replacing and os.path.isfile(path):
+                    total += os.path.getsize(path)
+        return total
+
+    def _link_or_copy(self, source: str, destination: str):
+        """Hard-links source to destination atomically, copying when the filesystem cannot link."""
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            return # Same content re-uploaded under the same name; rename() onto the same inode would be a no-op
+        tmp_destination = f"{destination}.{threading.get_ident()}.link"
+        try:
+            os.link(source, tmp_destination)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copyfile(source, tmp_destination)
+        os.replace(tmp_destination, destination)
+
+    def commit(self, spool: HashingSpoolFile, session_dir: str, filename: str) -> dict:
+        """
+        Places a spooled upload into the session directory as filename, storing its content once.
+        Raises UploadTooLarge if it would take the session over its quota.
+        Returns {"sha256", "size", "deduplicated"}.
+        """
+        spool.finish()
+        sha256 = spool.sha256()
+        destination = os.path.join(session_dir, filename)
+        os.makedirs(session_dir, exist_ok=True)
+        with self._lock:
+            if self.max_session_bytes and self._session_usage(session_dir, filename) + spool.size > self.max_session_bytes:
+                self.rejected += 1
+                raise UploadTooLarge(f"Session upload quota of {self.max_session_bytes} bytes exceeded.")
+
+            if not self.dedup:
+                os.replace(spool.path, destination)
+                spool.committed = True
+                deduplicated = False
+            else:
+                object_path = self.object_path(sha256)
+                deduplicated = os.path.exists(object_path)
+                if deduplicated:
+                    try:
+                        self._link_or_copy(object_path, destination)
+                    except FileNotFoundError: # Swept in the meantime; store this copy instead
+                        deduplicated = False
+                if not deduplicated:
+                    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                    os.replace(spool.path, object_path)
+                    spool.committed = True
+                    self._link_or_copy(object_path, destination)
+                    self.stored += 1
+                else:
+                    self.deduplicated += 1
+                    self.bytes_deduplicated += spool.size
+                self._session_objects.setdefault(os.path.abspath(session_dir), set()).add(sha256)
+        spool.close() # Removes the temporary file if the content was already stored
+        remember_file_hash(destination, sha256)
+        return {"sha256": sha256, "size": spool.size, "deduplicated": deduplicated}
+
+    def _remove_if_unreferenced_locked(self, path: str, cutoff: float = None) -> bool:
+        try:
+            stat = os.stat(path)
+            if stat.st_nlink > 1 or (cutoff is not None and stat.st_mtime >= cutoff):
+                return False
+            os.remove(path)
+        except OSError:
+            return False
+        self.swept += 1
+        return True
+
+    def release_session(self, session_dir: str) -> int:
+        """
+        Call after a session directory has been removed: drops the objects committed into it that no
+        other session links to. Only those objects are checked. Returns the number removed.
+        """
+        with self._lock:
+            hashes = self._session_objects.pop(os.path.abspath(session_dir), ())
+        removed = 0
+        for sha256 in hashes:
+            # Per object, so commits are only held up briefly; a commit linking it concurrently is serialized here
+            with self._lock:
+                removed += self._remove_if_unreferenced_locked(self.object_path(sha256))
+        return removed
+
+    def sweep(self) -> int:
+        """
+        Full scan for store objects that no session links to any more (e.g. from before a restart).
+        Run periodically by the session janitor. Returns the number removed.
+        """
+        self._clear_stale_parts()
+        if not self.dedup:
+            return 0
+        candidates = []
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if prefix == _TMP_DIR_NAME or not os.path.isdir(prefix_dir):
+                continue
+            candidates.extend(os.path.join(prefix_dir, name) for name in os.listdir(prefix_dir))
+        cutoff = time.time() - UPLOAD_STORE_SWEEP_GRACE_SECONDS
+        removed = 0
+        for path in candidates:
+            with self._lock:
+                removed += self._remove_if_unreferenced_locked(path, cutoff)
+        if removed:
+            print(f"Upload store: removed {removed} unreferenced object(s).")
+        return removed
+
+    def stats(self) -> dict:
+        objects, total_bytes = 0, 0
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if prefix == _TMP_DIR_NAME or not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                try:
+                    total_bytes += os.path.getsize(os.path.join(prefix_dir, name))
+                    objects += 1
+                except OSError:
+                    continue
+        return {
+            "dedup": self.dedup,
+            "objects": objects,
+            "bytes": total_bytes,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "bytes_deduplicated": self.bytes_deduplicated,
+            "rejected": self.rejected,
+            "swept": self.swept,
+            "max_file_bytes": self.max_file_bytes,
+            "max_session_bytes": self.max_session_bytes,
+        }
+
+
+upload_store = UploadStore()
+
+
+class StreamingUploadRequest(Request):
+    """Flask request whose uploaded files are streamed into the upload store instead of spooled by Werkzeug."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return upload_store.open_spool()
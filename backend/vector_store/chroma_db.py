@@ -1,17 +1,50 @@
 # backend/vector_store/chroma_db.py
 import os
-# Use community version
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import uuid
+import threading
+from backend.vector_store.embeddings import get_embeddings, embedding_signature, check_embedding_signature
+from backend.vector_store.lexical_index import LexicalIndex, LEXICAL_INDEX_FILENAME
 # Remove load_dotenv here if app.py handles it
 
 VECTOR_DB_REL_PATH = os.getenv("VECTOR_DB_PATH", "vector_store_data/chroma_db")
+# Written by load_uscis_data.py after every ingest so running servers can tell the store changed
+INGEST_MARKER_FILENAME = "ingest_generation"
+# Run a test similarity_search right after loading the store (costs an embedding call on every boot)
+CHROMA_DEBUG_QUERY = os.getenv("CHROMA_DEBUG_QUERY", "false").lower() in ("1", "true", "yes")
 
 vector_store = None
 embeddings = None # Keep track of embeddings instance at module level too
+vector_db_path = None # Absolute persist directory of the loaded store
+lexical_index = None # BM25 index over the same chunks, written by load_uscis_data.py
+_init_lock = threading.Lock() # The store is loaded on first use or by warmup, whichever comes first
+
+def write_ingest_marker(persist_directory: str) -> str:
+    """Records a new ingest generation in the store's persist directory. Returns the generation id."""
+    generation = uuid.uuid4().hex
+    marker_path = os.path.join(persist_directory, INGEST_MARKER_FILENAME)
+    tmp_path = marker_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(tmp_path, marker_path)
+    print(f"Recorded ingest generation {generation} in {marker_path}")
+    return generation
+
+def get_ingest_generation():
+    """Returns the current ingest generation of the loaded store, or None if unknown."""
+    if vector_db_path is None:
+        return None
+    try:
+        with open(os.path.join(vector_db_path, INGEST_MARKER_FILENAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
 
 def initialize_vector_store(base_path=None):
-    global vector_store, embeddings # Declare modification of globals
+    with _init_lock:
+        _initialize_vector_store_locked(base_path)
+
+def _initialize_vector_store_locked(base_path):
+    global vector_store, embeddings, vector_db_path, lexical_index # Declare modification of globals
     if vector_store is not None: # Already initialized? Skip.
          print("Vector store already initialized.")
          return
@@ -27,17 +60,23 @@ def initialize_vector_store(base_path=None):
     if not os.path.isdir(vector_db_abs_path): # Check directory existence first
          raise FileNotFoundError(f"Chroma DB persist directory does not exist: {vector_db_abs_path}. Run load_uscis_data.py first.")
 
+    # Queries must be embedded the same way as the stored chunks
+    check_embedding_signature(vector_db_abs_path, embedding_signature())
+
     try:
         print(f"Initializing embeddings model...")
-        temp_embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=os.getenv("GOOGLE_API_KEY"))
+        temp_embeddings = get_embeddings()
 
         if temp_embeddings is None:
-             print("!!! ERROR: Failed to initialize GoogleGenerativeAIEmbeddings object (returned None).")
+             print("!!! ERROR: Failed to initialize embeddings object (returned None).")
              raise ValueError("Failed to initialize embeddings function.")
 
         print(f"Embeddings object created successfully: {type(temp_embeddings)}")
         embeddings = temp_embeddings # Assign to global *after* successful creation
 
+        # Use community version; imported here because langchain_community and chromadb are slow to import
+        from langchain_community.vectorstores import Chroma
+
         print(f"Loading existing Chroma vector store from: {vector_db_abs_path}")
         # Pass the validated embeddings object
         vector_store = Chroma(persist_directory=vector_db_abs_path, embedding_function=embeddings)
@@ -47,8 +86,23 @@ def initialize_vector_store(base_path=None):
              raise ValueError("Failed to load Chroma vector store.")
 
         print(f"Chroma vector store loaded successfully: {type(vector_store)}")
+        vector_db_path = vector_db_abs_path
+        lexical_index = LexicalIndex(os.path.join(vector_db_abs_path, LEXICAL_INDEX_FILENAME))
+        if not lexical_index.available():
+            print("No BM25 index found next to the vector store; chat retrieval will be vector-only until load_uscis_data.py is re-run.")
 
         # --- ADD DEBUG QUERY ---
+        if CHROMA_DEBUG_QUERY:
+            _run_debug_query()
+        # --- END DEBUG QUERY ---
+
+    except Exception as e:
+        print(f"!!! EXCEPTION during vector store initialization: {e}")
+        embeddings = None
+        vector_store = None
+        raise ConnectionError(f"Failed to initialize ChromaDB or embeddings: {e}") from e
+
+def _run_debug_query():
         print("--- Attempting debug query within initialization ---")
         try:
             # Ensure both objects seem valid before trying query
@@ -66,19 +120,18 @@ def initialize_vector_store(base_path=None):
         except Exception as debug_e:
             print(f"!!! ERROR during debug query: {debug_e} !!!")
             print(f"!!! This indicates the embedding function is likely missing or invalid immediately after Chroma object creation. !!!")
-        # --- END DEBUG QUERY ---
 
-    except Exception as e:
-        print(f"!!! EXCEPTION during vector store initialization: {e}")
-        embeddings = None
-        vector_store = None
-        raise ConnectionError(f"Failed to initialize ChromaDB or embeddings: {e}") from e
+def get_lexical_index():
+    """Returns the BM25 index of the loaded store, or None before initialization."""
+    return lexical_index
 
 def get_vector_store():
     """Returns the initialized vector store instance. Initializes if needed."""
-    # Relying on explicit init during app startup
     if vector_store is None:
-         print("!!! ERROR in get_vector_store: vector_store is None. Initialization likely failed.")
-         # Avoid trying to re-initialize here as path context might be missing
-         raise RuntimeError("Vector store was not successfully initialized during startup.")
+        try:
+            # Same default base path (the backend directory) app.py uses
+            initialize_vector_store()
+        except Exception as e:
+            print(f"!!! ERROR in get_vector_store: vector store could not be initialized: {e}")
+            raise RuntimeError(f"Vector store could not be initialized: {e}") from e
     return vector_store
\ No newline at end of file
@@ -0,0 +1,156 @@
+# backend/vector_store/embeddings.py
+import os
+import re
+import json
+import zlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# --- Configuration ---
+# 'google' (Gemini embeddings API), 'local' (sentence-transformers on CPU) or 'hashing' (dependency-free, numpy only)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "google").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "") # Empty uses the provider's default below
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_HASH_DIMENSION = int(os.getenv("EMBEDDING_HASH_DIMENSION", "1024"))
+# --- End Configuration ---
+
+DEFAULT_MODELS = {
+    "google": "models/embedding-001",
+    "local": "sentence-transformers/all-MiniLM-L6-v2",
+    "hashing": "hashing-v1",
+}
+# Written next to the Chroma files so a store is never queried or extended with a different embedding space
+SIGNATURE_FILENAME = "embedding_provider.json"
+# Stores ingested before providers were configurable were always built with this
+LEGACY_SIGNATURE = {"provider": "google", "model": "models/embedding-001"}
+
+
+class EmbeddingProviderMismatchError(RuntimeError):
+    """Raised when a vector store was built with a different embedding provider or model than configured."""
+
+
+class LocalEmbeddings(Embeddings):
+    """sentence-transformers model run locally, encoding texts in batches on the CPU."""
+
+    def __init__(self, model_name: str, batch_size: int = EMBEDDING_BATCH_SIZE, device: str = "cpu"):
+        # Optional dependency, and importing it loads torch, so only when this provider is used
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError("sentence-transformers library not installed. Install with 'pip install sentence-transformers' "
+                               "or use EMBEDDING_PROVIDER=hashing.")
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = SentenceTransformer(model_name, device=device)
+
+    def embed_documents(self, texts: list) -> list:
+        vectors = self._model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                     convert_to_numpy=True, show_progress_bar=False)
+        return vectors.astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature-hashing encoder: word unigrams and bigrams are hashed into a fixed number of signed
+    buckets, weighted by log term frequency and L2-normalized. A whole batch is encoded as one
+    numpy scatter-add. Purely lexical, but instant, deterministic and offline.
+    """
+
+    _TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, dimension: int = EMBEDDING_HASH_DIMENSION, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.dimension = dimension
+        self.batch_size = batch_size
+        self._feature_cache = {} # feature -> signed bucket; crc32 is stable across processes, unlike hash()
+
+    def _bucket(self, feature: str) -> int:
+        bucket = self._feature_cache.get(feature)
+        if bucket is None:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            bucket = (digest % self.dimension + 1) * (1 if digest & 0x80000000 else -1)
+            if len(self._feature_cache) < 200000:
+                self._feature_cache[feature] = bucket
+        return bucket
+
+    def _encode_batch(self, texts: list) -> np.ndarray:
+        rows, buckets = [], []
+        for row, text in enumerate(texts):
+            tokens = self._TOKEN_RE.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            rows.extend([row] * len(features))
+            buckets.extend(self._bucket(feature) for feature in features)
+        buckets = np.asarray(buckets, dtype=np.int64)
+        counts = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        np.add.at(counts, (np.asarray(rows, dtype=np.int64), np.abs(buckets) - 1), np.sign(buckets).astype(np.float32))
+        vectors = np.sign(counts) * np.log1p(np.abs(counts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def embed_documents(self, texts: list) -> list:
+        batches = [self._encode_batch(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(batches).tolist() if batches else []
+
+    def embed_query(self, text: str) -> list:
+        return self._encode_batch([text])[0].tolist()
+
+
+def resolve_provider(provider: str = None, model: str = None) -> tuple:
+    """Returns the (provider, model) pair to use, applying configuration and per-provider defaults."""
+    provider = (provider or EMBEDDING_PROVIDER).lower()
+    if provider not in DEFAULT_MODELS:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER '{provider}'. Use one of: {', '.join(DEFAULT_MODELS)}")
+    if provider == "hashing":
+        return provider, f"{DEFAULT_MODELS['hashing']}-{EMBEDDING_HASH_DIMENSION}"
+    return provider, model or EMBEDDING_MODEL or DEFAULT_MODELS[provider]
+
+
+def get_embeddings(provider: str = None, model: str = None) -> Embeddings:
+    """Creates the embeddings object for the configured (or given) provider."""
+    provider, model = resolve_provider(provider, model)
+    print(f"Initializing '{provider}' embeddings ({model})...")
+    if provider == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        return GoogleGenerativeAIEmbeddings(model=model, google_api_key=os.getenv("GOOGLE_API_KEY"))
+    if provider == "local":
+        return LocalEmbeddings(model)
+    return HashingEmbeddings()
+
+
+def embedding_signature(provider: str = None, model: str = None) -> dict:
+    provider, model = resolve_provider(provider, model)
+    return {"provider": provider, "model": model}
+
+
+def read_embedding_signature(persist_directory: str):
+    """Returns the signature a store was built with, LEGACY_SIGNATURE for older stores, or None for an empty directory."""
+    signature_path = os.path.join(persist_directory, SIGNATURE_FILENAME)
+    try:
+        with open(signature_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        has_store = os.path.isdir(persist_directory) and any(
+            name.endswith(".sqlite3") for name in os.listdir(persist_directory)
+        )
+        return dict(LEGACY_SIGNATURE) if has_store else None
+
+def write_embedding_signature(persist_directory: str, signature: dict):
+    signature_path = os.path.join(persist_directory, SIGNATURE_FILENAME)
+    tmp_path = signature_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(signature, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, signature_path)
+
+def check_embedding_signature(persist_directory: str, signature: dict):
+    """Raises EmbeddingProviderMismatchError if the store at persist_directory was built with another provider or model."""
+    stored = read_embedding_signature(persist_directory)
+    if stored is None:
+        return
+    if stored.get("provider") != signature["provider"] or stored.get("model") != signature["model"]:
+        raise EmbeddingProviderMismatchError(
+            f"Vector store at {persist_directory} was built with {stored.get('provider')} embeddings ({stored.get('model')}), "
+            f"but {signature['provider']} ({signature['model']}) is configured. Re-run load_uscis_data.py with --full "
+            f"to rebuild it, or switch EMBEDDING_PROVIDER/EMBEDDING_MODEL back."
+        )
@@ -0,0 +1,91 @@
+# backend/vector_store/hybrid_retriever.py
+import threading
+from typing import Any, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from backend.utils import metrics
+
+
+def reciprocal_rank_fusion(ranked_lists: list, k: int, rrf_k: int = 60) -> list:
+    """
+    Fuses ranked Document lists with reciprocal-rank fusion: each document scores the sum of
+    1 / (rrf_k + rank) over the lists it appears in. Documents are matched by source and content.
+    Returns the top k documents.
+    """
+    scores, documents = {}, {}
+    for ranked in ranked_lists:
+        for rank, document in enumerate(ranked, start=1):
+            key = (document.metadata.get("source"), document.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+    ordered = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [documents[key] for key in ordered[:k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves from the BM25 index and the vector store and fuses both rankings with RRF.
+    When the lexical match is decisive (the best chunk covers the query's terms and clearly beats
+    the runner-up), the BM25 results are returned as is and the query is never embedded.
+    Without a lexical index it behaves like the plain vector store retriever. A caller that has
+    already embedded the query (the answer cache) can pass query_vector to skip embedding it again.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: Any
+    lexical_index: Any = None
+    k: int = 3
+    fetch_k: int = 10 # Candidates taken from each ranking before fusion
+    rrf_k: int = 60
+    fast_path: bool = True
+    min_coverage: float = 0.8
+    min_margin: float = 1.5 # Best lexical score / second best score
+    stats: dict = Field(default_factory=lambda: {"lexical_fast_path": 0, "hybrid": 0, "vector_only": 0})
+    _stats_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _count(self, path: str):
+        with self._stats_lock:
+            self.stats[path] += 1
+
+    def is_decisive(self, lexical_hits: list) -> bool:
+        """True when the top BM25 hit is strong enough to answer without vector search."""
+        if not lexical_hits:
+            return False
+        _, top_score, top_coverage = lexical_hits[0]
+        if top_coverage < self.min_coverage:
+            return False
+        if len(lexical_hits) == 1:
+            return True
+        return top_score >= self.min_margin * lexical_hits[1][1]
+
+    def _lexical_search(self, query: str) -> list:
+        with metrics.span("chat.lexical_search"):
+            return self.lexical_index.search(query, self.fetch_k) if self.lexical_index is not None else []
+
+    def takes_fast_path(self, query: str) -> bool:
+        """True when retrieving this query would use the lexical fast path (no embedding needed)."""
+        return self.fast_path and self.is_decisive(self._lexical_search(query))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                query_vector: list = None) -> List[Document]:
+        lexical_hits = self._lexical_search(query)
+        if self.fast_path and self.is_decisive(lexical_hits):
+            self._count("lexical_fast_path")
+            return [document for document, _, _ in lexical_hits[:self.k]]
+
+        fetch_k = self.fetch_k if lexical_hits else self.k
+        with metrics.span("chat.vector_search"):
+            if query_vector is not None:
+                vector_documents = self.vector_store.similarity_search_by_vector(query_vector, k=fetch_k)
+            else:
+                vector_documents = self.vector_store.similarity_search(query, k=fetch_k)
+        if not lexical_hits:
+            self._count("vector_only")
+            return vector_documents[:self.k]
+        self._count("hybrid")
+        return reciprocal_rank_fusion([[document for document, _, _ in lexical_hits], vector_documents], self.k, self.rrf_k)
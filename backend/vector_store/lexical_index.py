@@ -0,0 +1,90 @@
+# backend/vector_store/lexical_index.py
+import os
+import json
+import threading
+from langchain_core.documents import Document
+
+# Use absolute imports
+from backend.utils.bm25 import BM25Index
+
+# Written next to the Chroma files by load_uscis_data.py, from the same chunks
+LEXICAL_INDEX_FILENAME = "bm25_index.json"
+LEXICAL_INDEX_VERSION = 1
+
+
+def write_lexical_index(persist_directory: str, ids: list, texts: list, metadatas: list) -> str:
+    """Builds a BM25 index over the store's chunks and saves it atomically. Returns the file path."""
+    index = BM25Index.from_texts(texts)
+    payload = {
+        "version": LEXICAL_INDEX_VERSION,
+        "ids": ids,
+        "texts": texts,
+        "metadatas": [metadata or {} for metadata in metadatas],
+        "bm25": index.to_dict(),
+    }
+    index_path = os.path.join(persist_directory, LEXICAL_INDEX_FILENAME)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, index_path)
+    print(f"Wrote BM25 index over {len(texts)} chunks to {index_path}")
+    return index_path
+
+
+class LexicalIndex:
+    """
+    Read side of the BM25 index written at ingest time. The file is reloaded whenever its mtime
+    changes, so a running server follows re-ingests like the answer cache does. An index that is
+    missing or unreadable simply returns no results.
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self._index = None
+        self._documents = []
+        self.loads = 0
+
+    def _refresh(self):
+        try:
+            mtime_ns = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        with self._lock:
+            if mtime_ns == self._mtime_ns:
+                return self._index, self._documents
+            self._mtime_ns = mtime_ns
+            self._index, self._documents = None, []
+            if mtime_ns is None:
+                return None, []
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    payload = json.load(f)
+                if payload.get("version") != LEXICAL_INDEX_VERSION:
+                    raise ValueError(f"unsupported version {payload.get('version')}")
+                self._index = BM25Index.from_dict(payload["bm25"])
+                self._documents = [
+                    Document(page_content=text, metadata=metadata, id=chunk_id)
+                    for chunk_id, text, metadata in zip(payload["ids"], payload["texts"], payload["metadatas"])
+                ]
+                self.loads += 1
+                print(f"Loaded BM25 index with {len(self._documents)} chunks from {self.index_path}")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load BM25 index {self.index_path}, lexical retrieval disabled: {e}")
+            return self._index, self._documents
+
+    def available(self) -> bool:
+        index, _ = self._refresh()
+        return index is not None and len(index) > 0
+
+    def search(self, query: str, k: int) -> list:
+        """Returns up to k (Document, score, coverage) tuples, best first; coverage is BM25Index.coverage()."""
+        index, documents = self._refresh()
+        if index is None:
+            return []
+        return [(documents[doc_index], score, index.coverage(query, score)) for doc_index, score in index.search(query, k)]
+
+    def stats(self) -> dict:
+        index, documents = self._refresh()
+        return {"path": self.index_path, "available": index is not None, "chunks": len(documents), "loads": self.loads}
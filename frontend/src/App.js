@@ -18,6 +18,17 @@ import FillFormControls from './components/FillFormControls';
 
 const BACKEND_URL = 'http://localhost:5001';
 
+// Parses one server-sent event block ("event: ...\ndata: ...") into { event, data }
+const parseSseEvent = (rawEvent) => {
+  let event = 'message';
+  const dataLines = [];
+  rawEvent.split('\n').forEach(line => {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+  });
+  return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : {} };
+};
+
 function App() {
   const [messages, setMessages] = useState([]);
   const [sessionId, setSessionId] = useState('');
@@ -67,27 +78,63 @@ function App() {
     setError(null); 
   }, []);
 
+  const updateMessage = useCallback((id, updater) => {
+    setMessages(prevMessages => prevMessages.map(msg => (msg.id === id ? { ...msg, ...updater(msg) } : msg)));
+  }, []);
+
   const handleSendMessage = useCallback(async (messageText) => {
     if (!sessionId || isLoading) return;
     addMessage('user', messageText);
     setIsLoading(true);
     setError(null);
 
+    // Placeholder bot message that fills in as tokens stream from /api/chat/stream
+    const botMessageId = uuidv4();
+    setMessages(prevMessages => [...prevMessages, { id: botMessageId, sender: 'bot', type: 'text', content: '', streaming: true, timestamp: new Date() }]);
+
     try {
-      const response = await axios.post(`${BACKEND_URL}/api/chat`, {
-        message: messageText,
-        session_id: sessionId,
+      const response = await fetch(`${BACKEND_URL}/api/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ message: messageText, session_id: sessionId }),
       });
-      addMessage('bot', response.data.reply);
+      if (!response.ok || !response.body) {
+        const errorBody = await response.json().catch(() => ({}));
+        throw new Error(errorBody.error || `HTTP error! status: ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finished = false;
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const rawEvents = buffer.split('\n\n');
+        buffer = rawEvents.pop(); // Keep any incomplete event for the next chunk
+        for (const rawEvent of rawEvents) {
+          if (!rawEvent.trim()) continue;
+          const { event, data } = parseSseEvent(rawEvent);
+          if (event === 'token') {
+            updateMessage(botMessageId, msg => ({ content: msg.content + data.text }));
+          } else if (event === 'error') {
+            throw new Error(data.error || 'Failed to get response from server.');
+          } else if (event === 'done') {
+            finished = true;
+          }
+        }
+      }
+      updateMessage(botMessageId, () => ({ streaming: false }));
     } catch (err) {
       console.error('Error sending message:', err);
-      const errorMsg = err.response?.data?.error || 'Failed to get response from server.';
-      addMessage('bot', `Chat Error: ${errorMsg}`, 'error');
+      const errorMsg = err.message || 'Failed to get response from server.';
+      updateMessage(botMessageId, () => ({ content: `Chat Error: ${errorMsg}`, type: 'error', streaming: false }));
       setError(`Chat Error: ${errorMsg}`);
     } finally {
       setIsLoading(false);
     }
-  }, [sessionId, isLoading, addMessage]);
+  }, [sessionId, isLoading, addMessage, updateMessage]);
 
   const handleFileUpload = useCallback(async (file) => {
      if (!sessionId) throw new Error("Session ID not available for upload.");
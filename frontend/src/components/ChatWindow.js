@@ -3,6 +3,7 @@ import Box from '@mui/material/Box';
 import Stack from '@mui/material/Stack';
 import Paper from '@mui/material/Paper';
 import Typography from '@mui/material/Typography';
+import CircularProgress from '@mui/material/CircularProgress';
 import { useTheme } from '@mui/material/styles';
 // Optional: Import specific contrast checking functions if needed, or rely on manual check
 // import { getContrastRatio } from '@mui/material/styles';
@@ -58,7 +59,7 @@ function ChatWindow({ messages }) {
 
           return (
             <Box
-              key={msg.timestamp?.toISOString() + index || index}
+              key={msg.id || msg.timestamp?.toISOString() + index || index}
               sx={{
                 display: 'flex',
                 justifyContent: msg.sender === 'user' ? 'flex-end' : 'flex-start',
@@ -75,8 +76,11 @@ function ChatWindow({ messages }) {
                   // borderRadius is handled by theme override or MUI default
                 }}
               >
-                <Typography variant="body1">
-                  {typeof msg.content === 'string' && msg.content.startsWith('http') ? (
+                <Typography variant="body1" aria-live={msg.streaming ? 'polite' : undefined} aria-busy={msg.streaming || undefined}>
+                  {msg.streaming && !msg.content ? (
+                    // Waiting for the first streamed token
+                    <CircularProgress size={16} color="inherit" aria-label="Generating answer" />
+                  ) : typeof msg.content === 'string' && msg.content.startsWith('http') && !msg.streaming ? (
                      <a href={msg.content} target="_blank" rel="noopener noreferrer" style={{ color: 'inherit', textDecoration: 'underline' }}>{msg.content}</a>
                   ) : (
                     msg.content